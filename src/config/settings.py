@@ -96,6 +96,78 @@ DATABASES = {
     }
 }
 
+# Сколько независимых запросов страницы истории выполняется параллельно, каждый на своем соединении.
+# Это же число ограничивает дополнительные соединения процесса к базе, 0 и 1 - запросы выполняются по очереди
+DATABASE_QUERY_CONCURRENCY = int(os.getenv('DATABASE_QUERY_CONCURRENCY', 0))
+
+# Сколько асинхронных соединений к базе держит один цикл событий процесса под ASGI
+ASYNC_DATABASE_POOL_SIZE = int(os.getenv('ASYNC_DATABASE_POOL_SIZE', 20))
+
+# Подключать ли асинхронные представления истории и списка задач. Имеет смысл только под ASGI-сервером,
+# под WSGI у каждого запроса свой цикл событий и свои соединения
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
+# В модели пользователя нет ролей, поэтому статистику кешей видят только пользователи с этими id (через запятую)
+CACHE_STATISTICS_USER_IDS = {int(user_id) for user_id in os.getenv('CACHE_STATISTICS_USER_IDS', '').split(',') if user_id.strip()}
+
+HISTORY_STATISTICS_CACHE_SIZE = int(os.getenv('HISTORY_STATISTICS_CACHE_SIZE', 1000))
+
+# Сколько пользователей держат данные главной страницы в кеше процесса
+TASK_DASHBOARD_CACHE_SIZE = int(os.getenv('TASK_DASHBOARD_CACHE_SIZE', 1000))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'history_statistics': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'history-statistics',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': HISTORY_STATISTICS_CACHE_SIZE,
+            # При переполнении удаляется ровно одна давно не использованная запись
+            'CULL_FREQUENCY': HISTORY_STATISTICS_CACHE_SIZE,
+        },
+    },
+    'task_dashboard': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'task-dashboard',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': TASK_DASHBOARD_CACHE_SIZE,
+            'CULL_FREQUENCY': TASK_DASHBOARD_CACHE_SIZE,
+        },
+    },
+    # Версии пользователей для кешей статистики истории и главной страницы. Они должны быть общими для всех процессов:
+    # версия, сброшенная в одном процессе, иначе не доходит до остальных, и те отдают устаревшие данные.
+    # По умолчанию версии лежат в таблице базы, которую создает миграция task 0009, и каждое обращение к кешу
+    # стоит одного запроса к Postgres за версией. Общий Redis или Memcached обходятся без запросов к базе (см. README).
+    # Сами записи остаются в кеше каждого процесса
+    'cache_versions': {
+        'BACKEND': os.getenv('CACHE_VERSIONS_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.getenv('CACHE_VERSIONS_LOCATION', 'cache_versions'),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            # Вытесненная версия создается заново и не совпадает с прошлыми, поэтому вытеснение безопасно
+            'MAX_ENTRIES': int(os.getenv('CACHE_VERSIONS_SIZE', 100_000)),
+        },
+    },
+    'shared_history_pages': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared-history-pages',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('SHARED_HISTORY_PAGES_CACHE_SIZE', 500)),
+        },
+    },
+}
+
+# Сколько секунд браузеры и прокси могут хранить страницы сохраненных историй, не спрашивая сервер.
+# Столько же после удаления истории ссылка может открываться из их кешей, поэтому значение небольшое
+SHARED_HISTORY_PAGE_MAX_AGE = int(os.getenv('SHARED_HISTORY_PAGE_MAX_AGE', 5 * 60))
+
+# Сжимать ли сохраненные истории пользователей zlib
+SHARED_HISTORY_SNAPSHOT_COMPRESSION = True
 
 
 # Password validation
@@ -1,17 +1,21 @@
+from typing import Optional
 from datetime import date
+from decimal import Decimal
 from dataclasses import dataclass
 
 from datetime import timedelta, date
 
+import numpy as np
+
 from task.domain.entities import CategoryEntity
 from user.domain.entities import UserEntity
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class HistoryEntity:
     id: int
     name: str
-    category: CategoryEntity
+    category: Optional[CategoryEntity]
     user: UserEntity
     planned_time: timedelta
     execution_time: timedelta
@@ -19,7 +23,7 @@ class HistoryEntity:
     status: str
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class IncompleteHistoryEntity:
     id: int
     name: str
@@ -29,12 +33,87 @@ class IncompleteHistoryEntity:
         yield 'name', self.name
 
 
+@dataclass
+class HistoryPageEntity:
+    history: list[IncompleteHistoryEntity]
+    # Ключ (execution_date, id) последней записи страницы, если за ней есть еще записи
+    next_key: Optional[tuple[date, int]]
+
+
+@dataclass
+class HistorySnapshotEntity:
+    '''
+    Статистика истории за промежуток времени в том виде, в котором ее рисуют графики:
+    charts - название графика -> {'labels': [...], 'colors': [...], 'data': [...]}
+    '''
+    charts: dict[str, dict[str, list]]
+    history: list[IncompleteHistoryEntity]
+
+
 @dataclass
 class SharedHistoryEntity:
     key: int
     user: UserEntity
     from_date: date
     to_date: date
-    history_statistics: dict
+    snapshot: Optional[HistorySnapshotEntity]
+
+
+@dataclass
+class HistoryStatisticsEntity:
+    '''
+    Сырые агрегаты истории пользователя за промежуток времени, посчитанные за один проход.
+    Каждое поле имеет ту же форму, что и результат соответствующего отдельного метода репозитория
+    '''
+    count_user_tasks_in_categories: list[tuple[str, str, int]]
+    common_user_accuracy: list[tuple[Decimal]]
+    user_accuracy_by_categories: list[tuple[str, str, Decimal]]
+    common_user_success_rate: list[tuple[int, int]]
+    user_success_rate_by_categories: list[tuple[str, str, int]]
+    count_user_tasks_by_weekdays: list[tuple[str, int]]
+    common_count_user_successful_planned_tasks: list[tuple[int, int]]
+    count_user_successful_planned_tasks_by_categories: list[tuple[str, str, int]]
+
+
+@dataclass
+class SharedHistoryPageEntity:
+    '''
+    Один раз отрисованная для анонимных посетителей страница сохраненной истории
+    '''
+    key: str
+    gzipped_html: bytes
+    etag: str
+
 
+@dataclass
+class PlanningErrorSamplesEntity:
+    '''
+    Запланированное и реальное время задач истории за промежуток в секундах и их категории в виде массивов numpy одной длины.
+    Категория 0 - задача без категории, categories - id категории -> (название, цвет)
+    '''
+    planned_seconds: np.ndarray
+    execution_seconds: np.ndarray
+    category_ids: np.ndarray
+    categories: dict[int, tuple[str, str]]
 
+
+@dataclass
+class PlanningBiasEntity:
+    '''
+    Статистика логарифма отношения реального времени выполненных задач пользователя к запланированному в одной категории,
+    накопленная по алгоритму Уэлфорда: среднее и сумма квадратов отклонений от среднего
+    '''
+    category_id: int
+    sample_count: int
+    log_ratio_mean: float
+    log_ratio_m2: float
+
+
+@dataclass(frozen=True, slots=True)
+class TaskOutcomeEntity:
+    '''
+    Итог задачи, которая переносится в историю: выполнена (failed=False) или провалена, и сколько времени на нее ушло
+    '''
+    task_id: int
+    execution_time: timedelta
+    failed: bool
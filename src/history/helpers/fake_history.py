@@ -0,0 +1,68 @@
+from datetime import date
+
+from django.utils.connection import ConnectionProxy
+
+
+# Из этих слов собираются названия задач, чтобы поиск по истории находил правдоподобную долю записей
+FAKE_TASK_VERBS = (
+    'Подготовить', 'Проверить', 'Написать', 'Обсудить', 'Исправить', 'Отправить', 'Прочитать', 'Согласовать',
+    'Обновить', 'Настроить', 'Разобрать', 'Оплатить', 'Спланировать', 'Протестировать', 'Посчитать', 'Заказать',
+    'Починить', 'Выучить', 'Позвонить', 'Купить',
+)
+FAKE_TASK_OBJECTS = (
+    'отчет', 'презентацию', 'договор', 'бюджет', 'статью', 'письмо', 'задачи', 'документацию', 'сервер', 'релиз',
+    'счета', 'расписание', 'билеты', 'продукты', 'велосипед', 'английский', 'резюме', 'макет', 'базу данных', 'тесты',
+    'квартиру', 'машину', 'подарок', 'лекцию', 'курсовую', 'конспект', 'рецепт', 'маршрут', 'заявку', 'анкету',
+    'налоги', 'страховку', 'квитанции', 'фотографии', 'книгу', 'ноутбук', 'сайт', 'план', 'смету', 'логотип',
+)
+FAKE_TASK_CONTEXTS = (
+    'для клиента', 'к понедельнику', 'с командой', 'для руководителя', 'на выходных', 'до отпуска', 'для семьи',
+    'к экзамену', 'по проекту', 'для соседей', 'к встрече', 'на квартал', 'после обеда', 'для отдела', 'к празднику',
+    'с коллегами', 'для университета', 'к вечеру', 'на неделю', 'для банка',
+)
+
+
+def generate_fake_history(connection: ConnectionProxy, user_ids: list[int], rows_per_user: int, to_date: date, days: int) -> None:
+    '''
+    Генерирует историю пользователей для бенчмарков: по rows_per_user записей на пользователя, равномерно распределенных
+    по базовым и кастомным категориям пользователя и по дням в промежутке [to_date - days, to_date].
+    Записи разных пользователей перемешаны и отсортированы по дате, как если бы они копились в таблице со временем
+    '''
+    cursor = connection.cursor()
+    cursor.execute(
+        '''
+        WITH categories AS (
+            SELECT users.user_id, array_agg(tc.id ORDER BY tc.id) AS ids
+            FROM unnest(%s::bigint[]) users(user_id)
+            JOIN task_category tc
+            ON tc.user_id = users.user_id OR tc.is_custom = false
+            GROUP BY users.user_id
+        )
+        INSERT INTO history_history (name, category_id, user_id, planned_time, execution_time, execution_date, status)
+        SELECT name, category_id, user_id, planned_time, execution_time, execution_date, status
+        FROM (
+            SELECT
+            (%s::text[])[1 + floor(random() * cardinality(%s::text[]))::int] || ' ' ||
+            (%s::text[])[1 + floor(random() * cardinality(%s::text[]))::int] || ' ' ||
+            (%s::text[])[1 + floor(random() * cardinality(%s::text[]))::int] AS name,
+            categories.ids[1 + i %% cardinality(categories.ids)] AS category_id,
+            categories.user_id,
+            make_interval(mins => 10 * floor(random() * 30)::int) AS planned_time,
+            make_interval(mins => 10 * floor(random() * 30)::int) AS execution_time,
+            %s::date - floor(random() * %s)::int AS execution_date,
+            (ARRAY['SUCCESSFUL', 'OUT_OF_DEADLINE', 'FAILED'])[1 + floor(random() * 3)::int] AS status
+            FROM generate_series(1, %s) i, categories
+        ) generated
+        ORDER BY execution_date;
+        ''',
+        [
+            user_ids,
+            *[list(words) for words in (FAKE_TASK_VERBS, FAKE_TASK_VERBS, FAKE_TASK_OBJECTS, FAKE_TASK_OBJECTS, FAKE_TASK_CONTEXTS, FAKE_TASK_CONTEXTS)],
+            to_date, days, rows_per_user
+        ]
+    )
+    cursor.execute('ANALYZE history_history;')
+
+
+def generate_fake_user_history(connection: ConnectionProxy, user_id: int, rows: int, to_date: date, days: int) -> None:
+    generate_fake_history(connection, [user_id], rows, to_date, days)
@@ -0,0 +1,121 @@
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import Optional
+
+from django.core.cache import caches
+
+from ..models import SharedHistory
+from user.domain.entities import UserEntity, IncompleteUserEntity
+from task.helpers.async_db import AsyncConnectionPool
+from ..domain.entities import SharedHistoryEntity, HistoryStatisticsEntity, HistoryPageEntity, SharedHistoryPageEntity, PlanningErrorSamplesEntity
+from .snapshot import decode_history_snapshot
+from .cache import SHARED_HISTORY_PAGES_CACHE
+from .database_repository import (
+    USER_HISTORY_PAGE_SQL, USER_HISTORY_PAGE_AFTER_KEY_CONDITION, USER_HISTORY_STATISTICS_SQL, USER_PLANNING_ERROR_SAMPLES_SQL,
+    build_history_page, split_history_statistics, build_planning_error_samples
+)
+
+
+class AsyncHistoryDatabaseRepositoryInterface(ABC):
+
+    @abstractmethod
+    async def get_user_history_statistics(self, user: UserEntity, from_date: str, to_date: str) -> HistoryStatisticsEntity:
+        pass
+
+    @abstractmethod
+    async def get_user_history_page(self, user: UserEntity, from_date: str, to_date: str, limit: int, after_key: Optional[tuple[date, int]] = None) -> HistoryPageEntity:
+        pass
+
+    @abstractmethod
+    async def get_user_planning_error_samples(self, user: UserEntity, from_date: str, to_date: str) -> PlanningErrorSamplesEntity:
+        pass
+
+    @abstractmethod
+    async def get_shared_history_by_key(self, key: str) -> SharedHistoryEntity:
+        pass
+
+    @abstractmethod
+    async def get_shared_history_page(self, key: str) -> Optional[SharedHistoryPageEntity]:
+        pass
+
+    @abstractmethod
+    async def save_shared_history_page(self, page: SharedHistoryPageEntity) -> None:
+        pass
+
+
+class AsyncHistoryDatabaseRepository(AsyncHistoryDatabaseRepositoryInterface):
+    '''
+    Читающая часть HistoryDatabaseRepository на асинхронных соединениях psycopg для асинхронных представлений.
+    Запросы и разбор их результатов общие с синхронным репозиторием
+    '''
+
+    def __init__(self, connection_pool: AsyncConnectionPool) -> None:
+        self._connection_pool = connection_pool
+
+    async def _fetchall(self, sql: str, params: list) -> list[tuple]:
+        async with self._connection_pool.connection() as connection:
+            cursor = await connection.execute(sql, params)
+            return await cursor.fetchall()
+
+    async def get_user_history_statistics(self, user: UserEntity, from_date: str, to_date: str) -> HistoryStatisticsEntity:
+        return split_history_statistics(await self._fetchall(USER_HISTORY_STATISTICS_SQL, [user.id, from_date, to_date]))
+
+    async def get_user_history_page(self, user: UserEntity, from_date: str, to_date: str, limit: int, after_key: Optional[tuple[date, int]] = None) -> HistoryPageEntity:
+        rows = await self._fetchall(
+            USER_HISTORY_PAGE_SQL.format(after_condition=USER_HISTORY_PAGE_AFTER_KEY_CONDITION if after_key else ''),
+            [user.id, from_date, to_date, *(after_key or ()), limit + 1]
+        )
+        return build_history_page(rows, limit)
+
+    async def get_user_planning_error_samples(self, user: UserEntity, from_date: str, to_date: str) -> PlanningErrorSamplesEntity:
+        return build_planning_error_samples((await self._fetchall(USER_PLANNING_ERROR_SAMPLES_SQL, [user.id, user.id, from_date, to_date]))[0])
+
+    async def get_shared_history_by_key(self, key: str) -> SharedHistoryEntity:
+        rows = await self._fetchall(
+            '''
+            SELECT
+            sh.key, sh.from_date, sh.to_date, sh.snapshot, sh.snapshot_version, sh.snapshot_compressed,
+            uu.id, uu.username, uu.avatar
+            FROM history_sharedhistory sh
+            JOIN user_user uu
+            ON sh.user_id = uu.id
+            WHERE sh.key = %s;
+            ''',
+            [key]
+        )
+        if not rows:
+            raise SharedHistory.DoesNotExist
+        key, from_date, to_date, snapshot, snapshot_version, snapshot_compressed, user_id, username, avatar = rows[0]
+        return SharedHistoryEntity(
+            key=key,
+            user=IncompleteUserEntity(id=user_id, username=username, avatar=avatar),
+            from_date=from_date,
+            to_date=to_date,
+            snapshot=decode_history_snapshot(snapshot, snapshot_version, snapshot_compressed)
+        )
+
+    async def get_shared_history_page(self, key: str) -> Optional[SharedHistoryPageEntity]:
+        page = caches[SHARED_HISTORY_PAGES_CACHE].get(key)
+        if page is not None:
+            # Удаление истории в другом процессе не очищает этот кеш
+            rows = await self._fetchall('SELECT rendered_page_etag FROM history_sharedhistory WHERE key = %s;', [key])
+            if rows and rows[0][0] == page.etag:
+                return page
+            caches[SHARED_HISTORY_PAGES_CACHE].delete(key)
+        rows = await self._fetchall('SELECT rendered_page, rendered_page_etag FROM history_sharedhistory WHERE key = %s;', [key])
+        if not rows:
+            raise SharedHistory.DoesNotExist
+        rendered_page, etag = rows[0]
+        if rendered_page is None:
+            return None
+        page = SharedHistoryPageEntity(key=key, gzipped_html=rendered_page, etag=etag)
+        caches[SHARED_HISTORY_PAGES_CACHE].set(key, page)
+        return page
+
+    async def save_shared_history_page(self, page: SharedHistoryPageEntity) -> None:
+        async with self._connection_pool.connection() as connection:
+            await connection.execute(
+                'UPDATE history_sharedhistory SET rendered_page = %s, rendered_page_etag = %s WHERE key = %s;',
+                [page.gzipped_html, page.etag, page.key]
+            )
+        caches[SHARED_HISTORY_PAGES_CACHE].set(page.key, page)
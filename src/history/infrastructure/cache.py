@@ -0,0 +1,8 @@
+from task.helpers.cache import VersionedCache
+
+
+# Отформатированная статистика истории по (пользователь, from_date, to_date)
+history_statistics_cache = VersionedCache('history_statistics', 'history_statistics')
+
+# Алиас кеша отрисованных страниц сохраненных историй по ключу ссылки
+SHARED_HISTORY_PAGES_CACHE = 'shared_history_pages'
@@ -1,33 +1,265 @@
+import math
 from abc import ABC, abstractmethod
-from datetime import timedelta
+from datetime import date
 from decimal import Decimal
+from typing import Optional, Iterator, Union, NoReturn
 
+import numpy as np
 from django.db import transaction
+from django.core.cache import caches
 from django.utils.connection import ConnectionProxy
 
 from ..models import History, SharedHistory
 from user.models import User
 from task.models import Task
-from task.domain.entities import TaskEntity
+from task.domain.entities import SearchPageEntity
+from task.infrastructure.cache import task_dashboard_cache
+from task.infrastructure.database_repository import SEARCH_AFTER_KEY_CONDITION, build_search_page
 from user.domain.entities import UserEntity
-from ..domain.entities import IncompleteHistoryEntity, SharedHistoryEntity, HistoryEntity
+from ..domain.entities import IncompleteHistoryEntity, SharedHistoryEntity, HistoryEntity, HistoryStatisticsEntity, HistoryPageEntity, HistorySnapshotEntity, SharedHistoryPageEntity, PlanningErrorSamplesEntity, PlanningBiasEntity, TaskOutcomeEntity
+from .cache import history_statistics_cache, SHARED_HISTORY_PAGES_CACHE
+
+
+# Агрегаты сырой истории в разрезе (пользователь, категория, день, статус), из которых состоит таблица history_historydailyrollup.
+# Вместо {source} подставляется history_history или CTE с новыми записями истории, условие отбора строк - вместо {condition}
+HISTORY_ROLLUP_AGGREGATES_SQL = '''
+    SELECT
+    hh.user_id, hh.category_id, hh.execution_date AS day, hh.status,
+    count(hh.id) AS task_count,
+    coalesce(sum(
+    CASE
+        WHEN extract(epoch FROM hh.planned_time) = 0 OR extract(epoch FROM hh.execution_time) = 0 THEN NULL
+        WHEN hh.planned_time < hh.execution_time THEN (extract(epoch FROM hh.planned_time) / extract(epoch FROM hh.execution_time)) * 100
+        WHEN hh.planned_time > hh.execution_time THEN (extract(epoch FROM hh.execution_time) / extract(epoch FROM hh.planned_time)) * 100
+    END), 0) AS accuracy_sum,
+    count(hh.id) FILTER (WHERE extract(epoch FROM hh.planned_time) <> 0 AND extract(epoch FROM hh.execution_time) <> 0 AND hh.planned_time <> hh.execution_time) AS accuracy_count,
+    count(hh.id) FILTER (WHERE extract(epoch FROM hh.planned_time) = 0 OR extract(epoch FROM hh.execution_time) = 0) AS zero_time_count,
+    count(hh.id) FILTER (WHERE hh.planned_time = hh.execution_time) AS successful_planning_count
+    FROM {source} hh
+    WHERE {condition}
+    GROUP BY hh.user_id, hh.category_id, hh.execution_date, hh.status
+'''
+
+# Прибавление агрегатов {aggregates} новых записей к дневным агрегатам. Параметры: параметры агрегатов
+APPLY_HISTORY_ROLLUP_SQL = '''
+    INSERT INTO history_historydailyrollup AS rollup
+    (user_id, category_id, day, status, task_count, accuracy_sum, accuracy_count, zero_time_count, successful_planning_count)
+    SELECT
+    user_id, category_id, day, status,
+    task_count, accuracy_sum, accuracy_count, zero_time_count, successful_planning_count
+    FROM ({aggregates}) aggregates
+    ON CONFLICT (user_id, category_id, day, status) DO UPDATE SET
+    task_count = rollup.task_count + EXCLUDED.task_count,
+    accuracy_sum = rollup.accuracy_sum + EXCLUDED.accuracy_sum,
+    accuracy_count = rollup.accuracy_count + EXCLUDED.accuracy_count,
+    zero_time_count = rollup.zero_time_count + EXCLUDED.zero_time_count,
+    successful_planning_count = rollup.successful_planning_count + EXCLUDED.successful_planning_count
+'''
+
+# Вычитание агрегатов {aggregates} удаляемых записей из дневных агрегатов. Строки ключей переписываются заново, и строка,
+# в которой не осталось задач, просто не вставляется. После удаления категории у пользователя может быть несколько строк
+# одного ключа без категории (NULL не конфликтуют в уникальном ограничении), такие строки сливаются в одну.
+# Параметры: параметры агрегатов
+REMOVE_HISTORY_ROLLUP_SQL = '''
+    WITH aggregates AS ({aggregates}),
+    removed AS (
+        DELETE FROM history_historydailyrollup rollup
+        USING aggregates
+        WHERE rollup.user_id = aggregates.user_id AND rollup.category_id IS NOT DISTINCT FROM aggregates.category_id AND
+        rollup.day = aggregates.day AND rollup.status = aggregates.status
+        RETURNING rollup.*
+    )
+    INSERT INTO history_historydailyrollup
+    (user_id, category_id, day, status, task_count, accuracy_sum, accuracy_count, zero_time_count, successful_planning_count)
+    SELECT
+    removed.user_id, removed.category_id, removed.day, removed.status,
+    sum(removed.task_count) - min(aggregates.task_count),
+    sum(removed.accuracy_sum) - min(aggregates.accuracy_sum),
+    sum(removed.accuracy_count) - min(aggregates.accuracy_count),
+    sum(removed.zero_time_count) - min(aggregates.zero_time_count),
+    sum(removed.successful_planning_count) - min(aggregates.successful_planning_count)
+    FROM removed
+    JOIN aggregates
+    ON removed.user_id = aggregates.user_id AND removed.category_id IS NOT DISTINCT FROM aggregates.category_id AND
+    removed.day = aggregates.day AND removed.status = aggregates.status
+    GROUP BY removed.user_id, removed.category_id, removed.day, removed.status
+    HAVING sum(removed.task_count) > min(aggregates.task_count);
+'''
+
+# Условие продолжения страницы истории после записи с ключом (execution_date, id)
+USER_HISTORY_PAGE_AFTER_KEY_CONDITION = 'AND (hh.execution_date, hh.id) < (%s, %s)'
+
+# Страница истории пользователя за промежуток по убыванию (execution_date, id). Вместо {after_condition} подставляется
+# USER_HISTORY_PAGE_AFTER_KEY_CONDITION или пустая строка, параметры: user_id, from_date, to_date, [execution_date, id], limit
+USER_HISTORY_PAGE_SQL = '''
+    SELECT hh.id, hh.name, hh.execution_date
+    FROM history_history hh
+    WHERE hh.user_id = %s AND
+    execution_date BETWEEN %s AND %s
+    {after_condition}
+    ORDER BY hh.execution_date DESC, hh.id DESC
+    LIMIT %s;
+'''
+
+# Страница полнотекстового поиска по названиям задач всей истории пользователя по убыванию (rank, id).
+# Совпадения находит GIN-индекс history_search_vector_idx каждой секции по генерируемой колонке search_vector (миграция 0014)
+# так же, как в SEARCH_USER_TASKS_SQL. Вместо {after_condition} подставляется SEARCH_AFTER_KEY_CONDITION или пустая строка,
+# параметры: tsquery, user_id, user_id, [rank, id], limit
+SEARCH_USER_HISTORY_SQL = '''
+    SELECT matches.id, matches.name, matches.execution_date, matches.rank
+    FROM (
+        SELECT hh.id, hh.name, hh.execution_date, ts_rank(hh.search_vector, query) AS rank
+        FROM history_history hh, to_tsquery('russian', %s) query
+        WHERE numnode(query) > 0 AND hh.search_vector @@ (query && quote_literal('#' || %s)::tsquery) AND hh.user_id = %s
+    ) matches
+    {after_condition}
+    ORDER BY matches.rank DESC, matches.id DESC
+    LIMIT %s;
+'''
+
+# Запланированное и реальное время задач пользователя за промежуток и их категории, упакованные в bytea
+# как последовательности чисел big-endian, чтобы не создавать по объекту Python на каждое значение.
+# Задачи с нулевым временем не имеют ошибки оценки и не выбираются. Параметры: user_id, user_id, from_date, to_date
+USER_PLANNING_ERROR_SAMPLES_SQL = '''
+    SELECT
+    coalesce(string_agg(float8send(date_part('epoch', hh.planned_time)), ''::bytea), ''::bytea),
+    coalesce(string_agg(float8send(date_part('epoch', hh.execution_time)), ''::bytea), ''::bytea),
+    coalesce(string_agg(int8send(coalesce(hh.category_id, 0)), ''::bytea), ''::bytea),
+    (
+        SELECT coalesce(json_object_agg(tc.id, json_build_array(tc.name, tc.color)), '{}')
+        FROM task_category tc
+        WHERE tc.user_id = %s OR tc.is_custom = false
+    )
+    FROM history_history hh
+    WHERE hh.user_id = %s AND
+    hh.execution_date BETWEEN %s AND %s AND
+    hh.status <> 'FAILED' AND
+    hh.planned_time > interval '0' AND hh.execution_time > interval '0';
+'''
+
+# Добавление выполненных задач из CTE inserted в статистику ошибки оценки: среднее и сумма квадратов отклонений
+# новых записей каждой категории объединяются с накопленными по формуле Чана, для одной записи это шаг алгоритма Уэлфорда.
+# В SET справа от = стоят старые значения строки, в EXCLUDED - статистика новых записей
+ADD_PLANNING_BIAS_SAMPLES_SQL = '''
+    INSERT INTO history_planningbias AS bias
+    (user_id, category_id, sample_count, log_ratio_mean, log_ratio_m2)
+    SELECT user_id, category_id, count(*), avg(log_ratio), var_pop(log_ratio) * count(*)
+    FROM (
+        SELECT hh.user_id, hh.category_id, ln(extract(epoch FROM hh.execution_time) / extract(epoch FROM hh.planned_time)) AS log_ratio
+        FROM inserted hh
+        WHERE hh.status <> 'FAILED' AND hh.category_id IS NOT NULL AND
+        hh.planned_time > interval '0' AND hh.execution_time > interval '0'
+    ) samples
+    GROUP BY user_id, category_id
+    ON CONFLICT (user_id, category_id) DO UPDATE SET
+    sample_count = bias.sample_count + EXCLUDED.sample_count,
+    log_ratio_mean = bias.log_ratio_mean + (EXCLUDED.log_ratio_mean - bias.log_ratio_mean) * EXCLUDED.sample_count / (bias.sample_count + EXCLUDED.sample_count),
+    log_ratio_m2 = bias.log_ratio_m2 + EXCLUDED.log_ratio_m2 +
+        (EXCLUDED.log_ratio_mean - bias.log_ratio_mean) ^ 2 * bias.sample_count * EXCLUDED.sample_count / (bias.sample_count + EXCLUDED.sample_count)
+'''
+
+# Перенос задач пользователя в историю одним запросом: строки удаляются из task_task, вставляются в history_history,
+# и в том же запросе новые записи добавляются в дневные агрегаты и статистику ошибки оценки.
+# Задачи переносятся, только если все они принадлежат пользователю, иначе запрос ничего не меняет и возвращает 0.
+# Запрос выполняется в транзакции, чтобы перенос, который пропустил одновременно удаленные задачи, можно было откатить.
+# Выполненная задача с прошедшим дедлайном получает статус OUT_OF_DEADLINE, как в is_out_of_deadline.
+# Параметры: task_ids, execution_times, failed, user_id, user_id, execution_date, FAILED, today, OUT_OF_DEADLINE, SUCCESSFUL
+MOVE_USER_TASKS_TO_HISTORY_SQL = '''
+    WITH outcomes AS (
+        SELECT * FROM unnest(%s::bigint[], %s::interval[], %s::boolean[]) AS outcome(task_id, execution_time, failed)
+    ), moved AS (
+        DELETE FROM task_task tt
+        USING outcomes
+        WHERE tt.id = outcomes.task_id AND tt.user_id = %s AND (
+            SELECT count(*) FROM task_task owned WHERE owned.id IN (SELECT task_id FROM outcomes) AND owned.user_id = %s
+        ) = (SELECT count(*) FROM outcomes)
+        RETURNING tt.name, tt.category_id, tt.user_id, tt.planned_time, tt.deadline, outcomes.execution_time, outcomes.failed
+    ), inserted AS (
+        INSERT INTO history_history (name, category_id, user_id, planned_time, execution_time, execution_date, status)
+        SELECT
+        moved.name, moved.category_id, moved.user_id, moved.planned_time, moved.execution_time, %s,
+        CASE
+            WHEN moved.failed THEN %s
+            WHEN moved.deadline < %s THEN %s
+            ELSE %s
+        END
+        FROM moved
+        RETURNING id, category_id, user_id, planned_time, execution_time, execution_date, status
+    ), rollup AS (
+        {apply_rollup}
+    ), bias AS (
+        {add_planning_bias}
+    )
+    SELECT count(*) FROM inserted;
+'''.format(
+    apply_rollup=APPLY_HISTORY_ROLLUP_SQL.format(aggregates=HISTORY_ROLLUP_AGGREGATES_SQL.format(source='inserted', condition='true')),
+    add_planning_bias=ADD_PLANNING_BIAS_SAMPLES_SQL
+)
+
+# Обратный шаг алгоритма Уэлфорда для удаленной из истории задачи. Параметры: log_ratio x 4, user_id, category_id
+REMOVE_PLANNING_BIAS_SAMPLE_SQL = '''
+    UPDATE history_planningbias SET
+    sample_count = sample_count - 1,
+    log_ratio_mean = CASE WHEN sample_count > 1 THEN (sample_count * log_ratio_mean - %s) / (sample_count - 1) ELSE 0 END,
+    log_ratio_m2 = CASE
+        WHEN sample_count > 1 THEN greatest(log_ratio_m2 - (%s - log_ratio_mean) * (%s - (sample_count * log_ratio_mean - %s) / (sample_count - 1)), 0)
+        ELSE 0
+    END
+    WHERE user_id = %s AND category_id = %s AND sample_count > 0;
+'''
+
+# Все агрегаты статистики истории пользователя за промежуток по дневным агрегатам, параметры: user_id, from_date, to_date
+USER_HISTORY_STATISTICS_SQL = '''
+    SELECT
+    statistics.grouping_set, statistics.category_id, statistics.name, statistics.color, weekdays.day_name,
+    statistics.task_count, statistics.failed_tasks, statistics.common_accuracy, statistics.accuracy, statistics.successful_planning
+    FROM (
+        SELECT
+        GROUPING(tc.id, extract(isodow FROM rollup.day)) AS grouping_set,
+        tc.id AS category_id, tc.name, tc.color,
+        extract(isodow FROM rollup.day) AS day_index,
+        coalesce(sum(rollup.task_count), 0) AS task_count,
+        coalesce(sum(rollup.task_count) FILTER (WHERE rollup.status = 'FAILED'), 0) AS failed_tasks,
+        round(sum(rollup.accuracy_sum) / nullif(sum(rollup.accuracy_count) + sum(rollup.zero_time_count), 0), 2) AS common_accuracy,
+        round(sum(rollup.accuracy_sum) / nullif(sum(rollup.accuracy_count), 0), 2) AS accuracy,
+        coalesce(sum(rollup.successful_planning_count), 0) AS successful_planning
+        FROM history_historydailyrollup rollup
+        LEFT JOIN task_category tc
+        ON rollup.category_id = tc.id
+        WHERE rollup.user_id = %s AND
+        rollup.day BETWEEN %s AND %s
+        GROUP BY GROUPING SETS ((), (tc.id, tc.name, tc.color), (extract(isodow FROM rollup.day)))
+        HAVING GROUPING(tc.id, extract(isodow FROM rollup.day)) = 3 OR sum(rollup.task_count) <> 0
+    ) statistics
+    LEFT JOIN (VALUES
+        (1, 'Понедельник'),
+        (2, 'Вторник'),
+        (3, 'Среда'),
+        (4, 'Четверг'),
+        (5, 'Пятница'),
+        (6, 'Суббота'),
+        (7, 'Воскресенье')
+    ) weekdays(day_index, day_name)
+    ON weekdays.day_index = statistics.day_index
+    ORDER BY statistics.grouping_set, weekdays.day_index;
+'''
 
 
 class HistoryDatabaseRepositoryInterface(ABC):
     @abstractmethod
-    def save_task_to_history_as_successful(self, task: TaskEntity, execution_time: timedelta) -> None:
+    def move_user_tasks_to_history(self, user: UserEntity, outcomes: list[TaskOutcomeEntity]) -> Union[None, NoReturn]:
         pass
 
     @abstractmethod
-    def save_task_to_history_as_outed_of_deadline(self, task: TaskEntity, execution_time: timedelta) -> None:
+    def save_user_shared_history(self, key: str, user: UserEntity, snapshot: HistorySnapshotEntity, from_date: str, to_date: str) -> None:
         pass
 
     @abstractmethod
-    def save_task_to_history_as_failed(self, task: TaskEntity, execution_time: timedelta) -> None:
+    def get_shared_history_page(self, key: str) -> Optional[SharedHistoryPageEntity]:
         pass
 
     @abstractmethod
-    def save_user_shared_history(self, key: str, history_statistics: dict) -> None:
+    def save_shared_history_page(self, page: SharedHistoryPageEntity) -> None:
         pass
 
     @abstractmethod
@@ -82,10 +314,34 @@ class HistoryDatabaseRepositoryInterface(ABC):
     def get_count_user_successful_planned_tasks_by_categories(self, user: UserEntity) -> list[tuple[str, int]]:
         pass
 
+    @abstractmethod
+    def get_user_history_statistics(self, user: UserEntity, from_date: str, to_date: str) -> HistoryStatisticsEntity:
+        pass
+
     @abstractmethod
     def get_user_history(self, user: UserEntity) -> list[IncompleteHistoryEntity]:
         pass
 
+    @abstractmethod
+    def iterate_user_history_rows(self, user: UserEntity, from_date: str, to_date: str, chunk_size: int) -> Iterator[list[tuple]]:
+        pass
+
+    @abstractmethod
+    def get_user_history_page(self, user: UserEntity, from_date: str, to_date: str, limit: int, after_key: Optional[tuple[date, int]] = None) -> HistoryPageEntity:
+        pass
+
+    @abstractmethod
+    def search_user_history(self, user: UserEntity, tsquery: str, limit: int, after_key: Optional[tuple[float, int]] = None) -> SearchPageEntity:
+        pass
+
+    @abstractmethod
+    def get_user_planning_error_samples(self, user: UserEntity, from_date: str, to_date: str) -> PlanningErrorSamplesEntity:
+        pass
+
+    @abstractmethod
+    def get_user_planning_biases(self, user: UserEntity) -> list[PlanningBiasEntity]:
+        pass
+
 
 class HistoryDatabaseRepository(HistoryDatabaseRepositoryInterface):
 
@@ -96,61 +352,183 @@ class HistoryDatabaseRepository(HistoryDatabaseRepositoryInterface):
         self._connection = connection
 
     @transaction.atomic
-    def save_task_to_history_as_successful(self, task: TaskEntity, execution_time: timedelta) -> None:
-        task_model_obj = self._task_model.from_domain(task)
-        task_model_obj.delete()
-        self._history_model.objects.create(
-                name=task_model_obj.name,
-                category=task_model_obj.category,
-                user=task_model_obj.user,
-                planned_time=task_model_obj.planned_time,
-                execution_time=execution_time,
-                status=self._history_model.SUCCESSFUL
-            )
-    
-    @transaction.atomic
-    def save_task_to_history_as_outed_of_deadline(self, task: TaskEntity, execution_time: timedelta) -> None:
-        task_model_obj = self._task_model.from_domain(task)
-        task_model_obj.delete()
-        self._history_model.objects.create(
-                name=task_model_obj.name,
-                category=task_model_obj.category,
-                user=task_model_obj.user,
-                planned_time=task_model_obj.planned_time,
-                execution_time=execution_time,
-                status=self._history_model.OUT_OF_DEADLINE
-            )
-    
-    @transaction.atomic
-    def save_task_to_history_as_failed(self, task: TaskEntity, execution_time: timedelta) -> None:
-        task_model_obj = self._task_model.from_domain(task)
-        task_model_obj.delete()
-        self._history_model.objects.create(
-                name=task_model_obj.name,
-                category=task_model_obj.category,
-                user=task_model_obj.user,
-                planned_time=task_model_obj.planned_time,
-                execution_time=execution_time,
-                status=self._history_model.FAILED
-            )
-
-    def save_user_shared_history(self, key: str, user: UserEntity, history_statistics: dict, from_date: str, to_date: str) -> None:
-        self._shared_history_model.objects.create(key=key, user=User.from_domain(user), history_statistics=history_statistics, from_date=from_date, to_date=to_date)
+    def move_user_tasks_to_history(self, user: UserEntity, outcomes: list[TaskOutcomeEntity]) -> Union[None, NoReturn]:
+        '''
+        Переносит задачи пользователя в историю с переданными итогами вместе с обновлением дневных агрегатов
+        и статистики ошибки оценки одним запросом, поэтому перенос не может разойтись с одновременным изменением задачи.
+        Выбрасывает PermissionError, если хотя бы одной задачи нет у пользователя, тогда ничего не переносится
+        '''
+        today = date.today()
+        cursor = self._connection.cursor()
+        cursor.execute(
+            MOVE_USER_TASKS_TO_HISTORY_SQL,
+            [
+                [outcome.task_id for outcome in outcomes], [outcome.execution_time for outcome in outcomes],
+                [outcome.failed for outcome in outcomes], user.id, user.id, today,
+                self._history_model.FAILED, today, self._history_model.OUT_OF_DEADLINE, self._history_model.SUCCESSFUL
+            ]
+        )
+        # Меньше задач переносится и тогда, когда часть из них успел перенести одновременный запрос:
+        # проверка владельца видит задачи в снимке запроса, а DELETE пропускает уже удаленные строки.
+        # Исключение откатывает транзакцию вместе с частичным переносом
+        if cursor.fetchone()[0] != len(outcomes):
+            raise PermissionError
+        history_statistics_cache.bump_version_on_commit(user.id)
+        # Задачи уходят из списка задач
+        task_dashboard_cache.bump_version_on_commit(user.id)
+
+    def save_user_shared_history(self, key: str, user: UserEntity, snapshot: HistorySnapshotEntity, from_date: str, to_date: str) -> None:
+        self._shared_history_model.from_domain(
+            SharedHistoryEntity(key=key, user=user, from_date=from_date, to_date=to_date, snapshot=snapshot)
+        ).save(force_insert=True)
 
     def get_shared_history_by_key(self, key: str) -> SharedHistoryEntity:
-        return self._shared_history_model.objects.get(key=key).to_domain()
+        return self._shared_history_model.objects.get_entity(key=key)
+
+    def get_shared_history_page(self, key: str) -> Optional[SharedHistoryPageEntity]:
+        '''
+        Ищет отрисованную страницу сначала в кеше процесса, потом в базе. Страница из кеша отдается после одного запроса
+        за ETag страницы в базе. Возвращает None, если страница еще не отрисована, и выбрасывает DoesNotExist, если такой сохраненной истории нет
+        '''
+        page = caches[SHARED_HISTORY_PAGES_CACHE].get(key)
+        if page is not None:
+            # Кеш у каждого процесса свой, и удаление истории очищает его только в одном из них,
+            # поэтому страница из кеша отдается, только если история все еще есть и не перерисована
+            etag = self._shared_history_model.objects.filter(key=key).values_list('rendered_page_etag', flat=True).first()
+            if etag == page.etag:
+                return page
+            caches[SHARED_HISTORY_PAGES_CACHE].delete(key)
+        rendered_page, etag = self._shared_history_model.objects.values_list('rendered_page', 'rendered_page_etag').get(key=key)
+        if rendered_page is None:
+            return None
+        page = SharedHistoryPageEntity(key=key, gzipped_html=bytes(rendered_page), etag=etag)
+        caches[SHARED_HISTORY_PAGES_CACHE].set(key, page)
+        return page
+
+    def save_shared_history_page(self, page: SharedHistoryPageEntity) -> None:
+        self._shared_history_model.objects.filter(key=page.key).update(rendered_page=page.gzipped_html, rendered_page_etag=page.etag)
+        caches[SHARED_HISTORY_PAGES_CACHE].set(page.key, page)
 
     def get_user_shared_histories(self, user: UserEntity) -> list[SharedHistoryEntity]:
-        return self._shared_history_model.objects.filter(user=User.from_domain(user)).only('key', 'from_date', 'to_date').to_entity_list()
+        return self._shared_history_model.objects.filter(user=User.from_domain(user)).only(
+            'key', 'from_date', 'to_date', 'user__id', 'user__username', 'user__avatar'
+        ).to_entity_list()
     
-    def delete_shared_history(self, history_entity: HistoryEntity) -> None:
-        self._shared_history_model.from_domain(history_entity).delete()
+    def delete_shared_history(self, history_entity: SharedHistoryEntity) -> None:
+        self._shared_history_model.objects.filter(key=history_entity.key).delete()
+        transaction.on_commit(lambda: caches[SHARED_HISTORY_PAGES_CACHE].delete(history_entity.key))
 
     def get_history_by_id(self, id: int) -> HistoryEntity:
-        return self._history_model.objects.get(id=id).to_domain()
+        return self._history_model.objects.get_entity(id=id)
 
+    @transaction.atomic
     def delete_history(self, history_entity: HistoryEntity) -> None:
-        self._history_model.from_domain(history_entity).delete()
+        self._remove_histories_from_rollup([history_entity.id], [history_entity.execution_date])
+        self._remove_history_from_planning_bias(self._history_model.from_domain(history_entity))
+        # Дата записи позволяет Postgres удалить строку только из ее секции
+        self._history_model.objects.filter(id=history_entity.id, execution_date=history_entity.execution_date).delete()
+        history_statistics_cache.bump_version_on_commit(history_entity.user.id)
+
+    def _remove_histories_from_rollup(self, history_ids: list[int], execution_dates: list[date]) -> None:
+        '''
+        Вычитает записи истории из дневных агрегатов одним запросом и убирает строки, в которых не осталось задач.
+        Даты выполнения записей нужны только для того, чтобы запрос читал секции этих дат.
+        Должен вызываться в той же транзакции, что и удаление истории, и до удаления записей
+        '''
+        cursor = self._connection.cursor()
+        cursor.execute(
+            REMOVE_HISTORY_ROLLUP_SQL.format(aggregates=HISTORY_ROLLUP_AGGREGATES_SQL.format(
+                source='history_history', condition='hh.id = ANY(%s) AND hh.execution_date = ANY(%s)'
+            )),
+            [history_ids, execution_dates]
+        )
+
+    def _remove_history_from_planning_bias(self, history_model_obj: History) -> None:
+        '''
+        Убирает запись истории из статистики ошибки оценки за O(1).
+        Проваленные задачи, задачи без категории и с нулевым временем ошибки оценки не имеют и не учитываются
+        '''
+        planned_time, execution_time = history_model_obj.planned_time, history_model_obj.execution_time
+        if (
+                history_model_obj.status == self._history_model.FAILED or history_model_obj.category_id is None or
+                not planned_time or not execution_time
+            ):
+            return
+        log_ratio = math.log(execution_time / planned_time)
+        cursor = self._connection.cursor()
+        cursor.execute(REMOVE_PLANNING_BIAS_SAMPLE_SQL, [log_ratio] * 4 + [history_model_obj.user_id, history_model_obj.category_id])
+
+    def get_user_planning_biases(self, user: UserEntity) -> list[PlanningBiasEntity]:
+        cursor = self._connection.cursor()
+        cursor.execute(
+            '''
+            SELECT category_id, sample_count, log_ratio_mean, log_ratio_m2
+            FROM history_planningbias
+            WHERE user_id = %s;
+            ''',
+            [user.id]
+        )
+        return [PlanningBiasEntity(*row) for row in cursor.fetchall()]
+
+    @transaction.atomic
+    def rebuild_history_rollup(self, user_id: int = None) -> None:
+        '''
+        Пересчитывает дневные агрегаты из сырой истории всех пользователей или одного пользователя
+        '''
+        condition = 'user_id = %s' if user_id else 'true'
+        params = [user_id] if user_id else []
+        cursor = self._connection.cursor()
+        cursor.execute(f'DELETE FROM history_historydailyrollup WHERE {condition};', params)
+        cursor.execute(
+            '''
+            INSERT INTO history_historydailyrollup
+            (user_id, category_id, day, status, task_count, accuracy_sum, accuracy_count, zero_time_count, successful_planning_count)
+            {aggregates};
+            '''.format(aggregates=HISTORY_ROLLUP_AGGREGATES_SQL.format(source='history_history', condition='hh.' + condition if user_id else condition)),
+            params
+        )
+
+    def get_history_rollup_mismatches(self, user_id: int = None) -> list[tuple]:
+        '''
+        Сравнивает дневные агрегаты с сырой историей.
+        Возвращает ключи (пользователь, категория, день, статус), по которым суммы не совпали, вместе с обоими значениями
+        '''
+        condition = 'user_id = %s' if user_id else 'true'
+        params = [user_id, user_id] if user_id else []
+        cursor = self._connection.cursor()
+        cursor.execute(
+            '''
+            WITH raw AS ({aggregates}),
+            rollup AS (
+                SELECT
+                user_id, category_id, day, status,
+                sum(task_count) AS task_count, sum(accuracy_sum) AS accuracy_sum, sum(accuracy_count) AS accuracy_count,
+                sum(zero_time_count) AS zero_time_count, sum(successful_planning_count) AS successful_planning_count
+                FROM history_historydailyrollup
+                WHERE {condition}
+                GROUP BY user_id, category_id, day, status
+                HAVING sum(task_count) <> 0
+            )
+            SELECT
+            coalesce(raw.user_id, rollup.user_id), coalesce(raw.category_id, rollup.category_id),
+            coalesce(raw.day, rollup.day), coalesce(raw.status, rollup.status),
+            raw.task_count, rollup.task_count, raw.accuracy_sum, rollup.accuracy_sum
+            FROM raw
+            FULL JOIN rollup
+            ON raw.user_id = rollup.user_id AND raw.category_id IS NOT DISTINCT FROM rollup.category_id
+            AND raw.day = rollup.day AND raw.status = rollup.status
+            WHERE raw.task_count IS DISTINCT FROM rollup.task_count
+            OR abs(raw.accuracy_sum - rollup.accuracy_sum) > 0.000001
+            OR raw.accuracy_count IS DISTINCT FROM rollup.accuracy_count
+            OR raw.zero_time_count IS DISTINCT FROM rollup.zero_time_count
+            OR raw.successful_planning_count IS DISTINCT FROM rollup.successful_planning_count;
+            '''.format(
+                aggregates=HISTORY_ROLLUP_AGGREGATES_SQL.format(source='history_history', condition='hh.' + condition if user_id else condition),
+                condition=condition
+            ),
+            params
+        )
+        return cursor.fetchall()
 
     def get_count_user_tasks_in_categories(self, user: UserEntity, from_date: str, to_date: str) -> list[tuple[int, str]]:
         cursor = self._connection.cursor()
@@ -217,12 +595,13 @@ class HistoryDatabaseRepository(HistoryDatabaseRepositoryInterface):
         cursor = self._connection.cursor()
         cursor.execute(
             '''
-            SELECT count(*)-(SELECT count(*) FROM history_history hh2 WHERE hh2.status='FAILED' AND hh2.user_id = %s AND execution_date BETWEEN %s AND %s) AS successful_tasks,
-            (SELECT count(*) FROM history_history hh3 WHERE hh3.status='FAILED' AND hh3.user_id = %s AND execution_date BETWEEN %s AND %s) AS failed_tasks 
+            SELECT
+            count(*) FILTER (WHERE hh.status <> 'FAILED') AS successful_tasks,
+            count(*) FILTER (WHERE hh.status = 'FAILED') AS failed_tasks
             FROM history_history hh
             WHERE hh.user_id = %s AND execution_date BETWEEN %s AND %s;
             ''',
-            [user.id, from_date, to_date, user.id, from_date, to_date, user.id, from_date, to_date]
+            [user.id, from_date, to_date]
         )
         return cursor.fetchall()
 
@@ -232,7 +611,7 @@ class HistoryDatabaseRepository(HistoryDatabaseRepositoryInterface):
             '''
             SELECT
             tc."name", tc.color,
-            count(*)-(SELECT count(*) FROM history_history hh2 WHERE hh2.status='FAILED' AND hh2.category_id=hh.category_id AND hh2.user_id = %s AND execution_date BETWEEN %s AND %s) AS successful_tasks
+            count(*) FILTER (WHERE hh.status <> 'FAILED') AS successful_tasks
             FROM history_history hh 
             join task_category tc 
             ON hh.category_id = tc.id
@@ -240,7 +619,7 @@ class HistoryDatabaseRepository(HistoryDatabaseRepositoryInterface):
             execution_date BETWEEN %s AND %s
             GROUP BY category_id, tc."name", tc.color;
             ''',
-            [user.id, from_date, to_date, user.id, from_date, to_date]
+            [user.id, from_date, to_date]
         )
         return cursor.fetchall()
 
@@ -272,13 +651,13 @@ class HistoryDatabaseRepository(HistoryDatabaseRepositoryInterface):
         cursor.execute(
             '''
             SELECT
-            (SELECT count(hh2.id) FROM history_history hh2 WHERE hh2.user_id = %s AND hh2.planned_time = hh2.execution_time AND execution_date BETWEEN %s AND %s) AS successful_planning,
-            count(hh.id) AS failed_planning
+            count(hh.id) FILTER (WHERE hh.planned_time = hh.execution_time) AS successful_planning,
+            count(hh.id) FILTER (WHERE hh.planned_time != hh.execution_time) AS failed_planning
             FROM history_history hh 
-            WHERE hh.user_id = %s AND hh.planned_time != hh.execution_time AND
+            WHERE hh.user_id = %s AND
             execution_date BETWEEN %s AND %s; 
             ''',
-            [user.id, from_date, to_date, user.id, from_date, to_date]
+            [user.id, from_date, to_date]
         )
         return cursor.fetchall()
 
@@ -309,9 +688,143 @@ class HistoryDatabaseRepository(HistoryDatabaseRepositoryInterface):
             FROM history_history hh
             WHERE hh.user_id = %s AND
             execution_date BETWEEN %s AND %s
-            ORDER BY hh.execution_date DESC;
+            ORDER BY hh.execution_date DESC, hh.id DESC;
             ''',
             [user.id, from_date, to_date]
         )
         return [IncompleteHistoryEntity(id=string[0], name=string[1]) for string in cursor.fetchall()]
 
+    def iterate_user_history_rows(self, user: UserEntity, from_date: str, to_date: str, chunk_size: int) -> Iterator[list[tuple]]:
+        '''
+        Отдает сырые записи истории пользователя за промежуток пачками по chunk_size строк через серверный курсор,
+        поэтому в памяти процесса одновременно находится только одна пачка.
+        Строки: (id, name, category_name, status, planned_time_seconds, execution_time_seconds, execution_date)
+        '''
+        # Без транзакции Django открывает курсор WITH HOLD, и Postgres материализует весь результат до первой строки
+        with transaction.atomic():
+            cursor = self._connection.chunked_cursor()
+            try:
+                cursor.execute(
+                    '''
+                    SELECT
+                    hh.id, hh.name, tc.name, hh.status,
+                    extract(epoch FROM hh.planned_time)::bigint, extract(epoch FROM hh.execution_time)::bigint,
+                    hh.execution_date
+                    FROM history_history hh
+                    LEFT JOIN task_category tc
+                    ON hh.category_id = tc.id
+                    WHERE hh.user_id = %s AND
+                    hh.execution_date BETWEEN %s AND %s
+                    ORDER BY hh.execution_date, hh.id;
+                    ''',
+                    [user.id, from_date, to_date]
+                )
+                while rows := cursor.fetchmany(chunk_size):
+                    yield rows
+            finally:
+                cursor.close()
+
+    def get_user_history_page(self, user: UserEntity, from_date: str, to_date: str, limit: int, after_key: Optional[tuple[date, int]] = None) -> HistoryPageEntity:
+        '''
+        Возвращает не больше limit записей истории в том же порядке, что и get_user_history, начиная после записи с ключом after_key.
+        Страница ищется по индексу (user_id, execution_date) без OFFSET, поэтому ее стоимость не зависит от номера страницы
+        '''
+        after_condition = USER_HISTORY_PAGE_AFTER_KEY_CONDITION if after_key else ''
+        cursor = self._connection.cursor()
+        cursor.execute(
+            USER_HISTORY_PAGE_SQL.format(after_condition=after_condition),
+            [user.id, from_date, to_date, *(after_key or ()), limit + 1]
+        )
+        return build_history_page(cursor.fetchall(), limit)
+
+    def search_user_history(self, user: UserEntity, tsquery: str, limit: int, after_key: Optional[tuple[float, int]] = None) -> SearchPageEntity:
+        '''
+        Возвращает не больше limit записей истории пользователя, подходящих под запрос to_tsquery, от самых релевантных,
+        начиная после результата с ключом after_key
+        '''
+        cursor = self._connection.cursor()
+        cursor.execute(
+            SEARCH_USER_HISTORY_SQL.format(after_condition=SEARCH_AFTER_KEY_CONDITION if after_key else ''),
+            [tsquery, user.id, user.id, *(after_key or ()), limit + 1]
+        )
+        return build_search_page(cursor.fetchall(), limit)
+
+    def get_user_history_statistics(self, user: UserEntity, from_date: str, to_date: str) -> HistoryStatisticsEntity:
+        '''
+        Считает все агрегаты статистики за один проход по дневным агрегатам истории пользователя за промежуток времени,
+        поэтому стоимость зависит от длины промежутка, а не от размера всей истории.
+        Общие показатели, показатели по категориям и по дням недели считаются как отдельные grouping sets,
+        а строки результата раскладываются в те же формы, которые возвращают отдельные методы репозитория
+        '''
+        cursor = self._connection.cursor()
+        cursor.execute(
+            USER_HISTORY_STATISTICS_SQL,
+            [user.id, from_date, to_date]
+        )
+        return split_history_statistics(cursor.fetchall())
+
+    def get_user_planning_error_samples(self, user: UserEntity, from_date: str, to_date: str) -> PlanningErrorSamplesEntity:
+        cursor = self._connection.cursor()
+        cursor.execute(USER_PLANNING_ERROR_SAMPLES_SQL, [user.id, user.id, from_date, to_date])
+        return build_planning_error_samples(cursor.fetchone())
+
+
+def build_history_page(rows: list[tuple], limit: int) -> HistoryPageEntity:
+    '''
+    Собирает страницу из строк USER_HISTORY_PAGE_SQL, запрошенных с LIMIT limit + 1
+    '''
+    page_rows = rows[:limit]
+    return HistoryPageEntity(
+        history=[IncompleteHistoryEntity(id=row[0], name=row[1]) for row in page_rows],
+        next_key=(page_rows[-1][2], page_rows[-1][0]) if len(rows) > limit else None
+    )
+
+
+def split_history_statistics(rows: list[tuple]) -> HistoryStatisticsEntity:
+    '''
+    Раскладывает строки USER_HISTORY_STATISTICS_SQL по графикам статистики
+    '''
+    # grouping_set: 3 - вся история за промежуток, 1 - группировка по категориям, 2 - по дням недели
+    total = (0, 0, None, 0)
+    categories = []
+    weekdays = []
+    for grouping_set, category_id, name, color, day_name, task_count, failed_tasks, common_accuracy, accuracy, successful_planning in rows:
+        if grouping_set == 3:
+            total = (task_count, failed_tasks, common_accuracy, successful_planning)
+        elif grouping_set == 1 and category_id is not None:
+            categories.append((name, color, task_count, failed_tasks, accuracy, successful_planning))
+        elif grouping_set == 2:
+            weekdays.append((day_name, task_count))
+
+    task_count, failed_tasks, common_accuracy, successful_planning = total
+    return HistoryStatisticsEntity(
+        count_user_tasks_in_categories=[
+            (name, color, count) for name, color, count, *_ in sorted(categories, key=lambda category: category[2])
+        ],
+        common_user_accuracy=[(common_accuracy,)],
+        user_accuracy_by_categories=[
+            (name, color, accuracy) for name, color, _, _, accuracy, _ in sorted(
+                categories, key=lambda category: (category[4] is None, category[4] or 0)
+            )
+        ],
+        common_user_success_rate=[(task_count - failed_tasks, failed_tasks)],
+        user_success_rate_by_categories=[(name, color, count - failed) for name, color, count, failed, *_ in categories],
+        count_user_tasks_by_weekdays=weekdays,
+        common_count_user_successful_planned_tasks=[(successful_planning, task_count - successful_planning)],
+        count_user_successful_planned_tasks_by_categories=[
+            (name, color, planned) for name, color, *_, planned in categories if planned
+        ],
+    )
+
+
+def build_planning_error_samples(row: tuple) -> PlanningErrorSamplesEntity:
+    '''
+    Распаковывает строку USER_PLANNING_ERROR_SAMPLES_SQL в массивы numpy без поэлементного разбора в Python
+    '''
+    planned_seconds, execution_seconds, category_ids, categories = row
+    return PlanningErrorSamplesEntity(
+        planned_seconds=np.frombuffer(planned_seconds, dtype='>f8').astype(np.float64),
+        execution_seconds=np.frombuffer(execution_seconds, dtype='>f8').astype(np.float64),
+        category_ids=np.frombuffer(category_ids, dtype='>i8').astype(np.int64),
+        categories={int(category_id): tuple(category) for category_id, category in categories.items()}
+    )
@@ -0,0 +1,125 @@
+import re
+from datetime import date
+from typing import Optional
+
+from django.db import transaction
+from django.utils.connection import ConnectionProxy
+
+from task.helpers.date import get_month_start, add_months
+
+
+HISTORY_TABLE = 'history_history'
+# Секция для строк, под даты которых еще не создана помесячная секция
+HISTORY_DEFAULT_PARTITION = 'history_history_default'
+HISTORY_PARTITION_NAME_PATTERN = re.compile(r'^history_history_(\d{4})_(\d{2})$')
+
+
+def get_history_partition_name(month: date) -> str:
+    return f'{HISTORY_TABLE}_{month:%Y_%m}'
+
+
+class HistoryPartitionManager:
+    '''
+    Управляет помесячными секциями таблицы history_history, секционированной по диапазонам execution_date.
+    Секция месяца покрывает [первое число месяца, первое число следующего месяца)
+    '''
+
+    def __init__(self, connection: ConnectionProxy) -> None:
+        self._connection = connection
+
+    def get_partition_months(self) -> list[date]:
+        cursor = self._connection.cursor()
+        cursor.execute(
+            '''
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent
+            ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child
+            ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = %s;
+            ''',
+            [HISTORY_TABLE]
+        )
+        months = []
+        for (partition_name,) in cursor.fetchall():
+            match = HISTORY_PARTITION_NAME_PATTERN.match(partition_name)
+            if match:
+                months.append(date(int(match.group(1)), int(match.group(2)), 1))
+        return sorted(months)
+
+    @transaction.atomic
+    def create_partitions(self, from_month: date, to_month: date) -> list[str]:
+        '''
+        Создает недостающие секции за месяцы с from_month по to_month включительно.
+        Строки этих месяцев, которые уже попали в секцию по умолчанию, переносятся в новую секцию,
+        иначе Postgres не даст присоединить секцию с пересекающимся диапазоном
+        '''
+        existing_months = set(self.get_partition_months())
+        created_partitions = []
+        cursor = self._connection.cursor()
+        columns = ', '.join(self._get_stored_columns())
+        month = get_month_start(from_month)
+        while month <= to_month:
+            if month not in existing_months:
+                partition_name = get_history_partition_name(month)
+                bounds = [month, add_months(month, 1)]
+                # Секция обязана повторять генерируемые колонки таблицы, иначе Postgres не даст ее присоединить
+                cursor.execute(f'CREATE TABLE {partition_name} (LIKE {HISTORY_TABLE} INCLUDING GENERATED);')
+                cursor.execute(
+                    f'''
+                    WITH moved AS (
+                        DELETE FROM {HISTORY_DEFAULT_PARTITION}
+                        WHERE execution_date >= %s AND execution_date < %s
+                        RETURNING {columns}
+                    )
+                    INSERT INTO {partition_name} ({columns})
+                    SELECT {columns} FROM moved;
+                    ''',
+                    bounds
+                )
+                cursor.execute(
+                    f'ALTER TABLE {HISTORY_TABLE} ATTACH PARTITION {partition_name} FOR VALUES FROM (%s) TO (%s);',
+                    bounds
+                )
+                created_partitions.append(partition_name)
+            month = add_months(month, 1)
+        return created_partitions
+
+    def _get_stored_columns(self) -> list[str]:
+        '''
+        Колонки таблицы истории без генерируемых, в которые нельзя вставлять значения
+        '''
+        cursor = self._connection.cursor()
+        cursor.execute(
+            '''
+            SELECT attname
+            FROM pg_attribute
+            WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped AND attgenerated = ''
+            ORDER BY attnum;
+            ''',
+            [HISTORY_TABLE]
+        )
+        return [self._connection.ops.quote_name(row[0]) for row in cursor.fetchall()]
+
+    @transaction.atomic
+    def detach_partitions(self, before_month: date, archive_schema: Optional[str] = None) -> list[str]:
+        '''
+        Отсоединяет секции за месяцы раньше before_month. Отсоединенные секции переносятся в схему archive_schema,
+        а без нее удаляются. Дневные агрегаты истории не трогаются, поэтому статистика за эти месяцы остается
+        '''
+        detached_partitions = []
+        cursor = self._connection.cursor()
+        if archive_schema:
+            cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {self._connection.ops.quote_name(archive_schema)};')
+        for month in self.get_partition_months():
+            if month >= before_month:
+                break
+            partition_name = get_history_partition_name(month)
+            cursor.execute(f'ALTER TABLE {HISTORY_TABLE} DETACH PARTITION {partition_name};')
+            if archive_schema:
+                cursor.execute(f'ALTER TABLE {partition_name} SET SCHEMA {self._connection.ops.quote_name(archive_schema)};')
+            else:
+                cursor.execute(f'DROP TABLE {partition_name};')
+            detached_partitions.append(partition_name)
+        return detached_partitions
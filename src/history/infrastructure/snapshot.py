@@ -0,0 +1,38 @@
+import json
+import zlib
+
+from ..domain.entities import HistorySnapshotEntity, IncompleteHistoryEntity
+
+
+# Версия 1 - старый формат: JSONField, в котором каждый график был отдельной JSON-строкой, а история - списком словарей.
+# Версия 2 - графики хранятся как обычные JSON-объекты, а история по колонкам: {"id": [...], "name": [...]}
+SHARED_HISTORY_SNAPSHOT_VERSION = 2
+
+
+def encode_history_snapshot(snapshot: HistorySnapshotEntity, compress: bool) -> bytes:
+    payload = json.dumps(
+        {
+            'charts': snapshot.charts,
+            'history': {
+                'id': [history.id for history in snapshot.history],
+                'name': [history.name for history in snapshot.history],
+            },
+        },
+        ensure_ascii=False,
+        separators=(',', ':'),
+    ).encode('utf-8')
+    return zlib.compress(payload) if compress else payload
+
+
+def decode_history_snapshot(payload: bytes, version: int, compressed: bool) -> HistorySnapshotEntity:
+    if version != SHARED_HISTORY_SNAPSHOT_VERSION:
+        raise ValueError(f'Неизвестная версия сохраненной истории: {version}')
+    # BinaryField отдает memoryview, который json не принимает
+    payload = json.loads(zlib.decompress(payload) if compressed else bytes(payload))
+    return HistorySnapshotEntity(
+        charts=payload['charts'],
+        history=[
+            IncompleteHistoryEntity(id=history_id, name=name)
+            for history_id, name in zip(payload['history']['id'], payload['history']['name'])
+        ],
+    )
@@ -0,0 +1,186 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import threading
+import subprocess
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.handlers.asgi import ASGIHandler
+from django.contrib.auth import get_user_model
+from django.db import connection, connections, transaction
+from django.test import Client, RequestFactory
+
+from task.models import Task, Category
+from task.helpers.async_db import async_connection_pool
+from history.models import History, HistoryDailyRollup, SharedHistory
+from history.infrastructure.database_repository import HistoryDatabaseRepository
+from history.helpers.fake_history import generate_fake_history
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест главной страницы и страницы истории: синхронные представления под WSGI в потоках '
+        'против асинхронных представлений под ASGI в одном цикле событий при одинаковом числе одновременных клиентов. '
+        'Запросы проходят через обработчики Django со всеми middleware без сетевого сервера. '
+        'Каждый режим запускается в отдельном процессе с нужным ASYNC_VIEWS, данные коммитятся и удаляются после замеров'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--rows', type=int, default=10_000, help='Сколько записей истории у каждого пользователя')
+        parser.add_argument('--tasks', type=int, default=50, help='Сколько текущих задач у каждого пользователя')
+        parser.add_argument('--clients', type=int, nargs='+', default=[10, 100], help='Сколько запросов выполняется одновременно')
+        parser.add_argument('--requests', type=int, default=500, help='Сколько запросов делается при каждом числе клиентов')
+        parser.add_argument('--mode', choices=('wsgi', 'asgi'), help='Служебный: замер одного режима в текущем процессе')
+        parser.add_argument('--sessions', nargs='*', default=[], help='Служебный: ключи сессий пользователей')
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            self._run_mode(options['mode'], options['sessions'], options['clients'], options['requests'])
+            return
+
+        user_ids, session_keys = self._generate_users(options['users'], options['rows'], options['tasks'])
+        try:
+            for mode in ('wsgi', 'asgi'):
+                environment = dict(os.environ, ASYNC_VIEWS=str(mode == 'asgi'))
+                subprocess.run(
+                    [
+                        sys.executable, sys.argv[0], 'benchmark_async_views', '--mode', mode,
+                        '--clients', *map(str, options['clients']), '--requests', str(options['requests']),
+                        '--sessions', *session_keys,
+                    ],
+                    env=environment, check=True
+                )
+        finally:
+            self._delete_users(user_ids)
+
+    def _generate_users(self, count: int, rows: int, tasks: int) -> tuple[list[int], list[str]]:
+        repository = HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+        today = date.today()
+        with transaction.atomic():
+            users = [
+                get_user_model().objects.create(username=f'async_user{number}', email=f'async{number}@example.com')
+                for number in range(count)
+            ]
+            generate_fake_history(connection, [user.id for user in users], rows, today, 365)
+            categories = list(Category.objects.filter(is_custom=False))
+            Task.objects.bulk_create([
+                Task(
+                    name=f'Задача {number}', order=number, category=categories[number % len(categories)], user=user,
+                    deadline=today + timedelta(days=number % 60), planned_time=timedelta(minutes=30)
+                )
+                for user in users for number in range(tasks)
+            ])
+            for user in users:
+                repository.rebuild_history_rollup(user.id)
+        session_keys = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            session_keys.append(client.cookies['sessionid'].value)
+        return [user.id for user in users], session_keys
+
+    def _delete_users(self, user_ids: list[int]) -> None:
+        with transaction.atomic():
+            History.objects.filter(user_id__in=user_ids)._raw_delete(connection.alias)
+            HistoryDailyRollup.objects.filter(user_id__in=user_ids)._raw_delete(connection.alias)
+            get_user_model().objects.filter(id__in=user_ids).delete()
+
+    def _get_random_request(self, session_keys: list[str]) -> tuple[str, str, str]:
+        '''
+        Возвращает (path, query_string, cookie). Промежуток истории случайный, чтобы запросы не попадали в кеш статистики
+        '''
+        cookie = f'sessionid={random.choice(session_keys)}'
+        if random.random() < 0.5:
+            return '/', '', cookie
+        to_date = date.today()
+        from_date = to_date - timedelta(days=random.randint(30, 365))
+        return '/history/', urlencode({'from_date': from_date, 'to_date': to_date}), cookie
+
+    def _run_mode(self, mode: str, session_keys: list[str], clients_counts: list[int], requests: int) -> None:
+        run = self._run_wsgi if mode == 'wsgi' else lambda *args: asyncio.run(self._run_asgi(*args))
+        # Прогрев: импорты, компиляция шаблонов и первые соединения не входят в замеры
+        run(session_keys, 1, 20)
+        for clients in clients_counts:
+            timings, errors, elapsed = run(session_keys, clients, requests)
+            timings.sort()
+            self.stdout.write(
+                f'{mode.upper()}, {clients} клиентов: p50 {timings[len(timings) // 2] * 1000:.1f} мс, '
+                f'p95 {timings[int(len(timings) * 0.95)] * 1000:.1f} мс, {len(timings) / elapsed:.0f} запросов/с, '
+                f'ошибок {errors}'
+            )
+
+    def _run_wsgi(self, session_keys: list[str], clients: int, requests: int) -> tuple[list[float], int, float]:
+        handler = WSGIHandler()
+        factory = RequestFactory()
+        timings = []
+        statuses = []
+        lock = threading.Lock()
+        remaining = iter(range(requests))
+
+        def client():
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    path, query_string, cookie = self._get_random_request(session_keys)
+                    environ = factory.get(path, QUERY_STRING=query_string, HTTP_COOKIE=cookie, HTTP_HOST='localhost').environ
+                    start = time.perf_counter()
+                    response = handler(environ, lambda status, headers: statuses.append(status))
+                    b''.join(response)
+                    response.close()
+                    with lock:
+                        timings.append(time.perf_counter() - start)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        return timings, self._count_errors(statuses), elapsed
+
+    async def _run_asgi(self, session_keys: list[str], clients: int, requests: int) -> tuple[list[float], int, float]:
+        handler = ASGIHandler()
+        timings = []
+        statuses = []
+        remaining = iter(range(requests))
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(str(message['status']))
+
+        async def client():
+            while next(remaining, None) is not None:
+                path, query_string, cookie = self._get_random_request(session_keys)
+                scope = {
+                    'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+                    'path': path, 'query_string': query_string.encode('ascii'), 'root_path': '',
+                    'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode('ascii'))],
+                    'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+                }
+                start = time.perf_counter()
+                await handler(scope, receive, send)
+                timings.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+        await async_connection_pool.close()
+        return timings, self._count_errors(statuses), elapsed
+
+    def _count_errors(self, statuses: list[str]) -> int:
+        # Ошибки тоже входят в замеры времени: например, нехватка соединений к базе при большом числе потоков WSGI
+        return sum(not status.startswith('200') for status in statuses)
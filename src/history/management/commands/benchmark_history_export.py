@@ -0,0 +1,53 @@
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from task.models import Task
+from history.models import History, SharedHistory
+from history.infrastructure.database_repository import HistoryDatabaseRepository
+from history.services.use_cases import HistoryUseCase
+from history.helpers.fake_history import generate_fake_user_history
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет скорость потоковой выгрузки истории в CSV и NDJSON и пиковую память процесса во время выгрузки. '
+        'Данные генерируются во временной транзакции и откатываются после замеров'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+        parser.add_argument('--days', type=int, default=3 * 365)
+
+    def handle(self, *args, **options):
+        use_case = HistoryUseCase(HistoryDatabaseRepository(Task, History, SharedHistory, connection))
+        to_date = date.today()
+        from_date = to_date - timedelta(days=options['days'])
+
+        for rows in options['rows']:
+            with transaction.atomic():
+                user = get_user_model().objects.create(username='benchmark_user', email='benchmark@example.com')
+                generate_fake_user_history(connection, user.id, rows, to_date, options['days'])
+                user_entity = user.to_domain()
+                for export_format in use_case.history_export_formats:
+                    export = lambda: sum(
+                        len(chunk.encode('utf-8'))
+                        for chunk in use_case.stream_user_history_export(user_entity, str(from_date), str(to_date), export_format)
+                    )
+                    start = time.perf_counter()
+                    size = export()
+                    elapsed = time.perf_counter() - start
+                    # tracemalloc сильно замедляет выгрузку, поэтому память замеряется отдельным проходом
+                    tracemalloc.start()
+                    export()
+                    peak_memory = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    self.stdout.write(
+                        f'{rows} записей, {export_format}: {elapsed:.2f} с, {rows / elapsed:,.0f} строк/с, '
+                        f'{size / 1024 / 1024:.1f} МБ, пик памяти {peak_memory / 1024 / 1024:.1f} МБ'
+                    )
+                transaction.set_rollback(True)
@@ -0,0 +1,71 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from task.models import Task
+from history.models import History, SharedHistory
+from history.infrastructure.database_repository import HistoryDatabaseRepository
+from history.helpers.fake_history import generate_fake_user_history
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время подсчета статистики истории отдельными запросами по сырой истории и одним запросом по дневным агрегатам. '
+        'Данные генерируются во временной транзакции и откатываются после замеров'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--days', type=int, default=3 * 365, help='На сколько дней назад растягивается история')
+        parser.add_argument('--range-days', type=int, default=183, help='Длина запрашиваемого промежутка времени')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        repository = HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+        to_date = date.today()
+        from_date = to_date - timedelta(days=options['range_days'])
+
+        for rows in options['rows']:
+            with transaction.atomic():
+                user = get_user_model().objects.create(username='benchmark_user', email='benchmark@example.com')
+                generate_fake_user_history(connection, user.id, rows, to_date, options['days'])
+                repository.rebuild_history_rollup(user.id)
+                user_entity = user.to_domain()
+
+                separate_queries_time = self._measure(
+                    lambda: self._get_statistics_by_separate_queries(repository, user_entity, from_date, to_date),
+                    options['repeat']
+                )
+                rollup_time = self._measure(
+                    lambda: repository.get_user_history_statistics(user_entity, from_date, to_date),
+                    options['repeat']
+                )
+                transaction.set_rollback(True)
+
+            self.stdout.write(
+                f'{rows} записей: отдельные запросы {separate_queries_time * 1000:.1f} мс, '
+                f'один проход по дневным агрегатам {rollup_time * 1000:.1f} мс, '
+                f'ускорение x{separate_queries_time / rollup_time:.1f}'
+            )
+
+    def _measure(self, function, repeat: int) -> float:
+        function()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return sorted(timings)[len(timings) // 2]
+
+    def _get_statistics_by_separate_queries(self, repository: HistoryDatabaseRepository, user_entity, from_date: date, to_date: date) -> None:
+        repository.get_count_user_tasks_in_categories(user_entity, from_date, to_date)
+        repository.get_common_user_accuracy(user_entity, from_date, to_date)
+        repository.get_user_accuracy_by_categories(user_entity, from_date, to_date)
+        repository.get_user_common_success_rate(user_entity, from_date, to_date)
+        repository.get_user_success_rate_by_categories(user_entity, from_date, to_date)
+        repository.get_count_user_tasks_by_weekdays(user_entity, from_date, to_date)
+        repository.get_common_count_user_successful_planned_tasks(user_entity, from_date, to_date)
+        repository.get_count_user_successful_planned_tasks_by_categories(user_entity, from_date, to_date)
@@ -0,0 +1,118 @@
+import time
+import random
+import threading
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, connections, transaction
+
+from task.models import Task
+from task.helpers.concurrency import SequentialQueryExecutor, ThreadPoolQueryExecutor
+from history.models import History, HistoryDailyRollup, SharedHistory
+from history.infrastructure.database_repository import HistoryDatabaseRepository
+from history.services.use_cases import HistoryUseCase
+from history.helpers.fake_history import generate_fake_history
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает задержку и пропускную способность страницы статистики истории и восьми отдельных запросов статистики '
+        'при последовательном и параллельном выполнении независимых запросов под нагрузкой от нескольких одновременных клиентов. '
+        'Потоки пула работают на своих соединениях, поэтому данные коммитятся и удаляются после замеров'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--rows', type=int, default=20_000, help='Сколько записей истории у каждого пользователя')
+        parser.add_argument('--days', type=int, default=3 * 365, help='На сколько дней назад растягивается история')
+        parser.add_argument('--range-days', type=int, default=183, help='Длина запрашиваемого промежутка времени')
+        parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16], help='Сколько клиентов одновременно запрашивают статистику')
+        parser.add_argument('--requests', type=int, default=20, help='Сколько запросов делает каждый клиент')
+        parser.add_argument('--concurrency', type=int, default=8, help='Ограничение параллельных запросов в пуле')
+
+    def handle(self, *args, **options):
+        repository = HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+        to_date = date.today()
+        from_date = str(to_date - timedelta(days=options['range_days']))
+        user_ids = self._generate_users(repository, options['users'], options['rows'], to_date, options['days'])
+        pool_executor = ThreadPoolQueryExecutor(options['concurrency'])
+        try:
+            users = [user.to_domain() for user in get_user_model().objects.filter(id__in=user_ids)]
+            executors = (
+                ('по очереди', SequentialQueryExecutor()),
+                (f'параллельно, не больше {options["concurrency"]}', pool_executor),
+            )
+            for clients in options['clients']:
+                for executor_name, executor in executors:
+                    use_case = HistoryUseCase(repository, executor)
+                    workloads = (
+                        ('страница статистики', lambda user: use_case.get_user_history_statistics(user, from_date, str(to_date))),
+                        ('восемь запросов статистики', lambda user: executor.run(*self._get_separate_queries(repository, user, from_date, str(to_date)))),
+                    )
+                    for workload_name, workload in workloads:
+                        timings, elapsed = self._run_load(workload, users, clients, options['requests'])
+                        self.stdout.write(
+                            f'{clients} клиентов, {workload_name}, {executor_name}: '
+                            f'p50 {self._percentile(timings, 0.5) * 1000:.1f} мс, p95 {self._percentile(timings, 0.95) * 1000:.1f} мс, '
+                            f'{len(timings) / elapsed:.0f} запросов/с'
+                        )
+        finally:
+            pool_executor.shutdown()
+            self._delete_users(user_ids)
+
+    def _generate_users(self, repository: HistoryDatabaseRepository, count: int, rows: int, to_date: date, days: int) -> list[int]:
+        with transaction.atomic():
+            user_ids = [
+                get_user_model().objects.create(username=f'load_user{number}', email=f'load{number}@example.com').id
+                for number in range(count)
+            ]
+            generate_fake_history(connection, user_ids, rows, to_date, days)
+            for user_id in user_ids:
+                repository.rebuild_history_rollup(user_id)
+        return user_ids
+
+    def _delete_users(self, user_ids: list[int]) -> None:
+        with transaction.atomic():
+            History.objects.filter(user_id__in=user_ids)._raw_delete(connection.alias)
+            HistoryDailyRollup.objects.filter(user_id__in=user_ids)._raw_delete(connection.alias)
+            get_user_model().objects.filter(id__in=user_ids).delete()
+
+    def _run_load(self, workload, users: list, clients: int, requests: int) -> tuple[list[float], float]:
+        timings = []
+        lock = threading.Lock()
+
+        def client():
+            try:
+                for _ in range(requests):
+                    user = random.choice(users)
+                    start = time.perf_counter()
+                    workload(user)
+                    with lock:
+                        timings.append(time.perf_counter() - start)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return timings, time.perf_counter() - start
+
+    def _percentile(self, timings: list[float], percentile: float) -> float:
+        timings = sorted(timings)
+        return timings[min(len(timings) - 1, int(len(timings) * percentile))]
+
+    def _get_separate_queries(self, repository: HistoryDatabaseRepository, user, from_date: str, to_date: str) -> list:
+        return [
+            lambda: repository.get_count_user_tasks_in_categories(user, from_date, to_date),
+            lambda: repository.get_common_user_accuracy(user, from_date, to_date),
+            lambda: repository.get_user_accuracy_by_categories(user, from_date, to_date),
+            lambda: repository.get_user_common_success_rate(user, from_date, to_date),
+            lambda: repository.get_user_success_rate_by_categories(user, from_date, to_date),
+            lambda: repository.get_count_user_tasks_by_weekdays(user, from_date, to_date),
+            lambda: repository.get_common_count_user_successful_planned_tasks(user, from_date, to_date),
+            lambda: repository.get_count_user_successful_planned_tasks_by_categories(user, from_date, to_date),
+        ]
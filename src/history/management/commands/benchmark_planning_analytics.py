@@ -0,0 +1,84 @@
+import time
+import math
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from task.models import Task
+from history.models import History, SharedHistory
+from history.infrastructure.database_repository import HistoryDatabaseRepository
+from history.helpers.fake_history import generate_fake_user_history
+from history.services.planning_analytics import (
+    ESTIMATION_ERROR_PERCENTILES, ESTIMATION_ERROR_HISTOGRAM_EDGES,
+    get_estimation_error_percentiles, get_estimation_error_histogram, get_planning_bias_by_categories
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет выборку запланированного и реального времени задач одним запросом и подсчет аналитики ошибок оценки на numpy, '
+        'для сравнения та же аналитика считается циклами Python. '
+        'Данные генерируются во временной транзакции и откатываются после замеров'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--days', type=int, default=365, help='На сколько дней назад растягивается история')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        repository = HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+        to_date = date.today()
+        from_date = to_date - timedelta(days=options['days'])
+
+        for rows in options['rows']:
+            with transaction.atomic():
+                user = get_user_model().objects.create(username='benchmark_user', email='benchmark@example.com')
+                generate_fake_user_history(connection, user.id, rows, to_date, options['days'])
+                user_entity = user.to_domain()
+
+                query_time = self._measure(
+                    lambda: repository.get_user_planning_error_samples(user_entity, from_date, to_date),
+                    options['repeat']
+                )
+                samples = repository.get_user_planning_error_samples(user_entity, from_date, to_date)
+                numpy_time = self._measure(lambda: self._compute_with_numpy(samples), options['repeat'])
+                python_time = self._measure(lambda: self._compute_with_python(samples), options['repeat'])
+                transaction.set_rollback(True)
+
+            self.stdout.write(
+                f'{rows} записей ({samples.planned_seconds.size} с ненулевым временем): запрос {query_time * 1000:.1f} мс, '
+                f'аналитика на numpy {numpy_time * 1000:.1f} мс, циклами Python {python_time * 1000:.1f} мс, '
+                f'всего с numpy {(query_time + numpy_time) * 1000:.1f} мс'
+            )
+
+    def _measure(self, function, repeat: int) -> float:
+        function()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return sorted(timings)[len(timings) // 2]
+
+    def _compute_with_numpy(self, samples) -> None:
+        get_estimation_error_percentiles(samples)
+        get_estimation_error_histogram(samples)
+        get_planning_bias_by_categories(samples)
+
+    def _compute_with_python(self, samples) -> None:
+        planned_seconds = samples.planned_seconds.tolist()
+        execution_seconds = samples.execution_seconds.tolist()
+        category_ids = samples.category_ids.tolist()
+        absolute_errors = sorted(abs(execution - planned) / planned * 100 for planned, execution in zip(planned_seconds, execution_seconds))
+        [absolute_errors[min(len(absolute_errors) - 1, len(absolute_errors) * percentile // 100)] for percentile in ESTIMATION_ERROR_PERCENTILES]
+        edges = ESTIMATION_ERROR_HISTOGRAM_EDGES.tolist()
+        histogram = [0] * (len(edges) + 1)
+        log_ratio_sums, counts = {}, {}
+        for planned, execution, category_id in zip(planned_seconds, execution_seconds, category_ids):
+            error = (execution / planned - 1) * 100
+            histogram[sum(error >= edge for edge in edges)] += 1
+            log_ratio_sums[category_id] = log_ratio_sums.get(category_id, 0) + math.log(execution / planned)
+            counts[category_id] = counts.get(category_id, 0) + 1
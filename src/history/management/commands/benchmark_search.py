@@ -0,0 +1,69 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from task.models import Task
+from task.helpers.date import get_month_start
+from history.models import History, SharedHistory
+from history.infrastructure.database_repository import HistoryDatabaseRepository
+from history.infrastructure.partitions import HistoryPartitionManager
+from history.services.use_cases import HistoryUseCase
+from history.helpers.fake_history import generate_fake_history
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет полнотекстовый поиск по истории одного пользователя, пока пользователь набирает запрос: '
+        'каждый префикс запроса ищется как отдельный запрос, для полного запроса замеряется и вторая страница. '
+        'Данные генерируются во временной транзакции и откатываются после замеров'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--rows', type=int, default=10_000, help='Сколько записей истории у каждого пользователя')
+        parser.add_argument('--days', type=int, default=365, help='На сколько дней назад растягивается история')
+        parser.add_argument('--queries', nargs='+', default=['отчет', 'подготовить отчет', 'велосипед для семьи', 'несуществующее'])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        use_case = HistoryUseCase(HistoryDatabaseRepository(Task, History, SharedHistory, connection))
+        to_date = date.today()
+
+        with transaction.atomic():
+            # Как в рабочей базе, история лежит в помесячных секциях, а не в секции по умолчанию
+            HistoryPartitionManager(connection).create_partitions(get_month_start(to_date - timedelta(days=options['days'])), to_date)
+            user_ids = [
+                get_user_model().objects.create(username=f'benchmark_user{number}', email=f'benchmark{number}@example.com').id
+                for number in range(options['users'])
+            ]
+            generate_fake_history(connection, user_ids, options['rows'], to_date, options['days'])
+            user = get_user_model().objects.get(id=user_ids[0]).to_domain()
+            self.stdout.write(f'{options["users"] * options["rows"]} записей истории, {options["rows"]} у пользователя')
+
+            for query in options['queries']:
+                prefix_timings = [
+                    self._measure(lambda: use_case.search_user_history(user, query[:length]), options['repeat'])
+                    for length in range(1, len(query) + 1)
+                ]
+                first_page = use_case.search_user_history(user, query)
+                second_page_time = self._measure(
+                    lambda: use_case.search_user_history(user, query, first_page['next_cursor']), options['repeat']
+                ) if first_page['next_cursor'] else 0
+                self.stdout.write(
+                    f'"{query}": префиксы от {min(prefix_timings) * 1000:.1f} до {max(prefix_timings) * 1000:.1f} мс, '
+                    f'первая страница {prefix_timings[-1] * 1000:.1f} мс, вторая {second_page_time * 1000:.1f} мс, '
+                    f'найдено {len(first_page["results"])}{" и больше" if first_page["next_cursor"] else ""}'
+                )
+            transaction.set_rollback(True)
+
+    def _measure(self, function, repeat: int) -> float:
+        function()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return sorted(timings)[len(timings) // 2]
@@ -0,0 +1,85 @@
+import json
+import time
+import zlib
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from task.models import Task
+from task.serializers import to_json
+from history.models import History, SharedHistory, CustomJSONEncoder
+from history.infrastructure.database_repository import HistoryDatabaseRepository
+from history.infrastructure.snapshot import encode_history_snapshot, decode_history_snapshot, SHARED_HISTORY_SNAPSHOT_VERSION
+from history.services.use_cases import HistoryUseCase
+from history.helpers.fake_history import generate_fake_user_history
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает размер и время чтения сохраненных историй в старом формате (JSONField с графиками в виде JSON-строк) '
+        'и в снимке версии 2 без сжатия и со сжатием zlib. '
+        'Без --generate сравниваются сохраненные истории из базы, с --generate - сгенерированные во временной транзакции'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generate', type=int, default=0, help='Сколько сохраненных историй сгенерировать')
+        parser.add_argument('--history-rows', type=int, default=5_000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['generate']:
+                self._generate_shared_histories(options['generate'], options['history_rows'])
+            snapshots = [shared_history.to_domain().snapshot for shared_history in SharedHistory.objects.all()]
+            transaction.set_rollback(True)
+
+        if not snapshots:
+            self.stdout.write('Нет сохраненных историй, запустите команду с --generate')
+            return
+
+        legacy_payloads = [self._encode_legacy(snapshot) for snapshot in snapshots]
+        plain_payloads = [encode_history_snapshot(snapshot, compress=False) for snapshot in snapshots]
+        compressed_payloads = [encode_history_snapshot(snapshot, compress=True) for snapshot in snapshots]
+
+        results = [
+            ('старый формат', legacy_payloads, lambda payload: json.loads(payload)),
+            ('версия 2', plain_payloads, lambda payload: self._read_snapshot(payload, compressed=False)),
+            ('версия 2 + zlib', compressed_payloads, lambda payload: self._read_snapshot(payload, compressed=True)),
+        ]
+        self.stdout.write(f'Сохраненных историй: {len(snapshots)}')
+        for name, payloads, read in results:
+            size = sum(len(payload) for payload in payloads)
+            read_time = self._measure(lambda: [read(payload) for payload in payloads], options['repeat'])
+            self.stdout.write(
+                f'{name}: {size / 1024:.1f} КБ всего, {size / len(payloads) / 1024:.1f} КБ в среднем, '
+                f'чтение всех {read_time * 1000:.2f} мс'
+            )
+
+    def _generate_shared_histories(self, count: int, history_rows: int) -> None:
+        use_case = HistoryUseCase(HistoryDatabaseRepository(Task, History, SharedHistory, connection))
+        today = date.today()
+        for number in range(count):
+            user = get_user_model().objects.create(username=f'snapshot_user{number}', email=f'snapshot{number}@example.com')
+            generate_fake_user_history(connection, user.id, history_rows, today, 365)
+            use_case.save_user_shared_history(user.to_domain(), str(today - timedelta(days=30 * (1 + number % 6))), str(today))
+
+    def _encode_legacy(self, snapshot) -> bytes:
+        legacy_statistics = {name: to_json(chart) for name, chart in snapshot.charts.items()}
+        legacy_statistics['history'] = snapshot.history
+        return json.dumps(legacy_statistics, cls=CustomJSONEncoder).encode('utf-8')
+
+    def _read_snapshot(self, payload: bytes, compressed: bool) -> dict:
+        # Читатель формата версии 2 еще раз сериализует графики для шаблона, поэтому это входит в замер
+        snapshot = decode_history_snapshot(payload, SHARED_HISTORY_SNAPSHOT_VERSION, compressed)
+        return {name: to_json(chart) for name, chart in snapshot.charts.items()}
+
+    def _measure(self, function, repeat: int) -> float:
+        function()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return sorted(timings)[len(timings) // 2]
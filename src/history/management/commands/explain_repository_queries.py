@@ -0,0 +1,109 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from task.models import Task
+from task.infrastructure.database_repository import TaskDatabaseRepository
+from task.helpers.explain import capture_query_plans
+from task.helpers.fake_tasks import generate_fake_user_tasks
+from history.models import History, HistoryDailyRollup, SharedHistory
+from history.infrastructure.database_repository import HistoryDatabaseRepository
+from history.helpers.fake_history import generate_fake_history
+
+
+class Command(BaseCommand):
+    help = (
+        'Печатает EXPLAIN ANALYZE запросов HistoryDatabaseRepository и TaskDatabaseRepository '
+        'со старыми индексами внешних ключей и с индексами из Meta.indexes на сгенерированных данных. '
+        'Данные генерируются, а индексы подменяются во временной транзакции, которая затем откатывается. '
+        'Удаление индексов блокирует таблицы, поэтому запускать только на копии базы'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--history-rows-per-user', type=int, default=50_000)
+        parser.add_argument('--tasks-per-user', type=int, default=300)
+        parser.add_argument('--days', type=int, default=3 * 365)
+        parser.add_argument('--range-days', type=int, default=183)
+
+    def handle(self, *args, **options):
+        history_repository = HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+        task_repository = TaskDatabaseRepository(Task, connection)
+        today = date.today()
+        from_date = today - timedelta(days=options['range_days'])
+        index_names = [index.name for model in (History, HistoryDailyRollup, Task) for index in model._meta.indexes]
+
+        with transaction.atomic():
+            users = [
+                get_user_model().objects.create(username=f'explain_user{number}', email=f'explain{number}@example.com')
+                for number in range(options['users'])
+            ]
+            generate_fake_history(connection, [user.id for user in users], options['history_rows_per_user'], today, options['days'])
+            for user in users:
+                generate_fake_user_tasks(connection, user.id, options['tasks_per_user'], today)
+                history_repository.rebuild_history_rollup(user.id)
+            connection.cursor().execute('ANALYZE;')
+            user_entity = users[0].to_domain()
+
+            with transaction.atomic():
+                cursor = connection.cursor()
+                # Отложенные проверки внешних ключей от сгенерированных данных не дают менять индексы в этой транзакции
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE;')
+                for index_name in index_names:
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(index_name)};')
+                # Возвращаем отдельные индексы внешних ключей на пользователя, которые заменили составные индексы
+                for model in (History, HistoryDailyRollup, Task):
+                    table_name = model._meta.db_table
+                    cursor.execute(f'CREATE INDEX ON {connection.ops.quote_name(table_name)} (user_id);')
+                plans_before = self._explain(history_repository, task_repository, user_entity, from_date, today)
+                transaction.set_rollback(True)
+
+            plans_after = self._explain(history_repository, task_repository, user_entity, from_date, today)
+            transaction.set_rollback(True)
+
+        for method_name, (sql, plan_before) in plans_before.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n===== {method_name} ====='))
+            self.stdout.write(sql.strip())
+            self.stdout.write(self.style.WARNING('\n--- До (индексы внешних ключей) ---'))
+            self.stdout.write(plan_before)
+            self.stdout.write(self.style.SUCCESS('\n--- После (составные индексы) ---'))
+            self.stdout.write(plans_after[method_name][1])
+
+    def _explain(self, history_repository, task_repository, user_entity, from_date: date, to_date: date) -> dict[str, tuple[str, str]]:
+        history_methods = [
+            'get_user_history_statistics',
+            'get_count_user_tasks_in_categories',
+            'get_common_user_accuracy',
+            'get_user_accuracy_by_categories',
+            'get_user_common_success_rate',
+            'get_user_success_rate_by_categories',
+            'get_count_user_tasks_by_weekdays',
+            'get_common_count_user_successful_planned_tasks',
+            'get_count_user_successful_planned_tasks_by_categories',
+            'get_user_history',
+        ]
+        task_methods = [
+            'get_ordered_user_tasks',
+            'get_count_user_tasks_in_categories',
+        ]
+        # Календарь дедлайнов читается за промежуток месяцев
+        task_window_methods = [
+            'get_count_user_tasks_in_categories_by_deadlines',
+            'get_user_dashboard',
+        ]
+        plans = {}
+        for method_name in history_methods:
+            with capture_query_plans(connection) as captured_plans:
+                getattr(history_repository, method_name)(user_entity, from_date, to_date)
+            plans[f'HistoryDatabaseRepository.{method_name}'] = captured_plans[0]
+        for method_name in task_methods:
+            with capture_query_plans(connection) as captured_plans:
+                getattr(task_repository, method_name)(user_entity)
+            plans[f'TaskDatabaseRepository.{method_name}'] = captured_plans[0]
+        for method_name in task_window_methods:
+            with capture_query_plans(connection) as captured_plans:
+                getattr(task_repository, method_name)(user_entity, from_date, to_date)
+            plans[f'TaskDatabaseRepository.{method_name}'] = captured_plans[0]
+        return plans
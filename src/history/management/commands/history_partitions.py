@@ -0,0 +1,36 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from history.infrastructure.partitions import HistoryPartitionManager, get_month_start, add_months
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает помесячные секции истории на несколько месяцев вперед и отсоединяет секции старше срока хранения. '
+        'Отсоединенные секции переносятся в архивную схему или удаляются, дневные агрегаты за эти месяцы остаются, '
+        'поэтому после архивации history_rollup --verify будет сообщать о расхождениях за архивные дни. '
+        'Запускать по расписанию, например раз в день'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3, help='На сколько месяцев вперед от текущего создавать секции')
+        parser.add_argument('--retain', type=int, default=None, help='Сколько последних месяцев, включая текущий, хранить в таблице истории')
+        parser.add_argument('--archive-schema', default='history_archive', help='Схема, в которую переносятся отсоединенные секции')
+        parser.add_argument('--drop', action='store_true', help='Удалять отсоединенные секции вместо переноса в архивную схему')
+
+    def handle(self, *args, **options):
+        if options['retain'] is not None and options['retain'] < 1:
+            raise CommandError('--retain должен быть не меньше 1')
+
+        manager = HistoryPartitionManager(connection)
+        current_month = get_month_start(date.today())
+        for partition_name in manager.create_partitions(current_month, add_months(current_month, options['ahead'])):
+            self.stdout.write(f'Создана секция {partition_name}')
+
+        if options['retain'] is not None:
+            archive_schema = None if options['drop'] else options['archive_schema']
+            for partition_name in manager.detach_partitions(add_months(current_month, 1 - options['retain']), archive_schema):
+                action = 'удалена' if options['drop'] else f'перенесена в схему {archive_schema}'
+                self.stdout.write(f'Секция {partition_name} отсоединена и {action}')
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from task.models import Task
+from history.models import History, SharedHistory
+from history.infrastructure.database_repository import HistoryDatabaseRepository
+
+
+class Command(BaseCommand):
+    help = 'Заполняет таблицу дневных агрегатов истории из сырой истории и проверяет, что агрегаты с ней совпадают'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backfill', action='store_true', help='Пересчитать агрегаты из сырой истории')
+        parser.add_argument('--verify', action='store_true', help='Сравнить агрегаты с сырой историей')
+        parser.add_argument('--user', type=int, default=None, help='id пользователя, по умолчанию все пользователи')
+
+    def handle(self, *args, **options):
+        if not options['backfill'] and not options['verify']:
+            raise CommandError('Нужно указать --backfill, --verify или оба флага')
+
+        repository = HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+        if options['backfill']:
+            repository.rebuild_history_rollup(options['user'])
+            self.stdout.write('Агрегаты истории пересчитаны')
+
+        if options['verify']:
+            mismatches = repository.get_history_rollup_mismatches(options['user'])
+            for user_id, category_id, day, status, raw_count, rollup_count, raw_accuracy_sum, rollup_accuracy_sum in mismatches:
+                self.stdout.write(
+                    f'user={user_id} category={category_id} day={day} status={status}: '
+                    f'история {raw_count} задач ({raw_accuracy_sum}), агрегаты {rollup_count} задач ({rollup_accuracy_sum})'
+                )
+            if mismatches:
+                raise CommandError(f'Агрегаты не совпадают с историей по {len(mismatches)} ключам')
+            self.stdout.write('Агрегаты совпадают с историей')
@@ -0,0 +1,60 @@
+# Generated by Django 4.2 on 2026-10-18 10:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0003_auto_20250820_1111'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('history', '0007_rename_sharedhistorystatistics_sharedhistory_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistoryDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День, в который были выполнены задачи')),
+                ('status', models.CharField(choices=[('SUCCESSFUL', 'Успешно выполнена вовремя'), ('OUT_OF_DEADLINE', 'Выполнена с опозданием'), ('FAILED', 'Провалена')], max_length=50, verbose_name='Статус задач')),
+                ('task_count', models.IntegerField(default=0, verbose_name='Количество задач')),
+                ('accuracy_sum', models.DecimalField(decimal_places=12, default=0, max_digits=24, verbose_name='Сумма точностей планирования в процентах')),
+                ('accuracy_count', models.IntegerField(default=0, verbose_name='Количество задач с ненулевым временем, у которых запланированное время не совпало с реальным')),
+                ('zero_time_count', models.IntegerField(default=0, verbose_name='Количество задач с нулевым запланированным или реальным временем')),
+                ('successful_planning_count', models.IntegerField(default=0, verbose_name='Количество задач, у которых запланированное время совпало с реальным')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='task.category', verbose_name='Категория задач')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь, выполнивший задачи')),
+            ],
+            options={
+                'verbose_name': 'Предпосчитанные за каждый день агрегаты истории пользователя для быстрого подсчета статистики',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='historydailyrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'category', 'day', 'status'), name='history_daily_rollup_key'),
+        ),
+        migrations.RunSQL(
+            sql='''
+            INSERT INTO history_historydailyrollup
+            (user_id, category_id, day, status, task_count, accuracy_sum, accuracy_count, zero_time_count, successful_planning_count)
+            SELECT
+            hh.user_id, hh.category_id, hh.execution_date, hh.status,
+            count(hh.id),
+            coalesce(sum(
+            CASE
+                WHEN extract(epoch FROM hh.planned_time) = 0 OR extract(epoch FROM hh.execution_time) = 0 THEN NULL
+                WHEN hh.planned_time < hh.execution_time THEN (extract(epoch FROM hh.planned_time) / extract(epoch FROM hh.execution_time)) * 100
+                WHEN hh.planned_time > hh.execution_time THEN (extract(epoch FROM hh.execution_time) / extract(epoch FROM hh.planned_time)) * 100
+            END), 0),
+            count(hh.id) FILTER (WHERE extract(epoch FROM hh.planned_time) <> 0 AND extract(epoch FROM hh.execution_time) <> 0 AND hh.planned_time <> hh.execution_time),
+            count(hh.id) FILTER (WHERE extract(epoch FROM hh.planned_time) = 0 OR extract(epoch FROM hh.execution_time) = 0),
+            count(hh.id) FILTER (WHERE hh.planned_time = hh.execution_time)
+            FROM history_history hh
+            GROUP BY hh.user_id, hh.category_id, hh.execution_date, hh.status;
+            ''',
+            reverse_sql='DELETE FROM history_historydailyrollup;'
+        ),
+    ]
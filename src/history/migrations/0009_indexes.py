@@ -0,0 +1,46 @@
+# Generated by Django 4.2 on 2026-10-18 11:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.contrib.postgres.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся конкурентно, чтобы не блокировать запись в таблицы, а это невозможно внутри транзакции
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('history', '0008_historydailyrollup'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='history',
+            index=models.Index(fields=['user', 'execution_date'], include=('category', 'status', 'planned_time', 'execution_time'), name='history_user_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='history',
+            index=models.Index(condition=models.Q(('status', 'FAILED')), fields=['user', 'execution_date'], include=('category',), name='history_user_date_failed_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='history',
+            index=models.Index(condition=models.Q(('planned_time', models.F('execution_time'))), fields=['user', 'execution_date'], include=('category',), name='history_user_date_planned_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='historydailyrollup',
+            index=models.Index(fields=['user', 'day'], name='history_rollup_user_day_idx'),
+        ),
+        # Отдельные индексы внешних ключей удаляются после того, как их заменили составные индексы
+        migrations.AlterField(
+            model_name='history',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь, создавший задачу'),
+        ),
+        migrations.AlterField(
+            model_name='historydailyrollup',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь, выполнивший задачи'),
+        ),
+    ]
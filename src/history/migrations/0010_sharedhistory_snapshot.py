@@ -0,0 +1,91 @@
+# Generated by Django 4.2 on 2026-10-18 12:40
+
+import json
+import zlib
+
+from django.db import migrations, models
+
+import history.models
+
+
+CHART_NAMES = (
+    'count_user_tasks_in_categories',
+    'common_user_accuracy',
+    'user_accuracy_by_categories',
+    'common_user_success_rate',
+    'user_success_rate_by_categories',
+    'count_user_tasks_by_weekdays',
+    'common_count_user_successful_planned_tasks',
+    'count_user_successful_planned_tasks_by_categories',
+)
+
+
+def convert_history_statistics_to_snapshots(apps, schema_editor):
+    '''
+    Переводит сохраненные истории из JSONField, где каждый график был JSON-строкой, в сжатый снимок версии 2
+    '''
+    SharedHistory = apps.get_model('history', 'SharedHistory')
+    for shared_history in SharedHistory.objects.only('key', 'history_statistics').iterator(chunk_size=500):
+        statistics = shared_history.history_statistics
+        history = statistics.get('history', [])
+        payload = json.dumps(
+            {
+                'charts': {name: json.loads(statistics[name]) for name in CHART_NAMES},
+                'history': {'id': [row['id'] for row in history], 'name': [row['name'] for row in history]},
+            },
+            ensure_ascii=False,
+            separators=(',', ':'),
+        ).encode('utf-8')
+        shared_history.snapshot = zlib.compress(payload)
+        shared_history.snapshot_version = 2
+        shared_history.snapshot_compressed = True
+        shared_history.save(update_fields=['snapshot', 'snapshot_version', 'snapshot_compressed'])
+
+
+def convert_snapshots_to_history_statistics(apps, schema_editor):
+    SharedHistory = apps.get_model('history', 'SharedHistory')
+    for shared_history in SharedHistory.objects.only('key', 'snapshot', 'snapshot_compressed').iterator(chunk_size=500):
+        snapshot = bytes(shared_history.snapshot)
+        snapshot = json.loads(zlib.decompress(snapshot) if shared_history.snapshot_compressed else snapshot)
+        statistics = {name: json.dumps(chart) for name, chart in snapshot['charts'].items()}
+        statistics['history'] = [
+            {'id': history_id, 'name': name} for history_id, name in zip(snapshot['history']['id'], snapshot['history']['name'])
+        ]
+        shared_history.history_statistics = statistics
+        shared_history.save(update_fields=['history_statistics'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0009_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sharedhistory',
+            name='snapshot',
+            field=models.BinaryField(default=b'', verbose_name='Сохраненная история пользователя по определенному промежутку времени в формате snapshot_version'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='sharedhistory',
+            name='snapshot_compressed',
+            field=models.BooleanField(default=True, verbose_name='Сжата ли сохраненная история zlib'),
+        ),
+        migrations.AddField(
+            model_name='sharedhistory',
+            name='snapshot_version',
+            field=models.PositiveSmallIntegerField(default=2, verbose_name='Версия формата сохраненной истории'),
+        ),
+        migrations.AlterField(
+            model_name='sharedhistory',
+            name='history_statistics',
+            field=models.JSONField(encoder=history.models.CustomJSONEncoder, null=True, verbose_name='Сохраненная история пользователя по определенному промежутку времени'),
+        ),
+        migrations.RunPython(convert_history_statistics_to_snapshots, convert_snapshots_to_history_statistics),
+        migrations.RemoveField(
+            model_name='sharedhistory',
+            name='history_statistics',
+        ),
+    ]
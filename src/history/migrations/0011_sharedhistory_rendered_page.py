@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 11:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('history', '0010_sharedhistory_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sharedhistory',
+            name='rendered_page',
+            field=models.BinaryField(null=True, verbose_name='Сжатая gzip страница сохраненной истории для анонимных посетителей'),
+        ),
+        migrations.AddField(
+            model_name='sharedhistory',
+            name='rendered_page_etag',
+            field=models.CharField(max_length=64, null=True, verbose_name='Хеш отрисованной страницы сохраненной истории'),
+        ),
+    ]
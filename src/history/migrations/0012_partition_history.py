@@ -0,0 +1,100 @@
+from datetime import date
+
+from django.db import migrations
+
+from history.infrastructure.partitions import HistoryPartitionManager, get_month_start, add_months
+
+
+# Сколько будущих месяцев получают секции сразу, дальше их создает команда history_partitions
+PARTITIONS_AHEAD_MONTHS = 3
+
+
+def create_history_partitions(apps, schema_editor):
+    cursor = schema_editor.connection.cursor()
+    cursor.execute('SELECT min(execution_date) FROM history_history_unpartitioned;')
+    first_day = cursor.fetchone()[0] or date.today()
+    HistoryPartitionManager(schema_editor.connection).create_partitions(
+        get_month_start(first_day), add_months(get_month_start(date.today()), PARTITIONS_AHEAD_MONTHS)
+    )
+
+
+class Migration(migrations.Migration):
+    # Секционированная таблица заменяет старую целиком, состояние моделей не меняется.
+    # Первичный ключ секционированной таблицы обязан включать ключ секционирования, поэтому он (id, execution_date),
+    # а уникальность id обеспечивает последовательность
+    dependencies = [
+        ('task', '0004_indexes'),
+        ('user', '0001_initial'),
+        ('history', '0011_sharedhistory_rendered_page'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='''
+            ALTER TABLE history_history RENAME TO history_history_unpartitioned;
+            DROP INDEX history_user_date_idx, history_user_date_failed_idx, history_user_date_planned_idx;
+
+            CREATE TABLE history_history (
+                id bigint NOT NULL,
+                name varchar(290) NOT NULL,
+                planned_time interval NOT NULL,
+                execution_time interval NOT NULL,
+                execution_date date NOT NULL,
+                status varchar(50) NOT NULL,
+                category_id bigint NULL,
+                user_id bigint NOT NULL,
+                CONSTRAINT history_history_partitioned_pkey PRIMARY KEY (id, execution_date),
+                CONSTRAINT history_history_category_id_fk_task_category_id FOREIGN KEY (category_id) REFERENCES task_category (id) DEFERRABLE INITIALLY DEFERRED,
+                CONSTRAINT history_history_user_id_fk_user_user_id FOREIGN KEY (user_id) REFERENCES user_user (id) DEFERRABLE INITIALLY DEFERRED
+            ) PARTITION BY RANGE (execution_date);
+            CREATE TABLE history_history_default PARTITION OF history_history DEFAULT;
+
+            CREATE INDEX history_history_partitioned_category_id ON history_history (category_id);
+            CREATE INDEX history_user_date_idx ON history_history (user_id, execution_date) INCLUDE (category_id, status, planned_time, execution_time);
+            CREATE INDEX history_user_date_failed_idx ON history_history (user_id, execution_date) INCLUDE (category_id) WHERE status = 'FAILED';
+            CREATE INDEX history_user_date_planned_idx ON history_history (user_id, execution_date) INCLUDE (category_id) WHERE planned_time = execution_time;
+            ''',
+            reverse_sql='''
+            DROP TABLE history_history;
+            ALTER TABLE history_history_unpartitioned RENAME TO history_history;
+            CREATE INDEX history_user_date_idx ON history_history (user_id, execution_date) INCLUDE (category_id, status, planned_time, execution_time);
+            CREATE INDEX history_user_date_failed_idx ON history_history (user_id, execution_date) INCLUDE (category_id) WHERE status = 'FAILED';
+            CREATE INDEX history_user_date_planned_idx ON history_history (user_id, execution_date) INCLUDE (category_id) WHERE planned_time = execution_time;
+            '''
+        ),
+        migrations.RunPython(create_history_partitions, migrations.RunPython.noop),
+        migrations.RunSQL(
+            sql='''
+            INSERT INTO history_history (id, name, planned_time, execution_time, execution_date, status, category_id, user_id)
+            SELECT id, name, planned_time, execution_time, execution_date, status, category_id, user_id
+            FROM history_history_unpartitioned;
+            -- Отложенные проверки внешних ключей от перенесенных строк не дают переименовывать ограничения таблицы
+            SET CONSTRAINTS ALL IMMEDIATE;
+
+            -- Последовательность identity-колонки удаляется вместе со старой таблицей, поэтому id продолжает новая
+            CREATE SEQUENCE history_history_partitioned_id_seq OWNED BY history_history.id;
+            SELECT setval('history_history_partitioned_id_seq', coalesce(max(id), 0) + 1, false) FROM history_history;
+            ALTER TABLE history_history ALTER COLUMN id SET DEFAULT nextval('history_history_partitioned_id_seq');
+
+            DROP TABLE history_history_unpartitioned;
+            ALTER SEQUENCE history_history_partitioned_id_seq RENAME TO history_history_id_seq;
+            ALTER TABLE history_history RENAME CONSTRAINT history_history_partitioned_pkey TO history_history_pkey;
+            ALTER INDEX history_history_partitioned_category_id RENAME TO history_history_category_id;
+            ''',
+            reverse_sql='''
+            SET CONSTRAINTS ALL IMMEDIATE;
+            ALTER SEQUENCE history_history_id_seq RENAME TO history_history_partitioned_id_seq;
+            ALTER TABLE history_history RENAME CONSTRAINT history_history_pkey TO history_history_partitioned_pkey;
+            ALTER INDEX history_history_category_id RENAME TO history_history_partitioned_category_id;
+
+            CREATE TABLE history_history_unpartitioned (LIKE history_history);
+            ALTER TABLE history_history_unpartitioned ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY (SEQUENCE NAME history_history_id_seq);
+            INSERT INTO history_history_unpartitioned SELECT * FROM history_history;
+            SELECT setval('history_history_id_seq', coalesce(max(id), 0) + 1, false) FROM history_history_unpartitioned;
+            ALTER TABLE history_history_unpartitioned ADD CONSTRAINT history_history_pkey PRIMARY KEY (id);
+            ALTER TABLE history_history_unpartitioned ADD CONSTRAINT history_history_category_id_fk_task_category_id FOREIGN KEY (category_id) REFERENCES task_category (id) DEFERRABLE INITIALLY DEFERRED;
+            ALTER TABLE history_history_unpartitioned ADD CONSTRAINT history_history_user_id_fk_user_user_id FOREIGN KEY (user_id) REFERENCES user_user (id) DEFERRABLE INITIALLY DEFERRED;
+            CREATE INDEX history_history_category_id ON history_history_unpartitioned (category_id);
+            '''
+        ),
+    ]
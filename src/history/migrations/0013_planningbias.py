@@ -0,0 +1,52 @@
+# Generated by Django 4.2 on 2026-10-18 11:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0004_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('history', '0012_partition_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanningBias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sample_count', models.IntegerField(default=0, verbose_name='Количество выполненных задач с ненулевым временем')),
+                ('log_ratio_mean', models.FloatField(default=0, verbose_name='Среднее логарифма отношения реального времени к запланированному')),
+                ('log_ratio_m2', models.FloatField(default=0, verbose_name='Сумма квадратов отклонений логарифма отношения от среднего (M2 алгоритма Уэлфорда)')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='task.category', verbose_name='Категория задач')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Систематическая ошибка оценки времени пользователя в категории, обновляемая при каждом сохранении задачи в историю',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='planningbias',
+            constraint=models.UniqueConstraint(fields=('user', 'category'), name='planning_bias_key'),
+        ),
+        migrations.RunSQL(
+            sql='''
+            INSERT INTO history_planningbias (user_id, category_id, sample_count, log_ratio_mean, log_ratio_m2)
+            SELECT
+            user_id, category_id, count(*), avg(log_ratio), var_pop(log_ratio) * count(*)
+            FROM (
+                SELECT
+                hh.user_id, hh.category_id,
+                ln(date_part('epoch', hh.execution_time) / date_part('epoch', hh.planned_time)) AS log_ratio
+                FROM history_history hh
+                WHERE hh.status <> 'FAILED' AND hh.category_id IS NOT NULL AND
+                hh.planned_time > interval '0' AND hh.execution_time > interval '0'
+            ) samples
+            GROUP BY user_id, category_id;
+            ''',
+            reverse_sql='DELETE FROM history_planningbias;'
+        ),
+    ]
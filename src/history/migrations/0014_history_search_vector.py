@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Колонка и индекс создаются на секционированной таблице и наследуются всеми секциями,
+    # в том числе теми, которые потом создает команда history_partitions.
+    # Лексема владельца '#<user_id>' и fastupdate = off устроены так же, как в task_task (миграция task 0007)
+    dependencies = [
+        ('history', '0013_planningbias'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='''
+            ALTER TABLE history_history ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                to_tsvector('russian', name) || array_to_tsvector(ARRAY['#' || user_id::text])
+            ) STORED;
+            CREATE INDEX history_search_vector_idx ON history_history USING gin (search_vector) WITH (fastupdate = off);
+            ''',
+            reverse_sql='''
+            ALTER TABLE history_history DROP COLUMN search_vector;
+            '''
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Удаление записи истории, категорию которой удалили, раньше не находило строку агрегатов без категории
+    # (NULL не конфликтуют в уникальном ограничении) и добавляло рядом строку с отрицательными суммами.
+    # Строки одного ключа без категории сливаются в одну, строки без задач удаляются
+    dependencies = [
+        ('history', '0014_history_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='''
+            WITH removed AS (
+                DELETE FROM history_historydailyrollup
+                WHERE category_id IS NULL
+                RETURNING *
+            )
+            INSERT INTO history_historydailyrollup
+            (user_id, category_id, day, status, task_count, accuracy_sum, accuracy_count, zero_time_count, successful_planning_count)
+            SELECT
+            user_id, NULL, day, status,
+            sum(task_count), sum(accuracy_sum), sum(accuracy_count), sum(zero_time_count), sum(successful_planning_count)
+            FROM removed
+            GROUP BY user_id, day, status
+            HAVING sum(task_count) > 0;
+            DELETE FROM history_historydailyrollup WHERE task_count <= 0;
+            ''',
+            reverse_sql=migrations.RunSQL.noop
+        ),
+    ]
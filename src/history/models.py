@@ -1,10 +1,12 @@
 import json
 from django.db import models
+from django.conf import settings
 from django.contrib.auth import get_user_model
 
 from task.models import Category, DomainQuerySet
 from user.models import User
 from .domain.entities import HistoryEntity, SharedHistoryEntity
+from .infrastructure.snapshot import SHARED_HISTORY_SNAPSHOT_VERSION, encode_history_snapshot, decode_history_snapshot
 
 
 class History(models.Model):
@@ -20,13 +22,15 @@ class History(models.Model):
 
     name = models.CharField(max_length=290, null=False, blank=False, verbose_name='Название задачи')
     category = models.ForeignKey(to=Category, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Категория задачи')
-    user = models.ForeignKey(to=get_user_model(), on_delete=models.CASCADE, null=False, blank=False, verbose_name='Пользователь, создавший задачу')
+    # Отдельный индекс не нужен, его заменяют составные индексы из Meta.indexes, которые начинаются с user
+    user = models.ForeignKey(to=get_user_model(), on_delete=models.CASCADE, null=False, blank=False, db_index=False, verbose_name='Пользователь, создавший задачу')
     planned_time = models.DurationField(null=False, blank=False, verbose_name='Время, которое было изначально запланировано на процесс выполнения задачи')
     execution_time = models.DurationField(null=False, blank=False, verbose_name='Время, которое реально потребовалось на выполнение задачи')
     execution_date = models.DateField(null=False, blank=False, auto_now_add=True, verbose_name='День, в который была выполнена задача')
     status = models.CharField(max_length=50, null=False, blank=False, choices=STATUS_CHOICES, verbose_name='Статус, к примеру, была задача выполнена или провалена')
 
     objects = DomainQuerySet.as_manager()
+    domain_related_fields = ('category__user', 'user')
 
     @classmethod
     def from_domain(cls, entity: HistoryEntity):
@@ -34,7 +38,7 @@ class History(models.Model):
             id=entity.id,
             name=entity.name,
             user=User.from_domain(entity.user),
-            category=Category.from_domain(entity.category),
+            category=Category.from_domain(entity.category) if entity.category else None,
             planned_time=entity.planned_time,
             execution_time=entity.execution_time,
             execution_date=entity.execution_date,
@@ -46,7 +50,7 @@ class History(models.Model):
             id=self.id,
             name=self.name,
             user=self.user.to_domain(),
-            category=self.category.to_domain(),
+            category=self.category.to_domain() if self.category else None,
             planned_time=self.planned_time,
             execution_time=self.execution_time,
             execution_date=self.execution_date,
@@ -56,6 +60,67 @@ class History(models.Model):
 
     class Meta:
         verbose_name = 'История выполненных и проваленных задач. Одна строка - одна задача.'
+        # Таблица секционирована по месяцам execution_date (миграция 0012, команда history_partitions),
+        # поэтому запросы к истории должны ограничивать execution_date, чтобы Postgres отбрасывал лишние секции
+        indexes = [
+            # Все запросы статистики фильтруют историю по пользователю и промежутку дат,
+            # поэтому остальные колонки агрегатов включены в индекс для index only scan
+            models.Index(
+                fields=['user', 'execution_date'],
+                include=['category', 'status', 'planned_time', 'execution_time'],
+                name='history_user_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'execution_date'],
+                include=['category'],
+                condition=models.Q(status='FAILED'),
+                name='history_user_date_failed_idx'
+            ),
+            models.Index(
+                fields=['user', 'execution_date'],
+                include=['category'],
+                condition=models.Q(planned_time=models.F('execution_time')),
+                name='history_user_date_planned_idx'
+            ),
+        ]
+
+
+class HistoryDailyRollup(models.Model):
+    user = models.ForeignKey(to=get_user_model(), on_delete=models.CASCADE, null=False, blank=False, db_index=False, verbose_name='Пользователь, выполнивший задачи')
+    category = models.ForeignKey(to=Category, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Категория задач')
+    day = models.DateField(null=False, blank=False, verbose_name='День, в который были выполнены задачи')
+    status = models.CharField(max_length=50, null=False, blank=False, choices=History.STATUS_CHOICES, verbose_name='Статус задач')
+    task_count = models.IntegerField(default=0, verbose_name='Количество задач')
+    accuracy_sum = models.DecimalField(max_digits=24, decimal_places=12, default=0, verbose_name='Сумма точностей планирования в процентах')
+    accuracy_count = models.IntegerField(default=0, verbose_name='Количество задач с ненулевым временем, у которых запланированное время не совпало с реальным')
+    zero_time_count = models.IntegerField(default=0, verbose_name='Количество задач с нулевым запланированным или реальным временем')
+    successful_planning_count = models.IntegerField(default=0, verbose_name='Количество задач, у которых запланированное время совпало с реальным')
+
+
+    class Meta:
+        verbose_name = 'Предпосчитанные за каждый день агрегаты истории пользователя для быстрого подсчета статистики'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category', 'day', 'status'], name='history_daily_rollup_key'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'day'], name='history_rollup_user_day_idx'),
+        ]
+
+
+class PlanningBias(models.Model):
+    user = models.ForeignKey(to=get_user_model(), on_delete=models.CASCADE, null=False, blank=False, db_index=False, verbose_name='Пользователь')
+    category = models.ForeignKey(to=Category, on_delete=models.CASCADE, null=False, blank=False, verbose_name='Категория задач')
+    sample_count = models.IntegerField(default=0, verbose_name='Количество выполненных задач с ненулевым временем')
+    log_ratio_mean = models.FloatField(default=0, verbose_name='Среднее логарифма отношения реального времени к запланированному')
+    log_ratio_m2 = models.FloatField(default=0, verbose_name='Сумма квадратов отклонений логарифма отношения от среднего (M2 алгоритма Уэлфорда)')
+
+
+    class Meta:
+        verbose_name = 'Систематическая ошибка оценки времени пользователя в категории, обновляемая при каждом сохранении задачи в историю'
+        constraints = [
+            # Индекс ограничения начинается с user и заменяет отдельный индекс для чтения всех категорий пользователя
+            models.UniqueConstraint(fields=['user', 'category'], name='planning_bias_key'),
+        ]
 
 
 class CustomJSONEncoder(json.JSONEncoder):
@@ -70,9 +135,14 @@ class SharedHistory(models.Model):
     user = models.ForeignKey(to=get_user_model(), on_delete=models.CASCADE, null=False, blank=False, verbose_name='Пользователь, сохранивший статистику')
     from_date = models.DateField(verbose_name='Дата, начиная с которой будет показана история', null=True)
     to_date = models.DateField(verbose_name='Крайняя дата, по которую будет показана показана история', null=True)
-    history_statistics = models.JSONField(encoder=CustomJSONEncoder, verbose_name='Сохраненная история пользователя по определенному промежутку времени')
+    snapshot = models.BinaryField(verbose_name='Сохраненная история пользователя по определенному промежутку времени в формате snapshot_version')
+    snapshot_version = models.PositiveSmallIntegerField(default=SHARED_HISTORY_SNAPSHOT_VERSION, verbose_name='Версия формата сохраненной истории')
+    snapshot_compressed = models.BooleanField(default=True, verbose_name='Сжата ли сохраненная история zlib')
+    rendered_page = models.BinaryField(null=True, verbose_name='Сжатая gzip страница сохраненной истории для анонимных посетителей')
+    rendered_page_etag = models.CharField(max_length=64, null=True, verbose_name='Хеш отрисованной страницы сохраненной истории')
 
     objects = DomainQuerySet.as_manager()
+    domain_related_fields = ('user',)
 
 
     class Meta:
@@ -86,7 +156,9 @@ class SharedHistory(models.Model):
             user=User.from_domain(entity.user),
             from_date=entity.from_date,
             to_date=entity.to_date,
-            history_statistics=entity.history_statistics
+            snapshot=encode_history_snapshot(entity.snapshot, settings.SHARED_HISTORY_SNAPSHOT_COMPRESSION),
+            snapshot_version=SHARED_HISTORY_SNAPSHOT_VERSION,
+            snapshot_compressed=settings.SHARED_HISTORY_SNAPSHOT_COMPRESSION
         )
 
     def to_domain(self):
@@ -95,6 +167,10 @@ class SharedHistory(models.Model):
             user=self.user.to_incomplete_domain(),
             from_date=self.from_date,
             to_date=self.to_date,
-            history_statistics=self.history_statistics
+            # Списки сохраненных историй не загружают снимок, иначе он дочитывался бы отдельным запросом на каждую запись
+            snapshot=(
+                decode_history_snapshot(self.snapshot, self.snapshot_version, self.snapshot_compressed)
+                if 'snapshot' not in self.get_deferred_fields() else None
+            )
         )
 
@@ -0,0 +1,65 @@
+import numpy as np
+
+from ..domain.entities import PlanningErrorSamplesEntity
+
+
+ESTIMATION_ERROR_PERCENTILES = (50, 90, 99)
+
+# Границы корзин гистограммы по ошибке оценки в процентах от запланированного времени.
+# Отрицательная ошибка - задача заняла меньше запланированного (время переоценено), положительная - больше (недооценено)
+ESTIMATION_ERROR_HISTOGRAM_EDGES = np.array([-75, -50, -25, -10, 10, 25, 50, 100, 200], dtype=np.float64)
+ESTIMATION_ERROR_HISTOGRAM_LABELS = (
+    'Быстрее на 75-100%',
+    'Быстрее на 50-75%',
+    'Быстрее на 25-50%',
+    'Быстрее на 10-25%',
+    'Точно (±10%)',
+    'Дольше на 10-25%',
+    'Дольше на 25-50%',
+    'Дольше на 50-100%',
+    'Дольше на 100-200%',
+    'Дольше больше чем на 200%',
+)
+
+# Корзина, в которую попадает точная оценка
+ESTIMATION_ERROR_EXACT_BIN = int(np.searchsorted(ESTIMATION_ERROR_HISTOGRAM_EDGES, 0, side='right'))
+
+
+def get_signed_estimation_errors(samples: PlanningErrorSamplesEntity) -> np.ndarray:
+    '''
+    Ошибка оценки каждой задачи в процентах от запланированного времени со знаком
+    '''
+    return (samples.execution_seconds / samples.planned_seconds - 1) * 100
+
+
+def get_estimation_error_percentiles(samples: PlanningErrorSamplesEntity) -> dict[int, float]:
+    '''
+    Перцентили модуля ошибки оценки в процентах от запланированного времени: перцентиль -> ошибка
+    '''
+    if not samples.planned_seconds.size:
+        return {}
+    absolute_errors = np.abs(samples.execution_seconds - samples.planned_seconds) / samples.planned_seconds * 100
+    return dict(zip(ESTIMATION_ERROR_PERCENTILES, np.percentile(absolute_errors, ESTIMATION_ERROR_PERCENTILES).tolist()))
+
+
+def get_estimation_error_histogram(samples: PlanningErrorSamplesEntity) -> list[int]:
+    '''
+    Количество задач в каждой корзине ESTIMATION_ERROR_HISTOGRAM_LABELS
+    '''
+    bins = np.searchsorted(ESTIMATION_ERROR_HISTOGRAM_EDGES, get_signed_estimation_errors(samples), side='right')
+    return np.bincount(bins, minlength=len(ESTIMATION_ERROR_HISTOGRAM_LABELS)).tolist()
+
+
+def get_planning_bias_by_categories(samples: PlanningErrorSamplesEntity) -> list[tuple[int, float, int]]:
+    '''
+    Систематическая ошибка оценки в каждой категории: (id категории, смещение в процентах, количество задач).
+    Смещение считается по среднему геометрическому отношения реального времени к запланированному,
+    поэтому задача, занявшая вдвое больше времени, и задача, занявшая вдвое меньше, компенсируют друг друга
+    '''
+    if not samples.planned_seconds.size:
+        return []
+    log_ratios = np.log(samples.execution_seconds / samples.planned_seconds)
+    category_ids, category_indexes = np.unique(samples.category_ids, return_inverse=True)
+    counts = np.bincount(category_indexes)
+    biases = np.expm1(np.bincount(category_indexes, weights=log_ratios) / counts) * 100
+    return list(zip(category_ids.tolist(), biases.tolist(), counts.tolist()))
@@ -1,14 +1,28 @@
+import io
+import asyncio
+import csv
+import gzip
+import json
+import hashlib
 import random
-from typing import Union, NoReturn
+from typing import Union, NoReturn, Optional, Iterator
+from datetime import date
 
 from abc import ABC, abstractmethod
 from decimal import Decimal
-from dataclasses import dataclass
 
 from user.domain.entities import UserEntity
 from ..infrastructure.database_repository import HistoryDatabaseRepositoryInterface
-from ..domain.entities import SharedHistoryEntity, HistoryEntity
+from ..infrastructure.async_database_repository import AsyncHistoryDatabaseRepositoryInterface
+from ..domain.entities import SharedHistoryEntity, HistoryEntity, IncompleteHistoryEntity, HistorySnapshotEntity, SharedHistoryPageEntity, HistoryStatisticsEntity, HistoryPageEntity, PlanningErrorSamplesEntity
+from task.helpers.cache import VersionedCache
+from task.helpers.concurrency import QueryExecutor, SequentialQueryExecutor
 from task.serializers import to_json
+from task.helpers.search import build_prefix_tsquery, encode_search_cursor, decode_search_cursor
+from .planning_analytics import (
+    ESTIMATION_ERROR_HISTOGRAM_LABELS, ESTIMATION_ERROR_EXACT_BIN,
+    get_estimation_error_percentiles, get_estimation_error_histogram, get_planning_bias_by_categories
+)
 
 
 class HistoryUseCaseInterface(ABC):
@@ -21,6 +35,14 @@ class HistoryUseCaseInterface(ABC):
     def get_shared_history_by_key(self, key: str) -> dict:
         pass
 
+    @abstractmethod
+    def get_shared_history_page(self, key: str) -> Optional[SharedHistoryPageEntity]:
+        pass
+
+    @abstractmethod
+    def save_shared_history_page(self, key: str, html: str) -> SharedHistoryPageEntity:
+        pass
+
     @abstractmethod
     def get_user_shared_histories(self, user: UserEntity) -> list[SharedHistoryEntity]:
         pass
@@ -37,16 +59,45 @@ class HistoryUseCaseInterface(ABC):
     def get_user_history_statistics(self, user: UserEntity) -> dict:
         pass
 
+    @abstractmethod
+    def stream_user_history_export(self, user: UserEntity, from_date: str, to_date: str, export_format: str) -> Union[Iterator[str], NoReturn]:
+        pass
+
+    @abstractmethod
+    def get_user_history_page(self, user: UserEntity, from_date: str, to_date: str, cursor: Optional[str] = None, limit: Optional[int] = None) -> dict:
+        pass
+
+    @abstractmethod
+    def search_user_history(self, user: UserEntity, text: str, cursor: Optional[str] = None, limit: Optional[int] = None) -> Union[dict, NoReturn]:
+        pass
+
 
 class HistoryUseCase(HistoryUseCaseInterface):
+    history_page_size = 50
+    max_history_page_size = 200
+    search_page_size = 20
+    max_search_page_size = 100
+    history_export_formats = ('csv', 'ndjson')
+    history_export_chunk_size = 5000
+    history_export_columns = ('id', 'name', 'category', 'status', 'planned_time_seconds', 'execution_time_seconds', 'execution_date')
 
-    def __init__(self, history_database_repository: HistoryDatabaseRepositoryInterface) -> None:
+    def __init__(self, history_database_repository: HistoryDatabaseRepositoryInterface, query_executor: Optional[QueryExecutor] = None) -> None:
         self._history_database_repository = history_database_repository
+        self._query_executor = query_executor or SequentialQueryExecutor()
 
     def save_user_shared_history(self, user: UserEntity, from_date: str, to_date: str):
         key = self._generate_random_string()
-        user_history_statistics = self.get_user_history_statistics(user, from_date, to_date)
-        self._history_database_repository.save_user_shared_history(key, user, user_history_statistics, from_date, to_date)
+        raw_statistics, planning_error_samples, history = self._query_executor.run(
+            lambda: self._history_database_repository.get_user_history_statistics(user, from_date, to_date),
+            lambda: self._history_database_repository.get_user_planning_error_samples(user, from_date, to_date),
+            # Сохраненная история открывается без подгрузки страниц, поэтому в нее попадает вся история за промежуток
+            lambda: self._history_database_repository.get_user_history(user, from_date, to_date),
+        )
+        snapshot = HistorySnapshotEntity(
+            charts=self._format_user_history_charts(raw_statistics, planning_error_samples),
+            history=self._get_history_or_placeholder(history)
+        )
+        self._history_database_repository.save_user_shared_history(key, user, snapshot, from_date, to_date)
         return key
     
     def _generate_random_string(self) -> str:
@@ -57,8 +108,11 @@ class HistoryUseCase(HistoryUseCaseInterface):
         return string
 
     def get_shared_history_by_key(self, key: str) -> dict:
-        saved_history_object = self._history_database_repository.get_shared_history_by_key(key)
-        saved_history = saved_history_object.history_statistics
+        return self._format_shared_history(self._history_database_repository.get_shared_history_by_key(key))
+
+    def _format_shared_history(self, saved_history_object: SharedHistoryEntity) -> dict:
+        saved_history = {name: to_json(chart) for name, chart in saved_history_object.snapshot.charts.items()}
+        saved_history['history'] = saved_history_object.snapshot.history
         history_metadata = {
             'from_date': saved_history_object.from_date,
             'to_date': saved_history_object.to_date,
@@ -67,6 +121,22 @@ class HistoryUseCase(HistoryUseCaseInterface):
         saved_history.update(history_metadata)
         return saved_history
 
+    def get_shared_history_page(self, key: str) -> Optional[SharedHistoryPageEntity]:
+        return self._history_database_repository.get_shared_history_page(key)
+
+    def save_shared_history_page(self, key: str, html: str) -> SharedHistoryPageEntity:
+        page = self._compress_shared_history_page(key, html)
+        self._history_database_repository.save_shared_history_page(page)
+        return page
+
+    def _compress_shared_history_page(self, key: str, html: str) -> SharedHistoryPageEntity:
+        '''
+        Сохраненная история не меняется после создания, поэтому страница сжимается один раз,
+        а хеш сжатой страницы служит сильным ETag
+        '''
+        gzipped_html = gzip.compress(html.encode('utf-8'), mtime=0)
+        return SharedHistoryPageEntity(key=key, gzipped_html=gzipped_html, etag=hashlib.sha256(gzipped_html).hexdigest())
+
     def get_user_shared_histories(self, user: UserEntity) -> list[SharedHistoryEntity]:
         return self._history_database_repository.get_user_shared_histories(user)
 
@@ -83,34 +153,118 @@ class HistoryUseCase(HistoryUseCaseInterface):
         self._history_database_repository.delete_history(history)    
 
     def get_user_history_statistics(self, user: UserEntity, from_date: str, to_date: str) -> dict:
-        raw_count_user_tasks_in_categories = self._history_database_repository.get_count_user_tasks_in_categories(user, from_date, to_date)
-        raw_common_user_accuracy = self._history_database_repository.get_common_user_accuracy(user, from_date, to_date)
-        raw_user_accuracy_by_categories = self._history_database_repository.get_user_accuracy_by_categories(user, from_date, to_date)
-        raw_common_user_success_rate = self._history_database_repository.get_user_common_success_rate(user, from_date, to_date)
-        raw_user_success_rate_by_categories = self._history_database_repository.get_user_success_rate_by_categories(user, from_date, to_date)
-        raw_count_user_tasks_by_weekdays = self._history_database_repository.get_count_user_tasks_by_weekdays(user, from_date, to_date)   
-        raw_common_count_successful_planned_tasks = self._history_database_repository.get_common_count_user_successful_planned_tasks(user, from_date, to_date)
-        raw_count_successful_planned_tasks_by_categories = self._history_database_repository.get_count_user_successful_planned_tasks_by_categories(user, from_date, to_date)
-
-        history = self._history_database_repository.get_user_history(user, from_date, to_date)
-
-        @dataclass
-        class FakeHistoryTask:
-            name: str
-            id: None
+        raw_statistics, planning_error_samples, history_page = self._query_executor.run(
+            lambda: self._history_database_repository.get_user_history_statistics(user, from_date, to_date),
+            lambda: self._history_database_repository.get_user_planning_error_samples(user, from_date, to_date),
+            lambda: self._history_database_repository.get_user_history_page(user, from_date, to_date, self.history_page_size),
+        )
+        return self._format_user_history_statistics(raw_statistics, planning_error_samples, history_page)
 
+    def _format_user_history_statistics(self, raw_statistics: HistoryStatisticsEntity, planning_error_samples: PlanningErrorSamplesEntity, history_page: HistoryPageEntity) -> dict:
+        user_history_statistics = {
+            name: to_json(chart) for name, chart in self._format_user_history_charts(raw_statistics, planning_error_samples).items()
+        }
+        user_history_statistics['history'] = self._get_history_or_placeholder(history_page.history)
+        user_history_statistics['history_next_cursor'] = self._encode_history_cursor(history_page.next_key)
+        return user_history_statistics
+
+    def _format_user_history_charts(self, raw_statistics: HistoryStatisticsEntity, planning_error_samples: PlanningErrorSamplesEntity) -> dict[str, dict[str, list]]:
         return {
-            'count_user_tasks_in_categories': to_json(self._format_count_user_tasks_in_categories(raw_count_user_tasks_in_categories)),
-            'common_user_accuracy': to_json(self._format_common_user_accuracy(raw_common_user_accuracy)),
-            'user_accuracy_by_categories': to_json(self._format_user_accuracy_by_categories(raw_user_accuracy_by_categories)),
-            'common_user_success_rate': to_json(self._format_common_user_success_rate(raw_common_user_success_rate)),
-            'user_success_rate_by_categories': to_json(self._format_user_success_rate_by_categories(raw_user_success_rate_by_categories)),
-            'count_user_tasks_by_weekdays': to_json(self._format_count_user_tasks_by_weekdays(raw_count_user_tasks_by_weekdays)),
-            'common_count_user_successful_planned_tasks': to_json(self._format_common_count_user_successful_planned_tasks(raw_common_count_successful_planned_tasks)),
-            'count_user_successful_planned_tasks_by_categories': to_json(self._format_count_user_successful_planned_tasks_by_categories(raw_count_successful_planned_tasks_by_categories)),
-            'history': history if len(history) > 1 else [FakeHistoryTask(name='В этот период времени у вас не было ни одной задачи', id=None)]
+            'count_user_tasks_in_categories': self._format_count_user_tasks_in_categories(raw_statistics.count_user_tasks_in_categories),
+            'common_user_accuracy': self._format_common_user_accuracy(raw_statistics.common_user_accuracy),
+            'user_accuracy_by_categories': self._format_user_accuracy_by_categories(raw_statistics.user_accuracy_by_categories),
+            'common_user_success_rate': self._format_common_user_success_rate(raw_statistics.common_user_success_rate),
+            'user_success_rate_by_categories': self._format_user_success_rate_by_categories(raw_statistics.user_success_rate_by_categories),
+            'count_user_tasks_by_weekdays': self._format_count_user_tasks_by_weekdays(raw_statistics.count_user_tasks_by_weekdays),
+            'common_count_user_successful_planned_tasks': self._format_common_count_user_successful_planned_tasks(raw_statistics.common_count_user_successful_planned_tasks),
+            'count_user_successful_planned_tasks_by_categories': self._format_count_user_successful_planned_tasks_by_categories(raw_statistics.count_user_successful_planned_tasks_by_categories),
+            'estimation_error_percentiles': self._format_estimation_error_percentiles(get_estimation_error_percentiles(planning_error_samples)),
+            'estimation_error_histogram': self._format_estimation_error_histogram(get_estimation_error_histogram(planning_error_samples)),
+            'planning_bias_by_categories': self._format_planning_bias_by_categories(
+                get_planning_bias_by_categories(planning_error_samples), planning_error_samples.categories
+            ),
         }
 
+    def get_user_history_page(self, user: UserEntity, from_date: str, to_date: str, cursor: Optional[str] = None, limit: Optional[int] = None) -> dict:
+        limit = min(limit or self.history_page_size, self.max_history_page_size)
+        history_page = self._history_database_repository.get_user_history_page(
+            user, from_date, to_date, limit, self._decode_history_cursor(cursor) if cursor else None
+        )
+        return {
+            'history': [dict(history) for history in history_page.history],
+            'next_cursor': self._encode_history_cursor(history_page.next_key),
+        }
+
+    def search_user_history(self, user: UserEntity, text: str, cursor: Optional[str] = None, limit: Optional[int] = None) -> Union[dict, NoReturn]:
+        '''
+        Страница записей всей истории пользователя, подходящих под набираемый текст, от самых релевантных.
+        Выбрасывает ValueError при неправильном курсоре
+        '''
+        tsquery = build_prefix_tsquery(text)
+        after_key = decode_search_cursor(cursor) if cursor else None
+        if tsquery is None:
+            return {'results': [], 'next_cursor': None}
+        search_page = self._history_database_repository.search_user_history(
+            user, tsquery, min(limit or self.search_page_size, self.max_search_page_size), after_key
+        )
+        return {
+            'results': [
+                {'id': result.id, 'name': result.name, 'execution_date': result.day.isoformat()}
+                for result in search_page.results
+            ],
+            'next_cursor': encode_search_cursor(search_page.next_key),
+        }
+
+    def stream_user_history_export(self, user: UserEntity, from_date: str, to_date: str, export_format: str) -> Union[Iterator[str], NoReturn]:
+        '''
+        Возвращает генератор кусков файла выгрузки истории. Неизвестный формат проверяется сразу, до начала выгрузки
+        '''
+        if export_format not in self.history_export_formats:
+            raise ValueError(f'Неизвестный формат выгрузки: {export_format}')
+        chunks = self._history_database_repository.iterate_user_history_rows(user, from_date, to_date, self.history_export_chunk_size)
+        if export_format == 'csv':
+            return self._iterate_csv_export(chunks)
+        return self._iterate_ndjson_export(chunks)
+
+    def _iterate_csv_export(self, chunks: Iterator[list[tuple]]) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.history_export_columns)
+        yield buffer.getvalue()
+        for rows in chunks:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+
+    def _iterate_ndjson_export(self, chunks: Iterator[list[tuple]]) -> Iterator[str]:
+        # Строка собирается по шаблону, а через json кодируются только строки пользователя:
+        # json.dumps словаря на каждую запись в несколько раз медленнее
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+        for rows in chunks:
+            yield ''.join(
+                f'{{"id": {history_id}, "name": {encode(name)}, "category": {encode(category)}, "status": "{status}", '
+                f'"planned_time_seconds": {planned_time}, "execution_time_seconds": {execution_time}, '
+                f'"execution_date": "{execution_date.isoformat()}"}}\n'
+                for history_id, name, category, status, planned_time, execution_time, execution_date in rows
+            )
+
+    def _get_history_or_placeholder(self, history: list[IncompleteHistoryEntity]) -> list[IncompleteHistoryEntity]:
+        return history if history else [IncompleteHistoryEntity(id=None, name='В этот период времени у вас не было ни одной задачи')]
+
+    def _encode_history_cursor(self, key: Optional[tuple[date, int]]) -> Optional[str]:
+        if key is None:
+            return None
+        execution_date, history_id = key
+        return f'{execution_date.isoformat()}_{history_id}'
+
+    def _decode_history_cursor(self, cursor: str) -> Union[tuple[date, int], NoReturn]:
+        '''
+        Разбирает курсор вида "<execution_date>_<id>", при неправильном курсоре выбрасывает ValueError
+        '''
+        execution_date, history_id = cursor.split('_')
+        return date.fromisoformat(execution_date), int(history_id)
+
     def _format_count_user_tasks_in_categories(self, raw_count_user_tasks_in_categories: list[tuple[str, int]]) -> dict[str, list]:
         count_user_tasks_in_categories = {'labels': [], 'colors': [], 'data': []}
         for row in raw_count_user_tasks_in_categories:
@@ -174,3 +328,116 @@ class HistoryUseCase(HistoryUseCaseInterface):
             count_successful_planned_tasks_by_categories['data'].append(row[2]) 
         return count_successful_planned_tasks_by_categories
 
+    def _format_estimation_error_percentiles(self, estimation_error_percentiles: dict[int, float]) -> dict[str, list]:
+        return {
+            'labels': [f'{percentile}-й перцентиль' for percentile in estimation_error_percentiles],
+            'data': [round(error, 2) for error in estimation_error_percentiles.values()]
+        }
+
+    def _format_estimation_error_histogram(self, estimation_error_histogram: list[int]) -> dict[str, list]:
+        return {
+            'labels': list(ESTIMATION_ERROR_HISTOGRAM_LABELS),
+            'colors': [
+                'rgba(56, 248, 255, 0.4)' if index < ESTIMATION_ERROR_EXACT_BIN
+                else 'rgba(0, 255, 0, 0.4)' if index == ESTIMATION_ERROR_EXACT_BIN
+                else 'rgba(255, 0, 0, 0.4)'
+                for index in range(len(ESTIMATION_ERROR_HISTOGRAM_LABELS))
+            ],
+            'data': estimation_error_histogram
+        }
+
+    def _format_planning_bias_by_categories(self, planning_bias_by_categories: list[tuple[int, float, int]], categories: dict[int, tuple[str, str]]) -> dict[str, list]:
+        formatted_planning_bias_by_categories = {'labels': [], 'colors': [], 'data': []}
+        # Сначала категории с большим количеством задач, у них смещение надежнее
+        for category_id, bias, count in sorted(planning_bias_by_categories, key=lambda row: -row[2]):
+            name, color = categories.get(category_id, ('Без категории', 'rgba(128, 128, 128, 0.4)'))
+            formatted_planning_bias_by_categories['labels'].append(name)
+            formatted_planning_bias_by_categories['colors'].append(color)
+            formatted_planning_bias_by_categories['data'].append(round(bias, 2))
+        return formatted_planning_bias_by_categories
+
+
+class AsyncHistoryUseCase(HistoryUseCase):
+    '''
+    Сценарии истории с асинхронными вариантами для асинхронных представлений.
+    Асинхронные методы называются как синхронные с префиксом a и читают данные через асинхронный репозиторий,
+    а форматирование у них общее с синхронными
+    '''
+
+    def __init__(
+                self, history_database_repository: HistoryDatabaseRepositoryInterface,
+                async_history_database_repository: AsyncHistoryDatabaseRepositoryInterface,
+                query_executor: Optional[QueryExecutor] = None
+            ) -> None:
+        super().__init__(history_database_repository, query_executor)
+        self._async_history_database_repository = async_history_database_repository
+
+    async def aget_user_history_statistics(self, user: UserEntity, from_date: str, to_date: str) -> dict:
+        raw_statistics, planning_error_samples, history_page = await asyncio.gather(
+            self._async_history_database_repository.get_user_history_statistics(user, from_date, to_date),
+            self._async_history_database_repository.get_user_planning_error_samples(user, from_date, to_date),
+            self._async_history_database_repository.get_user_history_page(user, from_date, to_date, self.history_page_size),
+        )
+        return self._format_user_history_statistics(raw_statistics, planning_error_samples, history_page)
+
+    async def aget_shared_history_by_key(self, key: str) -> dict:
+        return self._format_shared_history(await self._async_history_database_repository.get_shared_history_by_key(key))
+
+    async def aget_shared_history_page(self, key: str) -> Optional[SharedHistoryPageEntity]:
+        return await self._async_history_database_repository.get_shared_history_page(key)
+
+    async def asave_shared_history_page(self, key: str, html: str) -> SharedHistoryPageEntity:
+        page = self._compress_shared_history_page(key, html)
+        await self._async_history_database_repository.save_shared_history_page(page)
+        return page
+
+
+class CachedHistoryUseCase(HistoryUseCaseInterface):
+    '''
+    Декоратор над сценариями истории, который кеширует отформатированную статистику по (пользователь, from_date, to_date).
+    Записи пользователя сбрасываются сменой версии в репозиториях при сохранении задачи в историю и удалении записи истории
+    '''
+
+    def __init__(self, history_use_case: HistoryUseCaseInterface, cache: VersionedCache) -> None:
+        self._history_use_case = history_use_case
+        self._cache = cache
+
+    def save_user_shared_history(self, user: UserEntity, from_date: str, to_date: str):
+        return self._history_use_case.save_user_shared_history(user, from_date, to_date)
+
+    def get_shared_history_by_key(self, key: str) -> dict:
+        return self._history_use_case.get_shared_history_by_key(key)
+
+    def get_shared_history_page(self, key: str) -> Optional[SharedHistoryPageEntity]:
+        return self._history_use_case.get_shared_history_page(key)
+
+    def save_shared_history_page(self, key: str, html: str) -> SharedHistoryPageEntity:
+        return self._history_use_case.save_shared_history_page(key, html)
+
+    def get_user_shared_histories(self, user: UserEntity) -> list[SharedHistoryEntity]:
+        return self._history_use_case.get_user_shared_histories(user)
+
+    def delete_user_shared_history_by_key(self, history_id: int, user: UserEntity) -> Union[None, NoReturn]:
+        return self._history_use_case.delete_user_shared_history_by_key(history_id, user)
+
+    def delete_user_history_by_id(self, history_id: int, user: UserEntity) -> Union[None, NoReturn]:
+        return self._history_use_case.delete_user_history_by_id(history_id, user)
+
+    def stream_user_history_export(self, user: UserEntity, from_date: str, to_date: str, export_format: str) -> Union[Iterator[str], NoReturn]:
+        return self._history_use_case.stream_user_history_export(user, from_date, to_date, export_format)
+
+    def get_user_history_page(self, user: UserEntity, from_date: str, to_date: str, cursor: Optional[str] = None, limit: Optional[int] = None) -> dict:
+        return self._history_use_case.get_user_history_page(user, from_date, to_date, cursor, limit)
+
+    def search_user_history(self, user: UserEntity, text: str, cursor: Optional[str] = None, limit: Optional[int] = None) -> Union[dict, NoReturn]:
+        return self._history_use_case.search_user_history(user, text, cursor, limit)
+
+    def get_user_history_statistics(self, user: UserEntity, from_date: str, to_date: str) -> dict:
+        return self._cache.get_or_set(
+            user.id, (from_date, to_date), lambda: self._history_use_case.get_user_history_statistics(user, from_date, to_date)
+        )
+
+    async def aget_user_history_statistics(self, user: UserEntity, from_date: str, to_date: str) -> dict:
+        return await self._cache.aget_or_set(
+            user.id, (from_date, to_date), lambda: self._history_use_case.aget_user_history_statistics(user, from_date, to_date)
+        )
@@ -1,3 +1,829 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import random
+import threading
+from datetime import date, timedelta
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import TransactionTestCase, AsyncRequestFactory
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, transaction
+from django.db.models import F
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+
+from task.models import Task, Category
+from task.services.use_cases import TaskUseCase
+from history.models import History, SharedHistory, HistoryDailyRollup
+from history.infrastructure.database_repository import HistoryDatabaseRepository
+from history.infrastructure.partitions import HistoryPartitionManager
+from history.helpers.fake_history import generate_fake_user_history, generate_fake_history
+from history.infrastructure.cache import history_statistics_cache
+from history.services.use_cases import HistoryUseCase, AsyncHistoryUseCase
+from history.services.planning_analytics import (
+    ESTIMATION_ERROR_HISTOGRAM_LABELS, ESTIMATION_ERROR_EXACT_BIN,
+    get_estimation_error_percentiles, get_estimation_error_histogram, get_planning_bias_by_categories
+)
+from history.domain.entities import PlanningErrorSamplesEntity, TaskOutcomeEntity
+from history.infrastructure.async_database_repository import AsyncHistoryDatabaseRepository
+from history.views import AsyncHistoryView, AsyncShareHistoryView
+from task.helpers.async_db import async_connection_pool
+from task.helpers.concurrency import ThreadPoolQueryExecutor
+from task.helpers.explain import capture_query_plans
+
+
+class HistoryStatisticsTest(TransactionTestCase):
+    # TransactionTestCase выполняется после TestCase из других приложений и не сдвигает им последовательности id
+    serialized_rollback = True
+
+    def _setUp(self):
+        user = get_user_model().objects.create(
+            username='test_user',
+            email='user123@example.com',
+            password='test_password',
+        )
+        return user
+
+    def _get_repository(self) -> HistoryDatabaseRepository:
+        return HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+
+    def test_single_scan_statistics(self):
+        user = self._setUp()
+        generate_fake_user_history(connection, user.id, 500, date(2025, 6, 30), 180)
+        History.objects.filter(id__in=History.objects.filter(user=user).values('id')[:20]).update(category=None)
+        repository = self._get_repository()
+        repository.rebuild_history_rollup(user.id)
+        user_entity = user.to_domain()
+        from_date, to_date = '2025-03-01', '2025-06-01'
+
+        statistics = repository.get_user_history_statistics(user_entity, from_date, to_date)
+
+        self.assertEqual(
+            sorted(statistics.count_user_tasks_in_categories),
+            sorted(repository.get_count_user_tasks_in_categories(user_entity, from_date, to_date))
+        )
+        self.assertEqual(statistics.common_user_accuracy, repository.get_common_user_accuracy(user_entity, from_date, to_date))
+        self.assertEqual(
+            sorted(statistics.user_accuracy_by_categories),
+            sorted(repository.get_user_accuracy_by_categories(user_entity, from_date, to_date))
+        )
+        self.assertEqual(statistics.common_user_success_rate, repository.get_user_common_success_rate(user_entity, from_date, to_date))
+        self.assertEqual(
+            sorted(statistics.user_success_rate_by_categories),
+            sorted(repository.get_user_success_rate_by_categories(user_entity, from_date, to_date))
+        )
+        self.assertEqual(statistics.count_user_tasks_by_weekdays, repository.get_count_user_tasks_by_weekdays(user_entity, from_date, to_date))
+        self.assertEqual(
+            statistics.common_count_user_successful_planned_tasks,
+            repository.get_common_count_user_successful_planned_tasks(user_entity, from_date, to_date)
+        )
+        self.assertEqual(
+            sorted(statistics.count_user_successful_planned_tasks_by_categories),
+            sorted(repository.get_count_user_successful_planned_tasks_by_categories(user_entity, from_date, to_date))
+        )
+
+    def test_single_scan_statistics_for_empty_range(self):
+        user = self._setUp()
+        statistics = self._get_repository().get_user_history_statistics(user.to_domain(), '2025-03-01', '2025-06-01')
+        self.assertEqual(statistics.common_user_accuracy, [(None,)])
+        self.assertEqual(statistics.common_user_success_rate, [(0, 0)])
+        self.assertEqual(statistics.common_count_user_successful_planned_tasks, [(0, 0)])
+        self.assertEqual(statistics.count_user_tasks_in_categories, [])
+
+    def test_history_rollup_is_maintained_on_history_writes(self):
+        user = self._setUp()
+        self.client.force_login(user)
+        repository = self._get_repository()
+        category = Category.objects.create(name='test_category', color='rgba(0, 0, 0, 0.4)', user=user, is_custom=True)
+        tasks = [
+            Task.objects.create(name=f'test_task{i}', order=i, category_id=category.id if i % 2 else 1, user=user, planned_time=timedelta(minutes=10 * i))
+            for i in range(1, 7)
+        ]
+
+        self.client.post(f'/complete-task/{tasks[0].id}/', {'execution_time': '0:10:00'})
+        self.client.post(f'/complete-task/{tasks[1].id}/', {'execution_time': '0:30:00'})
+        self.client.post(f'/complete-task/{tasks[2].id}/', {'execution_time': '0:00:00'})
+        self.client.post(f'/fail-task/{tasks[3].id}/', {'execution_time': '1:00:00'})
+        self.client.post(f'/fail-task/{tasks[4].id}/', {'execution_time': '0:20:00'})
+        self.assertEqual(repository.get_history_rollup_mismatches(user.id), [])
+
+        self.client.delete(f'/history/delete-history/{History.objects.filter(category_id=1).first().id}/')
+        self.assertEqual(repository.get_history_rollup_mismatches(user.id), [])
+
+        self.client.delete(f'/delete-category/{category.id}/')
+        self.client.delete(f'/history/delete-history/{History.objects.filter(category=None).first().id}/')
+        self.assertEqual(repository.get_history_rollup_mismatches(user.id), [])
+
+        # Записи удаленной категории удаляются до последней, и в агрегатах не остается пустых или отрицательных строк
+        for history in History.objects.filter(category=None):
+            self.client.delete(f'/history/delete-history/{history.id}/')
+        self.assertEqual(repository.get_history_rollup_mismatches(user.id), [])
+        self.assertFalse(HistoryDailyRollup.objects.filter(user=user, task_count__lte=0).exists())
+        self.assertFalse(HistoryDailyRollup.objects.filter(user=user, category=None).exists())
+
+        today = date.today()
+        statistics = repository.get_user_history_statistics(user.to_domain(), today - timedelta(days=1), today)
+        self.assertEqual(statistics.common_user_success_rate, repository.get_user_common_success_rate(user.to_domain(), today - timedelta(days=1), today))
+        self.assertEqual(statistics.common_user_accuracy, repository.get_common_user_accuracy(user.to_domain(), today - timedelta(days=1), today))
+        self.assertEqual(statistics.count_user_tasks_by_weekdays, repository.get_count_user_tasks_by_weekdays(user.to_domain(), today - timedelta(days=1), today))
+
+
+class HistoryStatisticsCacheTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def setUp(self):
+        caches['history_statistics'].clear()
+        history_statistics_cache.reset_statistics()
+
+    def test_history_statistics_cache(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        self.client.force_login(user)
+        tasks = [
+            Task.objects.create(name=f'test_task{i}', order=i, category_id=1, user=user, planned_time=timedelta(minutes=10))
+            for i in range(1, 4)
+        ]
+        today = date.today()
+        history_url = f'/history/?from_date={today - timedelta(days=7)}&to_date={today + timedelta(days=1)}'
+
+        self.client.post(f'/complete-task/{tasks[0].id}/', {'execution_time': '0:15:00'})
+        first_response = self.client.get(history_url)
+        second_response = self.client.get(history_url)
+        self.assertEqual(first_response.context['common_user_success_rate'], second_response.context['common_user_success_rate'])
+        self.assertEqual(history_statistics_cache.get_statistics()['hits'], 1)
+        self.assertEqual(history_statistics_cache.get_statistics()['misses'], 1)
+
+        self.client.post(f'/fail-task/{tasks[1].id}/', {'execution_time': '0:20:00'})
+        response = self.client.get(history_url)
+        self.assertEqual(history_statistics_cache.get_statistics()['misses'], 2)
+        self.assertEqual(len(response.context['history']), 2)
+
+        self.client.delete(f'/history/delete-history/{History.objects.filter(user=user).first().id}/')
+        response = self.client.get(history_url)
+        self.assertEqual(history_statistics_cache.get_statistics()['misses'], 3)
+        self.assertEqual(len(response.context['history']), 1)
+
+        self.assertEqual(self.client.get('/history/cache-statistics/').status_code, 403)
+        with self.settings(CACHE_STATISTICS_USER_IDS={user.id}):
+            cache_statistics = self.client.get('/history/cache-statistics/').json()
+        self.assertEqual(cache_statistics['misses'], 3)
+        self.assertEqual(cache_statistics['hits'], history_statistics_cache.get_statistics()['hits'])
+        self.assertEqual(cache_statistics['max_entries'], settings.HISTORY_STATISTICS_CACHE_SIZE)
+
+
+class ConcurrentHistoryQueriesTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def test_concurrent_history_statistics(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        generate_fake_user_history(connection, user.id, 300, date(2025, 6, 30), 60)
+        repository = HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+        repository.rebuild_history_rollup(user.id)
+        executor = ThreadPoolQueryExecutor(4)
+        try:
+            arguments = (user.to_domain(), '2025-05-15', '2025-06-30')
+            self.assertEqual(
+                HistoryUseCase(repository, executor).get_user_history_statistics(*arguments),
+                HistoryUseCase(repository).get_user_history_statistics(*arguments)
+            )
+        finally:
+            executor.shutdown()
+
+
+class AsyncHistoryViewsTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def _run_async(self, view, request):
+        async def run():
+            try:
+                return await view(request)
+            finally:
+                # У каждого вызова async_to_sync свой цикл событий, поэтому соединения пула закрываются сразу
+                await async_connection_pool.close()
+        return async_to_sync(run)()
+
+    def test_async_history_views(self):
+        caches['history_statistics'].clear()
+        caches['shared_history_pages'].clear()
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        generate_fake_user_history(connection, user.id, 300, date(2025, 6, 30), 60)
+        repository = HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+        repository.rebuild_history_rollup(user.id)
+        arguments = (user.to_domain(), '2025-05-15', '2025-06-30')
+
+        async_use_case = AsyncHistoryUseCase(repository, AsyncHistoryDatabaseRepository(async_connection_pool))
+        self.assertEqual(
+            self._run_async(lambda _: async_use_case.aget_user_history_statistics(*arguments), None),
+            HistoryUseCase(repository).get_user_history_statistics(*arguments)
+        )
+
+        request = AsyncRequestFactory().get('/history/', {'from_date': '2025-05-15', 'to_date': '2025-06-30'})
+        request.user = user
+        response = self._run_async(AsyncHistoryView.as_view(), request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('historyPageSentinel', response.content.decode('utf-8'))
+
+        self.client.force_login(user)
+        key = self.client.post('/history/share/?from_date=2025-05-15&to_date=2025-06-30').json()['key']
+        request = AsyncRequestFactory().get('/history/share/', {'key': key}, headers={'Accept-Encoding': 'gzip'})
+        request.user = AnonymousUser()
+        first_response = self._run_async(AsyncShareHistoryView.as_view(), request)
+        self.assertEqual(first_response['Content-Encoding'], 'gzip')
+        self.assertIsNotNone(SharedHistory.objects.get(key=key).rendered_page)
+        caches['shared_history_pages'].clear()
+        second_response = self._run_async(AsyncShareHistoryView.as_view(), request)
+        self.assertEqual((second_response.content, second_response['ETag']), (first_response.content, first_response['ETag']))
+
+        request = AsyncRequestFactory().get('/history/share/', {'key': 'missing'})
+        request.user = AnonymousUser()
+        self.assertEqual(self._run_async(AsyncShareHistoryView.as_view(), request).status_code, 404)
+
+
+class HistoryPaginationTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def test_history_keyset_pagination(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        self.client.force_login(user)
+        generate_fake_user_history(connection, user.id, 130, date(2025, 6, 30), 30)
+        repository = HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+        from_date, to_date = '2025-06-01', '2025-06-30'
+        expected_ids = [history.id for history in repository.get_user_history(user.to_domain(), from_date, to_date)]
+
+        response = self.client.get(f'/history/?from_date={from_date}&to_date={to_date}')
+        self.assertEqual([history.id for history in response.context['history']], expected_ids[:50])
+        cursor = response.context['history_next_cursor']
+
+        loaded_ids = expected_ids[:50]
+        while cursor:
+            page = self.client.get('/history/page/', {'from_date': from_date, 'to_date': to_date, 'cursor': cursor, 'limit': 40}).json()
+            self.assertLessEqual(len(page['history']), 40)
+            loaded_ids += [history['id'] for history in page['history']]
+            cursor = page['next_cursor']
+        self.assertEqual(loaded_ids, expected_ids)
+
+        self.assertEqual(self.client.get('/history/page/', {'from_date': from_date, 'to_date': to_date, 'cursor': 'wrong'}).status_code, 400)
+        self.assertEqual(self.client.get('/history/page/', {'from_date': from_date, 'to_date': to_date, 'limit': 0}).status_code, 400)
+        self.assertEqual(
+            len(self.client.get('/history/page/', {'from_date': from_date, 'to_date': to_date, 'limit': 1000}).json()['history']),
+            min(len(expected_ids), HistoryUseCase.max_history_page_size)
+        )
+
+
+class HistorySearchTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def test_history_search(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        other_user = get_user_model().objects.create(username='other_user', email='other@example.com', password='test_password')
+        self.client.force_login(user)
+        generate_fake_history(connection, [user.id, other_user.id], 300, date(2025, 6, 30), 60)
+        History.objects.filter(id=History.objects.filter(user=user).order_by('id').first().id).update(name='Отчёт, отчет и снова отчеты')
+        expected_ids = set(History.objects.filter(user=user, name__iregex='отч[её]т').values_list('id', flat=True))
+        self.assertTrue(expected_ids)
+
+        results, cursor = [], None
+        while True:
+            page = self.client.get('/history/search/', {'q': 'отчеты', 'limit': 7, **({'cursor': cursor} if cursor else {})}).json()
+            self.assertLessEqual(len(page['results']), 7)
+            results += page['results']
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual({result['id'] for result in results}, expected_ids)
+        self.assertEqual(len(results), len(expected_ids))
+        # Запись, где слово встречается трижды, релевантнее остальных
+        self.assertEqual(results[0]['name'], 'Отчёт, отчет и снова отчеты')
+
+        # Недописанное последнее слово ищется как префикс
+        prefix_results = self.client.get('/history/search/', {'q': 'подгот', 'limit': 100}).json()['results']
+        self.assertEqual(
+            {result['id'] for result in prefix_results},
+            set(History.objects.filter(user=user, name__startswith='Подготовить').values_list('id', flat=True))
+        )
+        self.assertEqual(self.client.get('/history/search/', {'q': 'для'}).json(), {'results': [], 'next_cursor': None})
+        self.assertEqual(self.client.get('/history/search/', {'q': '!?'}).json(), {'results': [], 'next_cursor': None})
+        self.assertEqual(self.client.get('/history/search/').status_code, 400)
+        self.assertEqual(self.client.get('/history/search/', {'q': 'отчет', 'cursor': 'wrong'}).status_code, 400)
+        self.assertEqual(self.client.get('/history/search/', {'q': 'отчет', 'limit': 0}).status_code, 400)
+
+
+class SharedHistorySnapshotTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def test_shared_history_snapshot(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        self.client.force_login(user)
+        generate_fake_user_history(connection, user.id, 120, date(2025, 6, 30), 30)
+        History.objects.filter(id=History.objects.filter(user=user).first().id).update(name='Задача "с кавычками"')
+        repository = HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+        from_date, to_date = '2025-06-01', '2025-06-30'
+
+        history_response = self.client.get('/history/', {'from_date': from_date, 'to_date': to_date})
+        key = self.client.post(f'/history/share/?from_date={from_date}&to_date={to_date}').json()['key']
+        shared_history = SharedHistory.objects.get(key=key)
+        self.assertEqual(shared_history.snapshot_version, 2)
+        self.assertTrue(shared_history.snapshot_compressed)
+
+        shared_response = self.client.get('/history/share/', {'key': key})
+        for chart_name in ('count_user_tasks_in_categories', 'common_user_accuracy', 'user_success_rate_by_categories', 'count_user_tasks_by_weekdays'):
+            self.assertEqual(shared_response.context[chart_name], history_response.context[chart_name])
+        self.assertEqual(
+            [(history.id, history.name) for history in shared_response.context['history']],
+            [(history.id, history.name) for history in repository.get_user_history(user.to_domain(), from_date, to_date)]
+        )
+        self.assertEqual(shared_response.context['owner'].username, user.username)
+
+    def test_anonymous_shared_history_page(self):
+        caches['shared_history_pages'].clear()
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        self.client.force_login(user)
+        generate_fake_user_history(connection, user.id, 50, date(2025, 6, 30), 30)
+        key = self.client.post('/history/share/?from_date=2025-06-01&to_date=2025-06-30').json()['key']
+        self.client.logout()
+
+        first_response = self.client.get('/history/share/', {'key': key}, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(first_response['Content-Encoding'], 'gzip')
+        self.assertNotIn('immutable', first_response['Cache-Control'])
+        self.assertIn('История test_user', gzip.decompress(first_response.content).decode('utf-8'))
+        self.assertIsNotNone(SharedHistory.objects.get(key=key).rendered_page)
+
+        # Страница из кеша процесса сверяется с базой одним легким запросом
+        with self.assertNumQueries(1):
+            second_response = self.client.get('/history/share/', {'key': key}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(second_response.content, first_response.content)
+        self.assertEqual(second_response['ETag'], first_response['ETag'])
+
+        not_modified_response = self.client.get('/history/share/', {'key': key}, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=first_response['ETag'])
+        self.assertEqual(not_modified_response.status_code, 304)
+
+        # Без gzip в Accept-Encoding отдается распакованная страница со своим ETag
+        caches['shared_history_pages'].clear()
+        plain_response = self.client.get('/history/share/', {'key': key})
+        self.assertFalse(plain_response.has_header('Content-Encoding'))
+        self.assertEqual(plain_response.content, gzip.decompress(first_response.content))
+        self.assertNotEqual(plain_response['ETag'], first_response['ETag'])
+
+        self.client.force_login(user)
+        self.client.delete(f'/history/delete-shared-history/{key}/')
+        other_key = self.client.post('/history/share/?from_date=2025-06-01&to_date=2025-06-30').json()['key']
+        self.client.logout()
+        self.assertEqual(self.client.get('/history/share/', {'key': key}).status_code, 404)
+
+        # Историю удалили через другой процесс: страница осталась в кеше этого процесса, но отдаваться не должна
+        self.assertEqual(self.client.get('/history/share/', {'key': other_key}).status_code, 200)
+        SharedHistory.objects.filter(key=other_key).delete()
+        self.assertIsNotNone(caches['shared_history_pages'].get(other_key))
+        self.assertEqual(self.client.get('/history/share/', {'key': other_key}).status_code, 404)
+        self.assertIsNone(caches['shared_history_pages'].get(other_key))
+
+
+class HistoryExportTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def test_history_export(self):
+        user, other_user = [
+            get_user_model().objects.create(username=f'test_user{i}', email=f'user{i}@example.com', password='test_password')
+            for i in range(2)
+        ]
+        self.client.force_login(user)
+        generate_fake_history(connection, [user.id, other_user.id], 300, date(2025, 6, 30), 60)
+        History.objects.filter(id=History.objects.filter(user=user).order_by('id').first().id).update(category=None, name='Задача, "с кавычками"\nи переносом')
+        from_date, to_date = '2025-05-15', '2025-06-30'
+        expected = list(
+            History.objects.filter(user=user, execution_date__range=(from_date, to_date))
+            .order_by('execution_date', 'id').values_list('id', 'name', 'category__name', 'status', 'execution_date')
+        )
+
+        response = self.client.get('/history/export/', {'from_date': from_date, 'to_date': to_date})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode('utf-8').splitlines(keepends=True)))
+        self.assertEqual(tuple(rows[0]), HistoryUseCase.history_export_columns)
+        self.assertEqual(
+            [(int(row[0]), row[1], row[2] or None, row[3], date.fromisoformat(row[6])) for row in rows[1:]],
+            expected
+        )
+
+        response = self.client.get('/history/export/', {'from_date': from_date, 'to_date': to_date, 'format': 'ndjson'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').split('\n') if line]
+        self.assertEqual(
+            [(row['id'], row['name'], row['category'], row['status'], date.fromisoformat(row['execution_date'])) for row in rows],
+            expected
+        )
+
+        self.assertEqual(self.client.get('/history/export/', {'from_date': from_date, 'to_date': to_date, 'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/history/export/', {'from_date': '2025-6-1', 'to_date': to_date}).status_code, 400)
+
+
+# Прежние версии запросов с коррелированными и скалярными подзапросами, с которыми сверяются однопроходные агрегаты
+LEGACY_USER_COMMON_SUCCESS_RATE_SQL = '''
+    SELECT count(*)-(SELECT count(*) FROM history_history hh2 WHERE hh2.status='FAILED' AND hh2.user_id = %s AND execution_date BETWEEN %s AND %s) AS successful_tasks,
+    (SELECT count(*) FROM history_history hh3 WHERE hh3.status='FAILED' AND hh3.user_id = %s AND execution_date BETWEEN %s AND %s) AS failed_tasks 
+    FROM history_history hh
+    WHERE hh.user_id = %s AND execution_date BETWEEN %s AND %s;
+'''
+
+LEGACY_USER_SUCCESS_RATE_BY_CATEGORIES_SQL = '''
+    SELECT
+    tc."name", tc.color,
+    count(*)-(SELECT count(*) FROM history_history hh2 WHERE hh2.status='FAILED' AND hh2.category_id=hh.category_id AND hh2.user_id = %s AND execution_date BETWEEN %s AND %s) AS successful_tasks
+    FROM history_history hh 
+    join task_category tc 
+    ON hh.category_id = tc.id
+    WHERE hh.user_id = %s AND
+    execution_date BETWEEN %s AND %s
+    GROUP BY category_id, tc."name", tc.color;
+'''
+
+LEGACY_COMMON_COUNT_USER_SUCCESSFUL_PLANNED_TASKS_SQL = '''
+    SELECT
+    (SELECT count(hh2.id) FROM history_history hh2 WHERE hh2.user_id = %s AND hh2.planned_time = hh2.execution_time AND execution_date BETWEEN %s AND %s) AS successful_planning,
+    count(hh.id) AS failed_planning
+    FROM history_history hh 
+    WHERE hh.user_id = %s AND hh.planned_time != hh.execution_time AND
+    execution_date BETWEEN %s AND %s; 
+'''
+
+
+class HistoryStatisticsQueriesParityTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def _fetch_legacy(self, sql: str, params: list) -> list[tuple]:
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+    def test_single_pass_aggregates_match_legacy_queries(self):
+        users = [
+            get_user_model().objects.create(username=f'test_user{i}', email=f'user{i}@example.com', password='test_password')
+            for i in range(3)
+        ]
+        for user in users:
+            Category.objects.create(name=f'test_category{user.id}', color='rgba(0, 0, 0, 0.4)', user=user, is_custom=True)
+        to_date = date(2025, 6, 30)
+        generate_fake_history(connection, [user.id for user in users], 400, to_date, 365)
+        History.objects.filter(id__in=History.objects.values('id')[:50]).update(category=None)
+        History.objects.filter(id__in=History.objects.order_by('-id').values('id')[:50]).update(execution_time=F('planned_time'))
+        repository = HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+
+        randomizer = random.Random(2025)
+        date_ranges = [(to_date - timedelta(days=400), to_date), (to_date + timedelta(days=1), to_date + timedelta(days=30))]
+        for _ in range(10):
+            from_date = to_date - timedelta(days=randomizer.randint(1, 365))
+            date_ranges.append((from_date, from_date + timedelta(days=randomizer.randint(0, 90))))
+
+        for user in users:
+            user_entity = user.to_domain()
+            for from_date, range_to_date in date_ranges:
+                with self.subTest(user=user.id, from_date=from_date, to_date=range_to_date):
+                    params = [user.id, from_date, range_to_date]
+                    self.assertEqual(
+                        repository.get_user_common_success_rate(user_entity, from_date, range_to_date),
+                        self._fetch_legacy(LEGACY_USER_COMMON_SUCCESS_RATE_SQL, params * 3)
+                    )
+                    self.assertEqual(
+                        sorted(repository.get_user_success_rate_by_categories(user_entity, from_date, range_to_date)),
+                        sorted(self._fetch_legacy(LEGACY_USER_SUCCESS_RATE_BY_CATEGORIES_SQL, params * 2))
+                    )
+                    self.assertEqual(
+                        repository.get_common_count_user_successful_planned_tasks(user_entity, from_date, range_to_date),
+                        self._fetch_legacy(LEGACY_COMMON_COUNT_USER_SUCCESSFUL_PLANNED_TASKS_SQL, params * 2)
+                    )
+
+
+class HistoryPartitionPruningTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def _get_scanned_partitions(self, plans: list[tuple[str, list]]) -> set[str]:
+        partitions = set()
+
+        def walk(node):
+            if isinstance(node, dict):
+                relation_name = node.get('Relation Name', '')
+                if relation_name.startswith('history_history_'):
+                    partitions.add(relation_name)
+                for value in node.values():
+                    walk(value)
+            elif isinstance(node, list):
+                for value in node:
+                    walk(value)
+
+        walk([plan for sql, plan in plans])
+        return partitions
+
+    def test_repository_queries_scan_only_partitions_of_date_range(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        HistoryPartitionManager(connection).create_partitions(date(2024, 1, 1), date(2024, 12, 1))
+        generate_fake_user_history(connection, user.id, 200, date(2024, 4, 30), 60)
+        repository = HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+        repository.rebuild_history_rollup(user.id)
+        user_entity = user.to_domain()
+        methods = [
+            'get_user_history_statistics',
+            'get_count_user_tasks_in_categories',
+            'get_common_user_accuracy',
+            'get_user_accuracy_by_categories',
+            'get_user_common_success_rate',
+            'get_user_success_rate_by_categories',
+            'get_count_user_tasks_by_weekdays',
+            'get_common_count_user_successful_planned_tasks',
+            'get_count_user_successful_planned_tasks_by_categories',
+            'get_user_history',
+        ]
+        date_ranges = [
+            ('2024-03-05', '2024-03-20', {'history_history_2024_03'}),
+            ('2024-03-20', '2024-04-10', {'history_history_2024_03', 'history_history_2024_04'}),
+        ]
+        for from_date, to_date, expected_partitions in date_ranges:
+            for method_name in methods:
+                with self.subTest(method=method_name, from_date=from_date, to_date=to_date):
+                    with capture_query_plans(connection, analyze=False) as plans:
+                        getattr(repository, method_name)(user_entity, from_date, to_date)
+                    self.assertLessEqual(self._get_scanned_partitions(plans), expected_partitions)
+            with capture_query_plans(connection, analyze=False) as plans:
+                page = repository.get_user_history_page(user_entity, from_date, to_date, 10)
+                repository.get_user_history_page(user_entity, from_date, to_date, 10, page.next_key)
+            self.assertEqual(self._get_scanned_partitions(plans), expected_partitions)
+
+        history = repository.get_history_by_id(repository.get_user_history(user_entity, '2024-04-01', '2024-04-30')[0].id)
+        with capture_query_plans(connection, analyze=False) as plans:
+            repository.delete_history(history)
+        self.assertEqual(self._get_scanned_partitions(plans), {'history_history_2024_04'})
+        self.assertFalse(History.objects.filter(id=history.id).exists())
+        self.assertEqual(repository.get_history_rollup_mismatches(user.id), [])
+
+    def test_partition_management(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        generate_fake_user_history(connection, user.id, 100, date(2023, 2, 28), 59)
+        manager = HistoryPartitionManager(connection)
+
+        self.assertEqual(manager.create_partitions(date(2023, 1, 1), date(2023, 2, 1)), ['history_history_2023_01', 'history_history_2023_02'])
+        self.assertEqual(manager.create_partitions(date(2023, 1, 1), date(2023, 2, 1)), [])
+        cursor = connection.cursor()
+        cursor.execute('SELECT tableoid::regclass::text, count(*) FROM history_history WHERE user_id = %s GROUP BY 1;', [user.id])
+        rows_by_partition = dict(cursor.fetchall())
+        self.assertEqual(set(rows_by_partition), {'history_history_2023_01', 'history_history_2023_02'})
+        self.assertEqual(sum(rows_by_partition.values()), 100)
+
+        self.assertEqual(manager.detach_partitions(date(2023, 2, 1)), ['history_history_2023_01'])
+        self.assertNotIn(date(2023, 1, 1), manager.get_partition_months())
+        self.assertEqual(History.objects.filter(user=user).count(), rows_by_partition['history_history_2023_02'])
+
+
+class PlanningAnalyticsTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def test_planning_analytics(self):
+        samples = PlanningErrorSamplesEntity(
+            planned_seconds=np.array([60, 60, 60, 60], dtype=np.float64),
+            execution_seconds=np.array([60, 120, 30, 90], dtype=np.float64),
+            category_ids=np.array([1, 1, 2, 2]),
+            categories={1: ('first', 'red'), 2: ('second', 'green')}
+        )
+        self.assertEqual(get_estimation_error_percentiles(samples)[50], 50.0)
+        histogram = get_estimation_error_histogram(samples)
+        self.assertEqual(sum(histogram), 4)
+        self.assertEqual(histogram[ESTIMATION_ERROR_EXACT_BIN], 1)
+        self.assertEqual(histogram[ESTIMATION_ERROR_HISTOGRAM_LABELS.index('Дольше на 100-200%')], 1)
+        biases = {category_id: (bias, count) for category_id, bias, count in get_planning_bias_by_categories(samples)}
+        self.assertAlmostEqual(biases[1][0], (2 ** 0.5 - 1) * 100)
+        self.assertAlmostEqual(biases[2][0], (0.75 ** 0.5 - 1) * 100)
+        self.assertEqual(biases[2][1], 2)
+
+        empty_samples = PlanningErrorSamplesEntity(np.array([]), np.array([]), np.array([], dtype=np.int64), {})
+        self.assertEqual(get_estimation_error_percentiles(empty_samples), {})
+        self.assertEqual(sum(get_estimation_error_histogram(empty_samples)), 0)
+        self.assertEqual(get_planning_bias_by_categories(empty_samples), [])
+
+    def test_planning_error_samples_and_charts(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        self.client.force_login(user)
+        generate_fake_user_history(connection, user.id, 300, date(2025, 6, 30), 30)
+        History.objects.filter(id__in=History.objects.values('id')[:20]).update(category=None)
+        # Время проваленной задачи не говорит о точности оценки, такие записи в выборку не попадают
+        failed_history = History.objects.filter(user=user, execution_date__range=('2025-06-01', '2025-06-30')).order_by('id').first()
+        History.objects.filter(id=failed_history.id).update(status=History.FAILED, planned_time=timedelta(minutes=1), execution_time=timedelta(hours=5))
+        repository = HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+        repository.rebuild_history_rollup(user.id)
+
+        samples = repository.get_user_planning_error_samples(user.to_domain(), '2025-06-01', '2025-06-30')
+        expected_rows = sorted(
+            (history.planned_time.total_seconds(), history.execution_time.total_seconds(), history.category_id or 0)
+            for history in History.objects.filter(user=user, execution_date__range=('2025-06-01', '2025-06-30')).exclude(status=History.FAILED)
+            if history.planned_time and history.execution_time
+        )
+        self.assertNotIn((60.0, 18000.0, failed_history.category_id or 0), expected_rows)
+        self.assertEqual(
+            sorted(zip(samples.planned_seconds.tolist(), samples.execution_seconds.tolist(), samples.category_ids.tolist())),
+            expected_rows
+        )
+        self.assertTrue(set(samples.category_ids.tolist()) - {0} <= set(samples.categories))
+
+        response = self.client.get('/history/?from_date=2025-06-01&to_date=2025-06-30')
+        histogram = json.loads(response.context['estimation_error_histogram'])
+        self.assertEqual(sum(histogram['data']), len(expected_rows))
+        planning_bias_by_categories = json.loads(response.context['planning_bias_by_categories'])
+        self.assertIn('Без категории', planning_bias_by_categories['labels'])
+
+
+class PlanningBiasTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def _assert_planning_bias(self, repository: HistoryDatabaseRepository, user, category_id: int) -> None:
+        log_ratios = np.log([
+            history.execution_time / history.planned_time
+            for history in History.objects.filter(user=user, category_id=category_id).exclude(status=History.FAILED)
+            if history.planned_time and history.execution_time
+        ])
+        bias = {bias.category_id: bias for bias in repository.get_user_planning_biases(user.to_domain())}[category_id]
+        self.assertEqual(bias.sample_count, log_ratios.size)
+        self.assertAlmostEqual(bias.log_ratio_mean, log_ratios.mean() if log_ratios.size else 0)
+        self.assertAlmostEqual(bias.log_ratio_m2, log_ratios.var() * log_ratios.size if log_ratios.size else 0)
+
+    def test_planning_bias_is_maintained_on_history_writes(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        self.client.force_login(user)
+        repository = HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+        category = Category.objects.create(name='test_category', color='rgba(0, 0, 0, 0.4)', user=user, is_custom=True)
+        execution_times = ['0:20:00', '0:30:00', '0:10:00', '1:00:00', '0:00:00', '0:40:00', '0:50:00']
+        tasks = [
+            Task.objects.create(name=f'test_task{i}', order=i, category=category, user=user, planned_time=timedelta(minutes=20))
+            for i in range(len(execution_times) + 1)
+        ]
+        for task, execution_time in zip(tasks, execution_times):
+            self.client.post(f'/complete-task/{task.id}/', {'execution_time': execution_time})
+        self.client.post(f'/fail-task/{tasks[-1].id}/', {'execution_time': '2:00:00'})
+        self._assert_planning_bias(repository, user, category.id)
+        suggestions = json.loads(self.client.get('/create-task/').context['planned_time_suggestions'])
+        self.assertAlmostEqual(suggestions[str(category.id)]['factor'], np.exp(np.log([1, 1.5, 0.5, 3, 2, 2.5]).mean()), places=3)
+        self.assertEqual(suggestions[str(category.id)]['samples'], 6)
+
+        for history in History.objects.filter(user=user).order_by('id')[:2]:
+            self.client.delete(f'/history/delete-history/{history.id}/')
+            self._assert_planning_bias(repository, user, category.id)
+        # Выполненных задач в категории осталось меньше, чем нужно для подсказки
+        self.assertIsNone(self.client.get('/create-task/').context['planned_time_suggestions'])
+
+
+class HistoryDomainQueriesTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def test_entities_are_hydrated_in_one_query(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        self.client.force_login(user)
+        category = Category.objects.create(name='test_category', color='rgba(0, 0, 0, 0.4)', user=user, is_custom=True)
+        history = History.objects.create(
+            name='test_task', category=category, user=user, planned_time=timedelta(hours=1), execution_time=timedelta(hours=1),
+            status=History.SUCCESSFUL
+        )
+        for from_date in ('2025-06-01', '2025-06-10', '2025-06-20'):
+            self.client.post(f'/history/share/?from_date={from_date}&to_date=2025-06-30')
+        repository = HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+        user_entity = user.to_domain()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(repository.get_history_by_id(history.id).category.user, user_entity)
+        with self.assertNumQueries(1):
+            shared_histories = repository.get_user_shared_histories(user_entity)
+            self.assertEqual(len(shared_histories), 3)
+            self.assertTrue(all(shared_history.user == user_entity and shared_history.snapshot is None for shared_history in shared_histories))
+        with self.assertNumQueries(1):
+            self.assertEqual(repository.get_shared_history_by_key(shared_histories[0].key).user, user_entity)
+
+
+class TasksToHistoryTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def _post(self, tasks: list[dict]):
+        return self.client.post('/save-tasks-to-history/', json.dumps({'tasks': tasks}), content_type='application/json')
+
+    def test_tasks_to_history_batch(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        other_user = get_user_model().objects.create(username='other_user', email='other@example.com', password='test_password')
+        self.client.force_login(user)
+        repository = HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+        category = Category.objects.create(name='test_category', color='rgba(0, 0, 0, 0.4)', user=user, is_custom=True)
+        yesterday = date.today() - timedelta(days=1)
+        tasks = [
+            Task.objects.create(
+                name=f'test_task{i}', order=i, category=category, user=user, planned_time=timedelta(minutes=20),
+                deadline=yesterday if i == 2 else None
+            )
+            for i in range(6)
+        ]
+        other_task = Task.objects.create(name='other_task', order=1, category=category, user=other_user, planned_time=timedelta(minutes=20))
+        # Одна задача уже в истории, пакет должен дополнить ее статистику ошибки оценки
+        self.client.post(f'/complete-task/{tasks[0].id}/', {'execution_time': '0:20:00'})
+
+        # Чужая задача в пакете отменяет перенос всего пакета
+        response = self._post([
+            {'task_id': tasks[1].id, 'execution_time': '0:30:00', 'outcome': 'completed'},
+            {'task_id': other_task.id, 'execution_time': '0:30:00', 'outcome': 'completed'},
+        ])
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Task.objects.count(), 6)
+        self.assertEqual(History.objects.count(), 1)
+        self.assertEqual(self._post([{'task_id': tasks[1].id, 'execution_time': '0:30:00', 'outcome': 'done'}]).status_code, 400)
+        self.assertEqual(self._post([{'task_id': tasks[1].id, 'execution_time': '0:30:00', 'outcome': 'completed'}] * 2).status_code, 400)
+        self.assertEqual(self._post([]).status_code, 400)
+
+        response = self._post([
+            {'task_id': tasks[1].id, 'execution_time': '0:30:00', 'outcome': 'completed'},
+            {'task_id': tasks[2].id, 'execution_time': '0:10:00', 'outcome': 'completed'},
+            {'task_id': tasks[3].id, 'execution_time': '1:00:00', 'outcome': 'failed'},
+            {'task_id': tasks[4].id, 'execution_time': '1:00:00', 'outcome': 'completed'},
+        ])
+        self.assertEqual(response.json(), {'saved': 4})
+        self.assertEqual(list(Task.objects.filter(user=user).values_list('name', flat=True)), ['test_task5'])
+        self.assertEqual(
+            list(History.objects.filter(user=user).order_by('name').values_list('name', 'status', 'execution_time', 'execution_date')),
+            [
+                ('test_task0', History.SUCCESSFUL, timedelta(minutes=20), date.today()),
+                ('test_task1', History.SUCCESSFUL, timedelta(minutes=30), date.today()),
+                ('test_task2', History.OUT_OF_DEADLINE, timedelta(minutes=10), date.today()),
+                ('test_task3', History.FAILED, timedelta(hours=1), date.today()),
+                ('test_task4', History.SUCCESSFUL, timedelta(hours=1), date.today()),
+            ]
+        )
+        self.assertEqual(repository.get_history_rollup_mismatches(user.id), [])
+        log_ratios = np.log([1, 1.5, 0.5, 3])
+        bias = repository.get_user_planning_biases(user.to_domain())[0]
+        self.assertEqual(bias.sample_count, 4)
+        self.assertAlmostEqual(bias.log_ratio_mean, log_ratios.mean())
+        self.assertAlmostEqual(bias.log_ratio_m2, log_ratios.var() * log_ratios.size)
+
+        # Задачи вместе с дневными агрегатами и статистикой ошибки оценки переносятся одним запросом при любом размере пакета,
+        # BEGIN и COMMIT транзакции, которая откатывает неполный перенос, тоже считаются, как и сброс двух версий в общем кеше
+        use_case = TaskUseCase(history_database_repository=repository)
+        batch_tasks = [
+            Task.objects.create(name=f'batch_task{i}', order=10 + i, category=category, user=user, planned_time=timedelta(minutes=20))
+            for i in range(12)
+        ]
+        with self.assertNumQueries(5):
+            use_case.save_completed_task_to_history(user.to_domain(), batch_tasks[0].id, timedelta(minutes=40))
+        with self.assertNumQueries(5):
+            use_case.save_tasks_to_history(
+                user.to_domain(), [TaskOutcomeEntity(task.id, timedelta(minutes=40), False) for task in batch_tasks[1:]]
+            )
+        self.assertEqual(repository.get_history_rollup_mismatches(user.id), [])
+        self.assertEqual(repository.get_user_planning_biases(user.to_domain())[0].sample_count, 16)
+
+        # Чужую задачу нельзя перенести и по одной
+        with self.assertRaises(PermissionError):
+            use_case.save_failed_task_to_history(user.to_domain(), other_task.id, timedelta(minutes=40))
+        self.assertTrue(Task.objects.filter(id=other_task.id).exists())
+        self.assertEqual(self.client.post(f'/complete-task/{other_task.id}/', {'execution_time': '0:30:00'}).status_code, 403)
+        self.assertEqual(self.client.post(f'/complete-task/{tasks[5].id}/', {'execution_time': 'полчаса'}).status_code, 400)
+        self.assertEqual(History.objects.filter(user=other_user).count(), 0)
+
+    def test_overlapping_batches_are_all_or_nothing(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        repository = HistoryDatabaseRepository(Task, History, SharedHistory, connection)
+        category = Category.objects.create(name='test_category', color='rgba(0, 0, 0, 0.4)', user=user, is_custom=True)
+        tasks = [
+            Task.objects.create(name=f'test_task{i}', order=i, category=category, user=user, planned_time=timedelta(minutes=20))
+            for i in range(3)
+        ]
+        user_entity = user.to_domain()
+
+        # Первый пакет перенес задачи 0 и 1 и держит транзакцию открытой, второй пакет с задачами 1 и 2 ждет блокировки задачи 1
+        # и после коммита первого видит, что задача 1 уже перенесена
+        errors = {}
+        first_moved = threading.Event()
+        release_first = threading.Event()
+
+        def move(name, task_ids, hold):
+            outcomes = [TaskOutcomeEntity(task_id, timedelta(minutes=20), False) for task_id in task_ids]
+            try:
+                if hold:
+                    with transaction.atomic():
+                        repository.move_user_tasks_to_history(user_entity, outcomes)
+                        first_moved.set()
+                        release_first.wait(10)
+                else:
+                    # Без внешней транзакции, как в представлениях
+                    repository.move_user_tasks_to_history(user_entity, outcomes)
+            except PermissionError as exc:
+                errors[name] = exc
+            finally:
+                connection.close()
+
+        first = threading.Thread(target=move, args=('first', [tasks[0].id, tasks[1].id], True))
+        second = threading.Thread(target=move, args=('second', [tasks[1].id, tasks[2].id], False))
+        first.start()
+        first_moved.wait(10)
+        second.start()
+        second.join(0.5)
+        self.assertTrue(second.is_alive())
+        release_first.set()
+        first.join()
+        second.join()
+
+        self.assertEqual(list(errors), ['second'])
+        self.assertEqual(list(Task.objects.filter(user=user).values_list('id', flat=True)), [tasks[2].id])
+        self.assertEqual(sorted(History.objects.filter(user=user).values_list('name', flat=True)), ['test_task0', 'test_task1'])
+        self.assertEqual(repository.get_history_rollup_mismatches(user.id), [])
+        self.assertEqual(repository.get_user_planning_biases(user_entity)[0].sample_count, 2)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
@@ -5,10 +6,14 @@ from . import views
 app_name = 'history'
 
 urlpatterns = [
-    path('', views.HistoryView.as_view(), name='history'),
-    path('share/', views.ShareHistoryView.as_view(), name='share'),
+    path('', (views.AsyncHistoryView if settings.ASYNC_VIEWS else views.HistoryView).as_view(), name='history'),
+    path('page/', views.HistoryPageView.as_view(), name='history_page'),
+    path('search/', views.HistorySearchView.as_view(), name='history_search'),
+    path('export/', views.HistoryExportView.as_view(), name='export'),
+    path('share/', (views.AsyncShareHistoryView if settings.ASYNC_VIEWS else views.ShareHistoryView).as_view(), name='share'),
     path('my-shared-histories/', views.GetUserSharedHistories.as_view(), name='user_shared_histories'),
     path('delete-shared-history/<str:history_key>/', views.SharedHistoryDeletionView.as_view(), name='delete_shared_history'),
     path('delete-history/<int:history_id>/', views.HistoryDeletionView.as_view(), name='delete_history'),
+    path('cache-statistics/', views.HistoryStatisticsCacheView.as_view(), name='cache_statistics'),
 ]
 
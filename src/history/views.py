@@ -1,28 +1,53 @@
+import re
+import gzip
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils.cache import patch_vary_headers
 from django.urls import reverse_lazy
 from django.views.generic import View, ListView, DeleteView
 from django.db import connection
 from django.utils.datastructures import MultiValueDictKeyError
-from django.http import HttpResponseBadRequest, JsonResponse, HttpResponseForbidden, HttpResponseNotFound
+from django.http import HttpResponse, HttpResponseNotModified, HttpResponseBadRequest, JsonResponse, HttpResponseForbidden, HttpResponseNotFound, StreamingHttpResponse
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
 
-from task.mixins import TitleMixin, UserEntityMixin, LoginRequiredMixinWithRedirectMessage
-from .services.use_cases import HistoryUseCase
+from task.helpers.concurrency import get_query_executor
+from task.mixins import TitleMixin, UserEntityMixin, LoginRequiredMixinWithRedirectMessage, AsyncLoginRequiredMixinWithRedirectMessage, aload_request_user, CacheStatisticsAccessMixin
+from task.helpers.async_db import async_connection_pool
+from .services.use_cases import HistoryUseCase, CachedHistoryUseCase, AsyncHistoryUseCase
 from .infrastructure.database_repository import HistoryDatabaseRepository
+from .infrastructure.async_database_repository import AsyncHistoryDatabaseRepository
+from .domain.entities import SharedHistoryPageEntity
+from .infrastructure.cache import history_statistics_cache
 from task.models import Task
 from history.models import History, SharedHistory
 from .validators import history_query_params_validator, history_dates_interval_validator
 
 
+# Общий для представлений истории исполнитель независимых запросов, чтобы ограничение параллельности действовало на весь процесс
+history_query_executor = get_query_executor()
+
+
 class HistoryView(TitleMixin, LoginRequiredMixinWithRedirectMessage, UserEntityMixin, View):
-    use_case = HistoryUseCase(HistoryDatabaseRepository(Task, History, SharedHistory, connection))
+    use_case = CachedHistoryUseCase(HistoryUseCase(HistoryDatabaseRepository(Task, History, SharedHistory, connection), history_query_executor), history_statistics_cache)
 
     def get(self, request):
+        from_date, to_date, error_response = self._get_history_dates()
+        if error_response:
+            return error_response
+        context = self.use_case.get_user_history_statistics(self.get_user_entity(), from_date, to_date)
+        context['title'] = 'История'
+        return render(request, 'history/history.html', context=context)
+
+    def _get_history_dates(self) -> tuple[Optional[str], Optional[str], Optional[HttpResponseBadRequest]]:
         try:
             from_date = self.request.GET['from_date']
             to_date = self.request.GET['to_date']
         except MultiValueDictKeyError:
-            return HttpResponseBadRequest(
+            return None, None, HttpResponseBadRequest(
                 '''
                 <h1>400</h1>
                 <p>Для запроса истории в ссылке должны быть переданы query-параметры, которые должны включать временной интервал, по которому будет показана история!</p>
@@ -32,19 +57,111 @@ class HistoryView(TitleMixin, LoginRequiredMixinWithRedirectMessage, UserEntityM
             history_query_params_validator(from_date, to_date)
             history_dates_interval_validator(from_date, to_date)
         except ValidationError as exc:
-            return HttpResponseBadRequest(
+            return None, None, HttpResponseBadRequest(
                 f'<h1>400</h1><p>{exc.message}</p>'
-            )        
+            )
+        return from_date, to_date, None
 
 
-        context = self.use_case.get_user_history_statistics(self.get_user_entity(), from_date, to_date)
+class AsyncHistoryView(AsyncLoginRequiredMixinWithRedirectMessage, HistoryView):
+    use_case = CachedHistoryUseCase(
+        AsyncHistoryUseCase(
+            HistoryDatabaseRepository(Task, History, SharedHistory, connection),
+            AsyncHistoryDatabaseRepository(async_connection_pool)
+        ),
+        history_statistics_cache
+    )
+
+    async def get(self, request):
+        from_date, to_date, error_response = self._get_history_dates()
+        if error_response:
+            return error_response
+        context = await self.use_case.aget_user_history_statistics(self.get_user_entity(), from_date, to_date)
         context['title'] = 'История'
         return render(request, 'history/history.html', context=context)
 
 
-class ShareHistoryView(UserEntityMixin, View):
+class HistoryPageView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, View):
     use_case = HistoryUseCase(HistoryDatabaseRepository(Task, History, SharedHistory, connection))
 
+    def get(self, request):
+        try:
+            from_date = self.request.GET['from_date']
+            to_date = self.request.GET['to_date']
+            history_query_params_validator(from_date, to_date)
+            history_dates_interval_validator(from_date, to_date)
+            limit = int(self.request.GET['limit']) if 'limit' in self.request.GET else None
+            if limit is not None and limit < 1:
+                raise ValueError
+            return JsonResponse(
+                self.use_case.get_user_history_page(self.get_user_entity(), from_date, to_date, self.request.GET.get('cursor'), limit)
+            )
+        except MultiValueDictKeyError:
+            return JsonResponse({'error': 'Для запроса истории должны быть переданы from_date и to_date'}, status=400)
+        except ValidationError as exc:
+            return JsonResponse({'error': exc.message}, status=400)
+        except ValueError:
+            return JsonResponse({'error': 'Неправильный курсор или размер страницы'}, status=400)
+
+
+class HistorySearchView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, View):
+    '''
+    Поиск по всей истории пользователя по мере набора текста: ?q=<текст>[&cursor=<курсор следующей страницы>][&limit=<размер>]
+    '''
+    use_case = HistoryUseCase(HistoryDatabaseRepository(Task, History, SharedHistory, connection))
+
+    def get(self, request):
+        try:
+            limit = int(self.request.GET['limit']) if 'limit' in self.request.GET else None
+            if limit is not None and limit < 1:
+                raise ValueError
+            return JsonResponse(
+                self.use_case.search_user_history(self.get_user_entity(), self.request.GET['q'], self.request.GET.get('cursor'), limit)
+            )
+        except MultiValueDictKeyError:
+            return JsonResponse({'error': 'Для поиска должен быть передан текст q'}, status=400)
+        except ValueError:
+            return JsonResponse({'error': 'Неправильный курсор или размер страницы'}, status=400)
+
+
+class HistoryExportView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, View):
+    use_case = HistoryUseCase(HistoryDatabaseRepository(Task, History, SharedHistory, connection))
+    content_types = {
+        'csv': 'text/csv; charset=utf-8',
+        'ndjson': 'application/x-ndjson; charset=utf-8',
+    }
+
+    def get(self, request):
+        try:
+            from_date = self.request.GET['from_date']
+            to_date = self.request.GET['to_date']
+        except MultiValueDictKeyError:
+            return HttpResponseBadRequest(
+                '''
+                <h1>400</h1>
+                <p>Для выгрузки истории в ссылке должны быть переданы query-параметры, которые должны включать временной интервал, по которому будет выгружена история!</p>
+                '''
+            )
+        try:
+            history_query_params_validator(from_date, to_date)
+            history_dates_interval_validator(from_date, to_date)
+        except ValidationError as exc:
+            return HttpResponseBadRequest(
+                f'<h1>400</h1><p>{exc.message}</p>'
+            )
+        export_format = self.request.GET.get('format', 'csv')
+        try:
+            chunks = self.use_case.stream_user_history_export(self.get_user_entity(), from_date, to_date, export_format)
+        except ValueError as exc:
+            return HttpResponseBadRequest(f'<h1>400</h1><p>{exc}</p>')
+        response = StreamingHttpResponse(chunks, content_type=self.content_types[export_format])
+        response['Content-Disposition'] = f'attachment; filename="history_{from_date}_{to_date}.{export_format}"'
+        return response
+
+
+class ShareHistoryView(UserEntityMixin, View):
+    use_case = HistoryUseCase(HistoryDatabaseRepository(Task, History, SharedHistory, connection), history_query_executor)
+
     def post(self, request):
         try:
             from_date = self.request.GET['from_date']
@@ -68,12 +185,82 @@ class ShareHistoryView(UserEntityMixin, View):
 
     def get(self, request):
         try:
-            context = self.use_case.get_shared_history_by_key(self.request.GET['key'])
-            
-            context['title'] = 'История ' + context['owner'].username 
+            if not request.user.is_authenticated:
+                return self._get_rendered_page_response(request, self.request.GET['key'])
+            context = self._get_shared_history_context(self.request.GET['key'])
+            return render(request, 'history/history.html', context=context)
+        except ObjectDoesNotExist as ex:
+            return HttpResponseNotFound('<h1>404 Not Found</h1><p>Такой сохраненной истории не существует</p>')
+
+    def _get_shared_history_context(self, key: str) -> dict:
+        context = self.use_case.get_shared_history_by_key(key)
+        context['title'] = 'История ' + context['owner'].username
+        return context
+
+    def _get_rendered_page_response(self, request, key: str):
+        '''
+        Анонимным посетителям отдается один раз отрисованная страница, которая не зависит от запроса,
+        поэтому повторные просмотры не обращаются к шаблонам. Каждый просмотр стоит одного запроса к базе за ETag страницы,
+        который проверяет, что сохраненную историю не удалили через другой процесс
+        '''
+        page = self.use_case.get_shared_history_page(key)
+        if page is None:
+            html = render_to_string('history/history.html', context=self._get_shared_history_context(key))
+            page = self.use_case.save_shared_history_page(key, html)
+        return self._build_rendered_page_response(request, page)
+
+    def _build_rendered_page_response(self, request, page: SharedHistoryPageEntity) -> HttpResponse:
+        gzip_accepted = re.search(r'\bgzip\b', request.META.get('HTTP_ACCEPT_ENCODING', '')) is not None
+        # Сжатое и несжатое представления - разные байты, поэтому у них разные сильные ETag
+        etag = f'"{page.etag}-gzip"' if gzip_accepted else f'"{page.etag}"'
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+        elif gzip_accepted:
+            response = HttpResponse(page.gzipped_html)
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(page.gzipped_html))
+        response['ETag'] = etag
+        # Историю можно удалить, поэтому страница не помечается immutable, а max-age ограничивает,
+        # сколько отозванная ссылка еще может открываться из кеша браузера или прокси
+        response['Cache-Control'] = f'public, max-age={settings.SHARED_HISTORY_PAGE_MAX_AGE}'
+        patch_vary_headers(response, ('Accept-Encoding', 'Cookie'))
+        return response
+
+
+class AsyncShareHistoryView(ShareHistoryView):
+    use_case = AsyncHistoryUseCase(
+        HistoryDatabaseRepository(Task, History, SharedHistory, connection),
+        AsyncHistoryDatabaseRepository(async_connection_pool),
+        history_query_executor
+    )
+
+    async def post(self, request):
+        # Сохранение истории редкое и пишет через синхронный репозиторий
+        await aload_request_user(request)
+        return await sync_to_async(super().post)(request)
+
+    async def get(self, request):
+        try:
+            await aload_request_user(request)
+            if not request.user.is_authenticated:
+                return await self._aget_rendered_page_response(request, self.request.GET['key'])
+            context = await self._aget_shared_history_context(self.request.GET['key'])
             return render(request, 'history/history.html', context=context)
         except ObjectDoesNotExist as ex:
             return HttpResponseNotFound('<h1>404 Not Found</h1><p>Такой сохраненной истории не существует</p>')
+
+    async def _aget_shared_history_context(self, key: str) -> dict:
+        context = await self.use_case.aget_shared_history_by_key(key)
+        context['title'] = 'История ' + context['owner'].username
+        return context
+
+    async def _aget_rendered_page_response(self, request, key: str) -> HttpResponse:
+        page = await self.use_case.aget_shared_history_page(key)
+        if page is None:
+            html = render_to_string('history/history.html', context=await self._aget_shared_history_context(key))
+            page = await self.use_case.asave_shared_history_page(key, html)
+        return self._build_rendered_page_response(request, page)
     
 
 class GetUserSharedHistories(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, TitleMixin, ListView):
@@ -121,3 +308,10 @@ class HistoryDeletionView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin
         self.use_case.delete_user_history_by_id(self.kwargs.get('history_id'), self.get_user_entity())
         return JsonResponse({}, status=203)
 
+
+class HistoryStatisticsCacheView(LoginRequiredMixinWithRedirectMessage, CacheStatisticsAccessMixin, View):
+
+    def get(self, request):
+        if not self.has_cache_statistics_access():
+            return HttpResponseForbidden('<h1>403 Forbidden</h1><p>Статистика кеша доступна только администраторам</p>')
+        return JsonResponse(history_statistics_cache.get_statistics())
@@ -22,6 +22,44 @@ function escapeHtml(str) {
 }
 
 
+function formatCalendarMonth(year, month) {
+    return year + '-' + String(month + 1).padStart(2, '0');
+}
+
+// Месяцы, дедлайны за которые уже загружены в calendar_data
+const loadedCalendarMonths = new Set();
+for (let month = new Date(calendarWindow[0]); month <= new Date(calendarWindow[1]); month.setMonth(month.getMonth() + 1)) {
+    loadedCalendarMonths.add(formatCalendarMonth(month.getFullYear(), month.getMonth()));
+}
+
+// Загружает дедлайны за месяцы с (fromYear, fromMonth) по (toYear, toMonth) одним запросом и перерисовывает эти месяцы
+function loadCalendarMonths(calendar, fromYear, fromMonth, toYear, toMonth) {
+    const fromKey = formatCalendarMonth(fromYear, fromMonth);
+    const toKey = formatCalendarMonth(toYear, toMonth);
+    if (fromKey > toKey) {
+        [fromYear, fromMonth, toYear, toMonth] = [toYear, toMonth, fromYear, fromMonth];
+    }
+    const months = [];
+    for (let month = new Date(fromYear, fromMonth, 1); month <= new Date(toYear, toMonth, 1); month.setMonth(month.getMonth() + 1)) {
+        months.push(formatCalendarMonth(month.getFullYear(), month.getMonth()));
+    }
+    if (months.every((month) => loadedCalendarMonths.has(month))) {
+        return;
+    }
+    fetch(`${deadlineCalendarUrl}?from_month=${months[0]}&to_month=${months[months.length - 1]}`)
+        .then((response) => response.json())
+        .then((deadlines) => {
+            Object.assign(calendar_data, deadlines);
+            months.forEach((month) => loadedCalendarMonths.add(month));
+            for (const element of document.getElementsByClassName('calendar-wrapper')) {
+                if (months.includes(element.dataset.month)) {
+                    const [year, month] = element.dataset.month.split('-').map(Number);
+                    calendar.showMonth(year, month - 1, element);
+                }
+            }
+        });
+}
+
 // Функция для создания нового контента
 function createNewContent() {
     const newContent = document.createElement('div');
@@ -154,22 +192,22 @@ var Cal = function() {
             var chkM = chk.getMonth();
             if (chkY == y && chkM == m && i == this.currDay) {
                 
-                let deadlinesOnCurrentDate = this.getDeadlinesByDate(this.currYear, this.currMonth+1, i)
+                let deadlinesOnCurrentDate = this.getDeadlinesByDate(y, m+1, i)
                 let deadlinesHtml = ''
                 if (deadlinesOnCurrentDate) {
                     for(let deadlinesCount=0; deadlinesCount < deadlinesOnCurrentDate.length; deadlinesCount++) {
-                        deadlinesHtml += createCalendarMark(deadlinesOnCurrentDate, deadlinesCount, new Date(this.currYear, this.currMonth, i));
+                        deadlinesHtml += createCalendarMark(deadlinesOnCurrentDate, deadlinesCount, new Date(y, m, i));
                     }                    
                 }
                 html += '<td class="normal"">' + i + '<div class="deadlines-container">' + deadlinesHtml + '</div>' + '</td>';
 
             }
             else {
-                let deadlinesOnCurrentDate = this.getDeadlinesByDate(this.currYear, this.currMonth+1, i)
+                let deadlinesOnCurrentDate = this.getDeadlinesByDate(y, m+1, i)
                 let deadlinesHtml = ''
                 if (deadlinesOnCurrentDate) {
                     for(let deadlinesCount=0; deadlinesCount < deadlinesOnCurrentDate.length; deadlinesCount++) {
-                        deadlinesHtml += createCalendarMark(deadlinesOnCurrentDate, deadlinesCount, new Date(this.currYear, this.currMonth, i));
+                        deadlinesHtml += createCalendarMark(deadlinesOnCurrentDate, deadlinesCount, new Date(y, m, i));
                     }                    
                 }
 
@@ -194,6 +232,8 @@ var Cal = function() {
         html += '</table>';
         // Записываем HTML в div
         element.innerHTML = html;
+        // По месяцу элемента перерисовываются месяцы после загрузки их дедлайнов
+        element.dataset.month = formatCalendarMonth(y, m);
     }
 window.onload = function() {
     // Начать календарь
@@ -210,29 +250,35 @@ window.onload = function() {
     for (let i = 0; i < 6; i++) {
         calendarPrev.previousMonth(divs[5-i]);
     }
+    // Со страницей приходят только соседние месяцы, остальные отрисованные загружаются одним запросом
+    loadCalendarMonths(calendar, calendarPrev.currYear, calendarPrev.currMonth, calendarNext.currYear, calendarNext.currMonth);
 
     let currentIndex = 6;
 
     function renderNextYear () {
+        let months = document.getElementsByClassName('calendar-wrapper');
         for (let i = 0; i < 12; i++) {
             let content = createNewContent();
             contentWrapper.appendChild(content);
-            let months = document.getElementsByClassName('calendar-wrapper');
             calendarNext.nextMonth(months[months.length - 1]);
 
         }
+        const [fromYear, fromMonth] = months[months.length - 12].dataset.month.split('-').map(Number);
+        loadCalendarMonths(calendar, fromYear, fromMonth - 1, calendarNext.currYear, calendarNext.currMonth);
 
     }
 
     function renderPrevYear () {
+        let months = document.getElementsByClassName('calendar-wrapper');
         for (let i = 0; i < 12; i++) {
             let content = createNewContent();
             contentWrapper.prepend(content);
-            let months = document.getElementsByClassName('calendar-wrapper');
             calendarPrev.previousMonth(months[0]);
             
 
         }
+        const [toYear, toMonth] = months[11].dataset.month.split('-').map(Number);
+        loadCalendarMonths(calendar, calendarPrev.currYear, calendarPrev.currMonth, toYear, toMonth - 1);
         currentIndex = 12;
     }
 
@@ -19,4 +19,23 @@ const config = {
 
 }
 
-new Chart(ctx, config);
\ No newline at end of file
+const chart = new Chart(ctx, config);
+
+// при возвращении на вкладку обновляем диаграмму, задачи могли быть созданы или выполнены в другой вкладке
+function refreshTaskCountChart() {
+    fetch(dashboardDataUrl).then(response => response.ok ? response.json() : null).then(dashboardData => {
+        if (!dashboardData) {
+            return;
+        }
+        chart.data.labels = dashboardData.chart_data.categories;
+        chart.data.datasets[0].data = dashboardData.chart_data.counts;
+        chart.data.datasets[0].backgroundColor = dashboardData.chart_data.colors;
+        chart.update();
+    });
+}
+
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'visible') {
+        refreshTaskCountChart();
+    }
+});
\ No newline at end of file
@@ -40,7 +40,7 @@ document.addEventListener("drop", function(event) {
             target.parentNode.insertBefore(dragged, target);
         }
         
-        sendTaskOrderToServer();        
+        sendTaskMoveToServer(dragged);
     }
 
 });
@@ -51,6 +51,38 @@ function getClosestTask(el) {
     } 
 }
 
+function getTaskId(task) {
+    return task ? task.id.replace('task', '') : null;
+}
+
+function getSiblingTask(task, direction) {
+    let sibling = task[direction];
+    while (sibling && sibling.className !== 'task-item') {
+        sibling = sibling[direction];
+    }
+    return sibling;
+}
+
+// отправляет на сервер, между какими задачами оказалась перетащенная задача, сервер меняет только ее порядок
+
+function sendTaskMoveToServer(task) {
+    fetch(taskMoveUrl.replace('/0/', `/${getTaskId(task)}/`), {
+        method: 'PUT',
+        headers: {
+            'X-CSRFToken': csrftoken,
+        },
+        body: JSON.stringify({
+            previous_task_id: getTaskId(getSiblingTask(task, 'previousElementSibling')),
+            next_task_id: getTaskId(getSiblingTask(task, 'nextElementSibling')),
+        }),
+    }).then(response => {
+        // если перемещение не удалось, сохраняем весь список в том порядке, в котором его видит пользователь
+        if (!response.ok) {
+            sendTaskOrderToServer();
+        }
+    });
+}
+
 // отправляет на сервер данные о текущем расположении элементов
 
 function sendTaskOrderToServer() {
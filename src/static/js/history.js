@@ -199,6 +199,126 @@ const countUserSuccessfulPlannedTasksByCategoriesConfig = {
 
 new Chart(countUserSuccessfulPlannedTasksByCategoriesCTX, countUserSuccessfulPlannedTasksByCategoriesConfig)
 
+const estimationErrorPercentilesCTX = document.getElementById('estimationErrorPercentilesChart');
+
+const estimationErrorPercentilesChartData = {
+  labels: estimationErrorPercentiles.labels,
+  datasets: [{
+    label: 'Ошибка оценки, %',
+    data: estimationErrorPercentiles.data,
+    backgroundColor: 'rgba(56, 248, 255, 0.4)',
+    hoverOffset: 4,
+    barThickness: 13,
+    maxBarThickness: 20,
+    minBarLength: 2,
+  }],
+
+};
+
+const estimationErrorPercentilesConfig = {
+    type: 'bar',
+    data: estimationErrorPercentilesChartData,
+    options: {
+      indexAxis: 'x',
+      responsive: true,
+      scales: {
+          x: {
+              grid: {
+                  color: 'gray'
+              }
+          },
+          y: {
+              grid: {
+                  color: 'gray' 
+              }
+          }
+      }
+  }
+
+}
+
+new Chart(estimationErrorPercentilesCTX, estimationErrorPercentilesConfig)
+
+const estimationErrorHistogramCTX = document.getElementById('estimationErrorHistogramChart');
+
+const estimationErrorHistogramChartData = {
+  labels: estimationErrorHistogram.labels,
+  datasets: [{
+    label: 'Количество задач',
+    data: estimationErrorHistogram.data,
+    backgroundColor: estimationErrorHistogram.colors,
+    hoverOffset: 4,
+    barThickness: 13,
+    maxBarThickness: 20,
+    minBarLength: 2,
+  }],
+
+};
+
+const estimationErrorHistogramConfig = {
+    type: 'bar',
+    data: estimationErrorHistogramChartData,
+    options: {
+      indexAxis: 'x',
+      responsive: true,
+      scales: {
+          x: {
+              grid: {
+                  color: 'gray'
+              }
+          },
+          y: {
+              grid: {
+                  color: 'gray' 
+              }
+          }
+      }
+  }
+
+}
+
+new Chart(estimationErrorHistogramCTX, estimationErrorHistogramConfig)
+
+const planningBiasByCategoriesCTX = document.getElementById('planningBiasByCategoriesChart');
+
+const planningBiasByCategoriesChartData = {
+  labels: planningBiasByCategories.labels,
+  datasets: [{
+    label: 'Смещение оценки, % (больше нуля - задачи занимают больше запланированного)',
+    data: planningBiasByCategories.data,
+    backgroundColor: planningBiasByCategories.colors,
+    hoverOffset: 4,
+    barThickness: 13,
+    maxBarThickness: 20,
+    minBarLength: 2,
+  }],
+
+};
+
+const planningBiasByCategoriesConfig = {
+    type: 'bar',
+    data: planningBiasByCategoriesChartData,
+    options: {
+      indexAxis: 'y',
+      responsive: true,
+      scales: {
+          x: {
+              grid: {
+                  color: 'gray'
+              }
+          },
+          y: {
+              grid: {
+                  color: 'gray' 
+              }
+          }
+      }
+  }
+
+}
+
+new Chart(planningBiasByCategoriesCTX, planningBiasByCategoriesConfig)
+
 const commonUserAccuracyCTX = document.getElementById('commonUserAccuracyChart')
 
 const commonUserAccuracyChartData = {
@@ -353,3 +473,66 @@ function copyLink(e) {
         console.log(error);
     })
 }
+
+const historyPageSentinel = document.getElementById('historyPageSentinel');
+
+if (historyPageSentinel) {
+    const taskList = document.getElementById('task-list');
+    let historyPageLoading = false;
+
+    function renderHistoryItem(history) {
+        const item = document.createElement('div');
+        item.className = 'task-item';
+        const name = document.createElement('div');
+        name.className = 'task-item-name';
+        const nameText = document.createElement('p');
+        nameText.textContent = history.name;
+        name.appendChild(nameText);
+        item.appendChild(name);
+
+        const deleteContainer = document.createElement('div');
+        deleteContainer.className = 'task-item-delete';
+        deleteContainer.innerHTML = `<a href="/history/delete-history/${history.id}/" onclick="deleteHistory(event)"><i class="ri-delete-bin-6-line"></i></a>`;
+        item.appendChild(deleteContainer);
+        return item;
+    }
+
+    function loadNextHistoryPage() {
+        const cursor = historyPageSentinel.dataset.nextCursor;
+        if (historyPageLoading || !cursor) {
+            return;
+        }
+        historyPageLoading = true;
+        const params = new URLSearchParams({
+            from_date: getQueryParam('from_date'),
+            to_date: getQueryParam('to_date'),
+            cursor: cursor
+        });
+        fetch(`/history/page/?${params}`, {credentials: 'include'})
+        .then(response => response.json())
+        .then(response => {
+            // Новые записи вставляются перед маркером, чтобы он всегда оставался в конце списка
+            response.history.forEach(history => taskList.insertBefore(renderHistoryItem(history), historyPageSentinel));
+            if (response.next_cursor) {
+                historyPageSentinel.dataset.nextCursor = response.next_cursor;
+            } else {
+                historyPageObserver.disconnect();
+                historyPageSentinel.remove();
+            }
+        })
+        .catch(error => {
+            console.log(error);
+        })
+        .finally(() => {
+            historyPageLoading = false;
+        })
+    }
+
+    const historyPageObserver = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadNextHistoryPage();
+        }
+    }, {rootMargin: '200px'});
+
+    historyPageObserver.observe(historyPageSentinel);
+}
@@ -0,0 +1,80 @@
+// Поиск по мере набора текста: запрос уходит после паузы в наборе, а ответ на устаревший текст отменяется
+const SEARCH_INPUT_DELAY = 200;
+
+function attachSearch(input, resultsContainer, searchUrl, renderResult) {
+    let searchTimeout = null;
+    let searchController = null;
+
+    function showMoreButton(nextCursor) {
+        const button = document.createElement('button');
+        button.className = 'search-more';
+        button.textContent = 'Показать еще';
+        button.addEventListener('click', () => {
+            button.remove();
+            search(nextCursor);
+        });
+        resultsContainer.appendChild(button);
+    }
+
+    function search(cursor) {
+        const text = input.value.trim();
+        if (searchController) {
+            searchController.abort();
+        }
+        if (!text) {
+            resultsContainer.innerHTML = '';
+            resultsContainer.classList.remove('show');
+            return;
+        }
+        searchController = new AbortController();
+        const params = new URLSearchParams({q: text});
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        fetch(`${searchUrl}?${params}`, {credentials: 'include', signal: searchController.signal})
+        .then(response => response.json())
+        .then(response => {
+            if (!cursor) {
+                resultsContainer.innerHTML = '';
+            }
+            response.results.forEach(result => resultsContainer.appendChild(renderResult(result)));
+            if (!resultsContainer.children.length) {
+                const empty = document.createElement('p');
+                empty.className = 'search-empty';
+                empty.textContent = 'Ничего не найдено';
+                resultsContainer.appendChild(empty);
+            }
+            if (response.next_cursor) {
+                showMoreButton(response.next_cursor);
+            }
+            resultsContainer.classList.add('show');
+        })
+        .catch(error => {
+            if (error.name != 'AbortError') {
+                console.log(error);
+            }
+        })
+    }
+
+    input.addEventListener('input', () => {
+        clearTimeout(searchTimeout);
+        searchTimeout = setTimeout(() => search(null), SEARCH_INPUT_DELAY);
+    });
+}
+
+function renderSearchResult(name, details, href) {
+    const item = document.createElement(href ? 'a' : 'div');
+    item.className = 'search-result';
+    if (href) {
+        item.href = href;
+    }
+    const nameText = document.createElement('p');
+    nameText.textContent = name;
+    item.appendChild(nameText);
+    if (details) {
+        const detailsText = document.createElement('span');
+        detailsText.textContent = details;
+        item.appendChild(detailsText);
+    }
+    return item;
+}
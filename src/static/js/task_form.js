@@ -35,3 +35,50 @@ if (textarea.attachEvent) {
     textarea.addEventListener('input', autoResize);
 }
 
+
+// Подсказка запланированного времени по тому, насколько пользователь обычно ошибается в выбранной категории
+let plannedTimeSuggestionElement = document.getElementById('planned-time-suggestion');
+if (plannedTimeSuggestionElement) {
+    let categorySelect = document.getElementById('id_category');
+    let plannedTimeInput = document.getElementById('planned-time-id-for-label');
+
+    function parsePlannedTimeMinutes(value) {
+        let [hours, minutes] = value.split(':');
+        return parseInt(hours) * 60 + parseInt(minutes);
+    }
+
+    function formatPlannedTime(totalMinutes) {
+        let hours = Math.floor(totalMinutes / 60);
+        let minutes = totalMinutes % 60;
+        return String(hours).padStart(2, '0') + ':' + String(minutes).padStart(2, '0');
+    }
+
+    function updatePlannedTimeSuggestion() {
+        let suggestion = plannedTimeSuggestions[categorySelect.value];
+        if (!suggestion || !plannedTimeInput.value || !parsePlannedTimeMinutes(plannedTimeInput.value)) {
+            plannedTimeSuggestionElement.style.display = 'none';
+            return;
+        }
+        // Как и форма, округляем до десятков минут, поле времени не принимает больше 23:50
+        let suggestedMinutes = Math.min(
+            Math.max(Math.round(parsePlannedTimeMinutes(plannedTimeInput.value) * suggestion.factor / 10) * 10, 10),
+            23 * 60 + 50
+        );
+        let suggestedTime = formatPlannedTime(suggestedMinutes);
+        let bias = Math.round((suggestion.factor - 1) * 100);
+        let biasText = bias >= 0 ? `дольше на ${bias}%` : `быстрее на ${-bias}%`;
+        plannedTimeSuggestionElement.innerHTML = (
+            `Задачи этой категории обычно занимают ${biasText}, чем запланировано (по ${suggestion.samples} задачам). ` +
+            `Рекомендуемое время: ${suggestedTime} <button type="button" id="planned-time-suggestion-apply">Подставить</button>`
+        );
+        plannedTimeSuggestionElement.style.display = 'block';
+        document.getElementById('planned-time-suggestion-apply').onclick = () => {
+            plannedTimeInput.value = suggestedTime;
+            plannedTimeSuggestionElement.style.display = 'none';
+        };
+    }
+
+    categorySelect.addEventListener('change', updatePlannedTimeSuggestion);
+    plannedTimeInput.addEventListener('change', updatePlannedTimeSuggestion);
+    updatePlannedTimeSuggestion();
+}
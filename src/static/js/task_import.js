@@ -0,0 +1,47 @@
+// Отчет об импорте приходит построчно в NDJSON, ошибки в записях показываются по мере проверки файла
+const importForm = document.getElementById('task-import-form');
+const importErrors = document.getElementById('errors');
+const importSummary = document.getElementById('task-import-summary');
+
+function renderImportReportLine(line) {
+    const report = JSON.parse(line);
+    if ('imported' in report) {
+        importSummary.textContent = `Импортировано задач: ${report.imported}, пропущено с ошибками: ${report.failed}`;
+        return;
+    }
+    const error = document.createElement('p');
+    if ('error' in report) {
+        error.textContent = report.error;
+    } else {
+        const fields = Object.entries(report.errors).map(([field, message]) => `${field}: ${message}`);
+        error.textContent = `Запись ${report.row}: ${fields.join('; ')}`;
+    }
+    importErrors.appendChild(error);
+}
+
+importForm.addEventListener('submit', async event => {
+    event.preventDefault();
+    importErrors.innerHTML = '';
+    importSummary.textContent = 'Импорт...';
+    const response = await fetch(importForm.action || window.location.href, {
+        method: 'POST',
+        body: new FormData(importForm),
+        credentials: 'include',
+    });
+    if (!response.ok) {
+        importSummary.innerHTML = await response.text();
+        return;
+    }
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    while (true) {
+        const {value, done} = await reader.read();
+        if (done) {
+            break;
+        }
+        buffer += value;
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(line => line).forEach(renderImportReportLine);
+    }
+});
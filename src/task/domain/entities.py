@@ -1,11 +1,11 @@
 from typing import Optional
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 from user.domain.entities import UserEntity
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class CategoryEntity:
     id: int
     name: str
@@ -15,7 +15,7 @@ class CategoryEntity:
     is_custom: bool
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class TaskEntity:
     id: int
     name: str
@@ -26,3 +26,19 @@ class TaskEntity:
     deadline: Optional[datetime]
     planned_time: str
 
+
+
+@dataclass(frozen=True, slots=True)
+class SearchResultEntity:
+    id: int
+    name: str
+    # Дедлайн задачи или день выполнения записи истории
+    day: Optional[date]
+    rank: float
+
+
+@dataclass(frozen=True, slots=True)
+class SearchPageEntity:
+    results: list[SearchResultEntity]
+    # Ключ (rank, id) последнего результата страницы, если за ним есть еще результаты
+    next_key: Optional[tuple[float, int]]
@@ -1,8 +1,8 @@
-from datetime import timedelta
 from django import forms
 
 from .models import Task as Task
 from .models import Category as Category
+from .helpers.date import round_to_ten_minutes
 
 
 class TaskCreationForm(forms.ModelForm):
@@ -48,11 +48,7 @@ class TaskCreationForm(forms.ModelForm):
         Округляет планируемое время выполнения до десятков минут.
         Называется так, потому что форма вызывает только такие названия
         '''
-        planned_time_str = str(self.cleaned_data.get('planned_time'))
-        planned_time_hours = planned_time_str.split(':')[0]
-        planned_time_minutes = planned_time_str.split(':')[1]
-        rounded_planned_time_ten_minutes = planned_time_minutes[0] if int(planned_time_minutes[1]) < 5 else str(int(planned_time_minutes[0]) + 1)
-        return timedelta(hours=int(planned_time_hours), minutes=int(rounded_planned_time_ten_minutes + '0'))
+        return round_to_ten_minutes(self.cleaned_data.get('planned_time'))
 
 
     class Meta:
@@ -0,0 +1,87 @@
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from django.conf import settings
+from django.db import connections
+from psycopg import AsyncConnection
+from psycopg.pq import TransactionStatus
+
+
+class AsyncConnectionPool:
+    '''
+    Пул асинхронных соединений psycopg к базе из DATABASES[alias] для асинхронных представлений.
+    Соединения psycopg нельзя делить между циклами событий, поэтому у каждого цикла свой набор соединений,
+    а max_size ограничивает число соединений одного цикла. Запросы сверх ограничения ждут свободное соединение,
+    не занимая потоков, поэтому один процесс может держать сотни запросов при небольшом числе соединений к базе
+    '''
+
+    def __init__(self, alias: str = 'default', max_size: int = None) -> None:
+        self._alias = alias
+        self._max_size = max_size
+        self._loop_pools = weakref.WeakKeyDictionary()
+
+    def _get_loop_pool(self) -> dict:
+        loop = asyncio.get_running_loop()
+        loop_pool = self._loop_pools.get(loop)
+        if loop_pool is None:
+            loop_pool = {
+                'idle': [],
+                'semaphore': asyncio.Semaphore(self._max_size or settings.ASYNC_DATABASE_POOL_SIZE),
+            }
+            self._loop_pools[loop] = loop_pool
+        return loop_pool
+
+    def _get_connection_params(self) -> dict:
+        # settings_dict читается при каждом подключении, потому что тесты подменяют в нем имя базы
+        settings_dict = connections[self._alias].settings_dict
+        connection_params = {
+            'dbname': settings_dict['NAME'],
+            'user': settings_dict['USER'],
+            'password': settings_dict['PASSWORD'],
+            'host': settings_dict['HOST'],
+            'port': settings_dict['PORT'],
+        }
+        return {name: value for name, value in connection_params.items() if value}
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[AsyncConnection]:
+        loop_pool = self._get_loop_pool()
+        async with loop_pool['semaphore']:
+            connection = None
+            while loop_pool['idle'] and connection is None:
+                connection = loop_pool['idle'].pop()
+                if connection.closed:
+                    connection = None
+            if connection is None:
+                connection = await AsyncConnection.connect(autocommit=True, **self._get_connection_params())
+            try:
+                yield connection
+            finally:
+                # Соединение с незавершенной транзакцией или после ошибки связи не возвращается в пул
+                if connection.closed or connection.info.transaction_status != TransactionStatus.IDLE:
+                    await connection.close()
+                else:
+                    loop_pool['idle'].append(connection)
+
+    @asynccontextmanager
+    async def reserve(self) -> AsyncIterator[None]:
+        '''
+        Занимает место в пуле на время синхронного обращения к базе из асинхронного кода.
+        Под ASGI у каждого запроса свой поток для синхронного кода со своим соединением,
+        и без ограничения сотни одновременных запросов открыли бы сотни синхронных соединений
+        '''
+        async with self._get_loop_pool()['semaphore']:
+            yield
+
+    async def close(self) -> None:
+        '''
+        Закрывает свободные соединения текущего цикла событий
+        '''
+        loop_pool = self._get_loop_pool()
+        while loop_pool['idle']:
+            await loop_pool['idle'].pop().close()
+
+
+async_connection_pool = AsyncConnectionPool()
@@ -0,0 +1,116 @@
+import time
+import threading
+from typing import Any, Awaitable, Callable, Iterable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+# Алиас общего для всех процессов кеша, в котором лежат версии пользователей
+CACHE_VERSIONS = 'cache_versions'
+
+
+class VersionedCache:
+    '''
+    Кеш результатов, разбитый по пользователям. У каждого пользователя есть версия, которая входит в ключ каждой записи,
+    поэтому чтобы сбросить все записи пользователя, достаточно сменить версию, а старые записи вытеснит сам кеш.
+    Вытеснение и размер задаются настройками алиаса в CACHES.
+    Записи могут лежать в кеше процесса, но версии хранятся в общем кеше versions_alias, иначе смена версии
+    в одном процессе не доходит до остальных. Поэтому каждое чтение стоит одного обращения к общему кешу
+    '''
+
+    def __init__(self, alias: str, prefix: str, versions_alias: str = CACHE_VERSIONS) -> None:
+        self._alias = alias
+        self._prefix = prefix
+        self._versions_alias = versions_alias
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def _cache(self):
+        return caches[self._alias]
+
+    @property
+    def _versions(self):
+        return caches[self._versions_alias]
+
+    def _get_version_key(self, user_id: int) -> str:
+        return f'{self._prefix}:version:{user_id}'
+
+    def _get_version(self, user_id: int) -> int:
+        version_key = self._get_version_key(user_id)
+        version = self._versions.get(version_key)
+        if version is None:
+            # Версия могла быть вытеснена, поэтому новая версия не должна совпасть ни с одной из прошлых
+            self._versions.add(version_key, time.time_ns(), timeout=None)
+            version = self._versions.get(version_key)
+        return version
+
+    async def _aget_version(self, user_id: int) -> int:
+        version_key = self._get_version_key(user_id)
+        version = await self._versions.aget(version_key)
+        if version is None:
+            await self._versions.aadd(version_key, time.time_ns(), timeout=None)
+            version = await self._versions.aget(version_key)
+        return version
+
+    def _get_key(self, user_id: int, version: int, key_parts: Iterable[Any]) -> str:
+        return f'{self._prefix}:{user_id}:{version}:' + ':'.join(str(part) for part in key_parts)
+
+    def _count(self, value: Any) -> None:
+        with self._lock:
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+
+    def get_or_set(self, user_id: int, key_parts: Iterable[Any], compute: Callable[[], Any]) -> Any:
+        key = self._get_key(user_id, self._get_version(user_id), key_parts)
+        value = self._cache.get(key)
+        self._count(value)
+        if value is None:
+            value = compute()
+            self._cache.set(key, value, timeout=None)
+        return value
+
+    async def aget_or_set(self, user_id: int, key_parts: Iterable[Any], compute: Callable[[], Awaitable[Any]]) -> Any:
+        '''
+        Асинхронный вариант get_or_set для асинхронного compute. Версия читается асинхронно из общего кеша,
+        а сам кеш процесса обходится без ввода-вывода, поэтому к нему обращается напрямую, не уходя в поток
+        '''
+        key = self._get_key(user_id, await self._aget_version(user_id), key_parts)
+        value = self._cache.get(key)
+        self._count(value)
+        if value is None:
+            value = await compute()
+            self._cache.set(key, value, timeout=None)
+        return value
+
+    def bump_version(self, user_id: int) -> None:
+        # Удаление - один запрос к общему кешу без гонки чтения и записи, как у incr. Следующее чтение
+        # создаст версию из текущего времени, которая не совпадет ни с одной из прошлых
+        self._versions.delete(self._get_version_key(user_id))
+
+    def bump_version_on_commit(self, user_id: int) -> None:
+        '''
+        Сбрасывает записи пользователя после коммита текущей транзакции,
+        чтобы параллельный запрос не положил в кеш результат, посчитанный по еще не закоммиченным данным
+        '''
+        transaction.on_commit(lambda: self.bump_version(user_id))
+
+    def get_statistics(self) -> dict:
+        with self._lock:
+            hits, misses = self._hits, self._misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+            'max_entries': settings.CACHES[self._alias].get('OPTIONS', {}).get('MAX_ENTRIES'),
+        }
+
+    def reset_statistics(self) -> None:
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
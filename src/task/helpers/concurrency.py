@@ -0,0 +1,77 @@
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from django.conf import settings
+from django.db import connection
+
+
+class QueryExecutor(ABC):
+    '''
+    Выполняет независимые друг от друга обращения к базе и возвращает их результаты в том же порядке
+    '''
+
+    @abstractmethod
+    def run(self, *calls: Callable[[], Any]) -> list:
+        pass
+
+
+class SequentialQueryExecutor(QueryExecutor):
+
+    def run(self, *calls: Callable[[], Any]) -> list:
+        return [call() for call in calls]
+
+
+class ThreadPoolQueryExecutor(QueryExecutor):
+    '''
+    Выполняет обращения к базе параллельно в пуле потоков. У каждого потока пула свое соединение Django,
+    которое живет вместе с потоком, поэтому пул потоков заодно служит пулом соединений,
+    а max_workers ограничивает число дополнительных соединений процесса к базе.
+    Первое обращение выполняется в вызывающем потоке на его соединении, пока остальные ждут в пуле
+    '''
+
+    def __init__(self, max_workers: int) -> None:
+        self._max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Потоки создаются при первом обращении, а не при импорте модуля с представлениями
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='queries')
+            return self._executor
+
+    def run(self, *calls: Callable[[], Any]) -> list:
+        # Соединения потоков пула не видят незакоммиченные данные текущей транзакции
+        if len(calls) < 2 or connection.in_atomic_block:
+            return [call() for call in calls]
+        futures = [self._get_executor().submit(self._run_in_worker, call) for call in calls[1:]]
+        return [calls[0]()] + [future.result() for future in futures]
+
+    def _run_in_worker(self, call: Callable[[], Any]) -> Any:
+        # Соединение потока пула переиспользуется всеми его задачами и закрывается, только если стало непригодным,
+        # иначе при CONN_MAX_AGE = 0 каждая задача открывала бы новое соединение
+        if connection.errors_occurred:
+            if connection.is_usable():
+                connection.errors_occurred = False
+            else:
+                connection.close()
+        return call()
+
+    def shutdown(self) -> None:
+        '''
+        Останавливает потоки пула. Соединения потоков закрываются вместе с их локальным хранилищем
+        '''
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+
+def get_query_executor() -> QueryExecutor:
+    if settings.DATABASE_QUERY_CONCURRENCY > 1:
+        return ThreadPoolQueryExecutor(settings.DATABASE_QUERY_CONCURRENCY)
+    return SequentialQueryExecutor()
@@ -1,4 +1,9 @@
-from datetime import date
+import re
+from datetime import date, timedelta
+from typing import Optional
+
+
+PLANNED_TIME_PATTERN = re.compile(r'^(\d{1,3}):([0-5]\d)(?::([0-5]\d))?$')
 
 
 def is_out_of_deadline(deadline: date) -> bool:
@@ -7,3 +12,37 @@ def is_out_of_deadline(deadline: date) -> bool:
         return True
     return False
 
+
+def round_to_ten_minutes(duration: timedelta) -> timedelta:
+    '''
+    Округляет время до десятков минут, секунды отбрасываются
+    '''
+    minutes = int(duration.total_seconds()) // 60
+    return timedelta(minutes=(minutes + 5) // 10 * 10)
+
+
+def parse_planned_time(value: str) -> Optional[timedelta]:
+    '''
+    Разбирает время в формате ЧЧ:ММ или ЧЧ:ММ:СС, как его отправляет поле времени формы. При другом формате возвращает None
+    '''
+    match = PLANNED_TIME_PATTERN.match(value.strip())
+    if match is None:
+        return None
+    hours, minutes, seconds = match.groups()
+    return timedelta(hours=int(hours), minutes=int(minutes), seconds=int(seconds or 0))
+
+
+def get_month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    month_index = month.year * 12 + month.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def get_months_window(from_month: date, to_month: date) -> tuple[date, date]:
+    '''
+    Первый день from_month и последний день to_month
+    '''
+    return get_month_start(from_month), add_months(get_month_start(to_month), 1) - timedelta(days=1)
@@ -0,0 +1,31 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+from django.utils.connection import ConnectionProxy
+
+
+@contextmanager
+def capture_query_plans(connection: ConnectionProxy, analyze: bool = True) -> Iterator[list[tuple[str, str]]]:
+    '''
+    Перехватывает читающие запросы, которые выполняются через connection внутри блока with,
+    и перед каждым из них получает его план через EXPLAIN. Планы складываются в список пар (sql, план).
+    EXPLAIN без ANALYZE не выполняет запрос, поэтому при analyze=False перехватываются и изменяющие запросы
+    '''
+    plans = []
+
+    def explain(execute, sql, params, many, context):
+        statement = sql.lstrip().upper()
+        is_read_only = statement.startswith(('SELECT', 'WITH')) and not any(
+            keyword in statement for keyword in ('INSERT ', 'UPDATE ', 'DELETE ')
+        )
+        is_explainable = is_read_only if analyze else statement.startswith(('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE'))
+        if is_explainable and not many:
+            options = 'ANALYZE, BUFFERS' if analyze else 'FORMAT JSON'
+            raw_cursor = context['cursor'].cursor
+            raw_cursor.execute(f'EXPLAIN ({options}) {sql}', params)
+            rows = raw_cursor.fetchall()
+            plans.append((sql, rows[0][0] if not analyze else '\n'.join(row[0] for row in rows)))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(explain):
+        yield plans
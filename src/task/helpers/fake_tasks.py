@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.utils.connection import ConnectionProxy
+
+
+def generate_fake_user_tasks(connection: ConnectionProxy, user_id: int, rows: int, today: date, deadline_share: float = 0.5) -> None:
+    '''
+    Генерирует список задач пользователя для бенчмарков. Примерно у deadline_share задач есть дедлайн
+    в пределах года до и после today, у остальных дедлайна нет
+    '''
+    cursor = connection.cursor()
+    cursor.execute(
+        '''
+        WITH categories AS (
+            SELECT array_agg(id ORDER BY id) AS ids
+            FROM task_category
+            WHERE user_id = %s OR is_custom = false
+        )
+        INSERT INTO task_task (name, description, "order", category_id, user_id, deadline, planned_time)
+        SELECT
+        'Задача ' || i,
+        NULL,
+        i,
+        categories.ids[1 + i %% cardinality(categories.ids)],
+        %s,
+        CASE WHEN random() < %s THEN %s::date + (floor(random() * 730) - 365)::int END,
+        make_interval(mins => 10 * floor(random() * 30)::int)
+        FROM generate_series(1, %s) i, categories;
+        ''',
+        [user_id, user_id, deadline_share, today, rows]
+    )
+    cursor.execute('ANALYZE task_task;')
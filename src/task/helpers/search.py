@@ -0,0 +1,39 @@
+import re
+from typing import Optional, Union, NoReturn
+
+
+# Слова запроса без знаков препинания, которые to_tsquery понял бы как операторы
+SEARCH_TERM_PATTERN = re.compile(r'[^\W_]+')
+SEARCH_MAX_TERMS = 8
+# Префикс из одной-двух букв подходит к большой части словаря, и GIN-индексу пришлось бы объединять
+# тысячи списков строк, поэтому такое недописанное слово ищется целиком
+SEARCH_MIN_PREFIX_LENGTH = 3
+
+
+def build_prefix_tsquery(text: str) -> Optional[str]:
+    '''
+    Запрос для to_tsquery из того, что пользователь набирает в строке поиска: должны найтись все слова,
+    а последнее слово, возможно, еще недописано, поэтому ищется как префикс. Если в тексте нет слов, возвращает None
+    '''
+    terms = SEARCH_TERM_PATTERN.findall(text)[:SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    if len(terms[-1]) >= SEARCH_MIN_PREFIX_LENGTH:
+        terms[-1] += ':*'
+    return ' & '.join(terms)
+
+
+def encode_search_cursor(key: Optional[tuple[float, int]]) -> Optional[str]:
+    if key is None:
+        return None
+    rank, row_id = key
+    # repr точно восстанавливает число, поэтому следующая страница продолжается ровно с той же строки
+    return f'{rank!r}_{row_id}'
+
+
+def decode_search_cursor(cursor: str) -> Union[tuple[float, int], NoReturn]:
+    '''
+    Разбирает курсор вида "<rank>_<id>", при неправильном курсоре выбрасывает ValueError
+    '''
+    rank, row_id = cursor.split('_')
+    return float(rank), int(row_id)
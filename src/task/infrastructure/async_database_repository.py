@@ -0,0 +1,55 @@
+from abc import ABC, abstractmethod
+from datetime import date
+
+from user.domain.entities import UserEntity
+from ..domain.entities import TaskEntity
+from ..helpers.async_db import AsyncConnectionPool
+from .database_repository import (
+    USER_ORDERED_TASKS_SQL, USER_TASK_COUNT_BY_CATEGORIES_SQL, USER_TASK_COUNT_BY_DEADLINES_SQL, USER_DASHBOARD_SQL,
+    build_user_task_entities, build_user_dashboard
+)
+
+
+class AsyncTaskDatabaseRepositoryInterface(ABC):
+
+    @abstractmethod
+    async def get_ordered_user_tasks(self, user: UserEntity) -> list[TaskEntity]:
+        pass
+
+    @abstractmethod
+    async def get_count_user_tasks_in_categories(self, user: UserEntity) -> dict[str, list]:
+        pass
+
+    @abstractmethod
+    async def get_count_user_tasks_in_categories_by_deadlines(self, user: UserEntity, from_date: date, to_date: date) -> dict[str, list]:
+        pass
+
+    @abstractmethod
+    async def get_user_dashboard(self, user: UserEntity, from_date: date, to_date: date) -> tuple[dict[str, list], dict[str, list], list[TaskEntity]]:
+        pass
+
+
+class AsyncTaskDatabaseRepository(AsyncTaskDatabaseRepositoryInterface):
+    '''
+    Читающая часть TaskDatabaseRepository на асинхронных соединениях psycopg для асинхронных представлений
+    '''
+
+    def __init__(self, connection_pool: AsyncConnectionPool) -> None:
+        self._connection_pool = connection_pool
+
+    async def _fetchall(self, sql: str, params: list) -> list[tuple]:
+        async with self._connection_pool.connection() as connection:
+            cursor = await connection.execute(sql, params)
+            return await cursor.fetchall()
+
+    async def get_ordered_user_tasks(self, user: UserEntity) -> list[TaskEntity]:
+        return build_user_task_entities(await self._fetchall(USER_ORDERED_TASKS_SQL, [user.id]), user)
+
+    async def get_count_user_tasks_in_categories(self, user: UserEntity) -> dict[str, list]:
+        return (await self._fetchall(USER_TASK_COUNT_BY_CATEGORIES_SQL, [user.id]))[0][0]
+
+    async def get_count_user_tasks_in_categories_by_deadlines(self, user: UserEntity, from_date: date, to_date: date) -> dict[str, list]:
+        return (await self._fetchall(USER_TASK_COUNT_BY_DEADLINES_SQL, [user.id, from_date, to_date]))[0][0]
+
+    async def get_user_dashboard(self, user: UserEntity, from_date: date, to_date: date) -> tuple[dict[str, list], dict[str, list], list[TaskEntity]]:
+        return build_user_dashboard((await self._fetchall(USER_DASHBOARD_SQL, [user.id, from_date, to_date]))[0], user)
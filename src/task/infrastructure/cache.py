@@ -0,0 +1,6 @@
+from ..helpers.cache import VersionedCache
+
+
+# Данные главной страницы (число задач по категориям, число задач по дедлайнам, упорядоченные задачи) по пользователю.
+# Версия пользователя меняется при любом изменении его задач и категорий
+task_dashboard_cache = VersionedCache('task_dashboard', 'task_dashboard')
@@ -1,12 +1,271 @@
 from abc import ABC, abstractmethod
-from datetime import datetime, timedelta
+from datetime import date, timedelta
+from typing import Optional
 from django.utils.connection import ConnectionProxy
+from django.db import transaction
 from django.db.models import Q
 
 from ..models import Category, Task
 from user.models import User
 from user.domain.entities import UserEntity
-from ..domain.entities import TaskEntity, CategoryEntity
+from ..domain.entities import TaskEntity, CategoryEntity, SearchResultEntity, SearchPageEntity
+from .identity_map import EntityIdentityMap
+from .cache import task_dashboard_cache
+from history.infrastructure.cache import history_statistics_cache
+
+
+# Все данные главной страницы одним запросом: упорядоченные задачи строками USER_ORDERED_TASKS_SQL
+# (дедлайн строкой ISO, запланированное время в секундах), число задач по категориям в формате
+# USER_TASK_COUNT_BY_CATEGORIES_SQL и календарь дедлайнов за промежуток в формате USER_TASK_COUNT_BY_DEADLINES_SQL.
+# Параметры: user_id, from_date, to_date
+USER_DASHBOARD_SQL = '''
+    WITH user_tasks AS (
+        SELECT
+        tt.id, tt.name, tt.description, tt."order", tt.deadline, tt.planned_time,
+        tc.id AS category_id, tc.name AS category_name, tc.description AS category_description,
+        tc.color, tc.user_id AS category_user_id, tc.is_custom
+        FROM task_task tt
+        JOIN task_category tc
+        ON tt.category_id = tc.id
+        WHERE tt.user_id = %s
+    ), category_counts AS (
+        SELECT category_id, category_name, color, count(*) AS task_count
+        FROM user_tasks
+        GROUP BY category_id, category_name, color
+    ), deadline_counts AS (
+        SELECT deadline, json_agg(json_build_object('count', task_count, 'category', category_name, 'color', color) ORDER BY category_id) AS categories
+        FROM (
+            SELECT deadline, category_id, category_name, color, count(*) AS task_count
+            FROM user_tasks
+            WHERE deadline BETWEEN %s AND %s
+            GROUP BY deadline, category_id, category_name, color
+        ) subquery
+        GROUP BY deadline
+    )
+    SELECT
+    (
+        SELECT coalesce(json_agg(json_build_array(
+            id, name, description, "order", deadline, date_part('epoch', planned_time),
+            category_id, category_name, category_description, color, category_user_id, is_custom
+        ) ORDER BY "order"), '[]')
+        FROM user_tasks
+    ),
+    (
+        SELECT json_build_object(
+            'counts', array_agg(task_count ORDER BY category_id),
+            'categories', array_agg(category_name ORDER BY category_id),
+            'colors', array_agg(color ORDER BY category_id)
+        )
+        FROM category_counts
+    ),
+    (
+        SELECT coalesce(json_object_agg(to_char(deadline, 'YYYY.MM.DD'), categories), '{}')
+        FROM deadline_counts
+    );
+'''
+
+# Шаг между порядковыми ключами соседних задач. Задача, перетащенная между соседями, получает ключ посередине,
+# поэтому перемещение меняет одну строку, пока между соседями есть свободные ключи
+TASK_ORDER_STEP = 1024
+
+# Перемещение задачи между двумя соседями одним запросом. Ключ не вычисляется (NULL), если соседа нет у пользователя
+# или между соседями не осталось свободных ключей, тогда строка не меняется.
+# Параметры: previous_task_id x 2, user_id, next_task_id x 2, user_id, task_id, user_id
+MOVE_TASK_SQL = f'''
+    WITH neighbours AS (
+        SELECT
+        %s::bigint AS previous_task_id,
+        (SELECT "order" FROM task_task WHERE id = %s AND user_id = %s) AS previous_order,
+        %s::bigint AS next_task_id,
+        (SELECT "order" FROM task_task WHERE id = %s AND user_id = %s) AS next_order
+    ), new_order AS (
+        SELECT CASE
+            WHEN previous_task_id IS NOT NULL AND previous_order IS NULL OR next_task_id IS NOT NULL AND next_order IS NULL THEN NULL
+            WHEN previous_order IS NULL THEN next_order - {TASK_ORDER_STEP}
+            WHEN next_order IS NULL THEN previous_order + {TASK_ORDER_STEP}
+            WHEN next_order - previous_order > 1 THEN (previous_order + next_order) / 2
+        END AS value
+        FROM neighbours
+    )
+    UPDATE task_task
+    SET "order" = new_order.value
+    FROM new_order
+    WHERE task_task.id = %s AND task_task.user_id = %s AND new_order.value IS NOT NULL
+    RETURNING task_task.id;
+'''
+
+# Выдает count порядковых ключей подряд новым задачам в конце списка и возвращает последний из них.
+# Одновременные вызовы для пользователя ждут блокировки строки счетчика и получают разные ключи.
+# max по индексу (user, order) нужен, потому что перемещение в конец списка ставит задаче ключ больше выданного.
+# Параметры: user_id, count, user_id, count
+ALLOCATE_TASK_ORDER_SQL = f'''
+    INSERT INTO task_taskordercounter AS counter (user_id, last_order)
+    SELECT %s, coalesce(max("order"), 0) + %s * {TASK_ORDER_STEP}
+    FROM task_task
+    WHERE user_id = %s
+    ON CONFLICT (user_id) DO UPDATE SET
+    last_order = greatest(counter.last_order + %s * {TASK_ORDER_STEP}, EXCLUDED.last_order)
+    RETURNING last_order;
+'''
+
+# Загрузка новых задач потоком строк без разбора отдельных INSERT, search_vector Postgres считает сам
+COPY_TASKS_SQL = '''
+    COPY task_task (name, description, "order", category_id, user_id, deadline, planned_time) FROM STDIN;
+'''
+
+# Новый порядок всего списка задач пользователя одним запросом, параметры: task_ids, user_id
+UPDATE_USER_TASK_ORDER_SQL = f'''
+    UPDATE task_task
+    SET "order" = new_order.position * {TASK_ORDER_STEP}
+    FROM unnest(%s::bigint[]) WITH ORDINALITY AS new_order(task_id, position)
+    WHERE task_task.id = new_order.task_id AND task_task.user_id = %s AND task_task."order" <> new_order.position * {TASK_ORDER_STEP};
+'''
+
+# Равномерно расставляет ключи задач пользователя с шагом TASK_ORDER_STEP, параметры: user_id, user_id
+REBALANCE_USER_TASK_ORDER_SQL = f'''
+    UPDATE task_task
+    SET "order" = ranked.position * {TASK_ORDER_STEP}
+    FROM (
+        SELECT id, row_number() OVER (ORDER BY "order", id) AS position
+        FROM task_task
+        WHERE user_id = %s
+    ) ranked
+    WHERE task_task.id = ranked.id AND task_task.user_id = %s;
+'''
+
+# Упорядоченные задачи пользователя вместе с категориями, параметры: user_id
+USER_ORDERED_TASKS_SQL = '''
+    SELECT
+    tt.id, tt.name, tt.description, tt."order", tt.deadline, tt.planned_time,
+    tc.id, tc.name, tc.description, tc.color, tc.user_id, tc.is_custom
+    FROM task_task tt
+    JOIN task_category tc
+    ON tt.category_id = tc.id
+    WHERE tt.user_id = %s
+    ORDER BY tt."order";
+'''
+
+
+# Число задач пользователя по категориям одним json-объектом для круговой диаграммы, параметры: user_id
+USER_TASK_COUNT_BY_CATEGORIES_SQL = '''
+    SELECT json_build_object(
+        'counts', array_agg(task_count ORDER BY subquery.id), 
+        'categories', array_agg(subquery.name ORDER BY subquery.id), 
+        'colors', array_agg(subquery.color ORDER BY subquery.id)
+    )
+    FROM (
+        SELECT 
+            tc.id,
+            tc.name,
+            tc.color,
+            count(tt.id) AS task_count
+        FROM task_task tt
+        JOIN task_category tc
+        ON tt.category_id = tc.id
+        WHERE tt.user_id = %s
+        GROUP BY tc.id
+    ) subquery;
+'''
+
+# Число задач пользователя по дедлайнам и категориям для календаря за промежуток дат одним json-объектом
+# с ключами-датами календаря 'YYYY.MM.DD'. Читает только промежуток индекса task_user_deadline_idx,
+# поэтому не зависит от того, сколько всего у пользователя дедлайнов. Параметры: user_id, from_date, to_date
+USER_TASK_COUNT_BY_DEADLINES_SQL = '''
+    SELECT coalesce(json_object_agg(to_char(task_deadline, 'YYYY.MM.DD'), categories), '{}')
+    FROM (
+        SELECT task_deadline, json_agg(json_build_object('count', task_count, 'category', category_name, 'color', color) ORDER BY category_id) AS categories
+        FROM 
+        (
+            SELECT count(tt.id) AS task_count, tt.deadline AS task_deadline, tc.id AS category_id, tc.name AS category_name,  tc.color AS color
+            FROM task_task tt join task_category tc on tt.category_id = tc.id 
+            WHERE tt.user_id = %s AND tt.deadline IS NOT NULL AND tt.deadline BETWEEN %s AND %s
+            GROUP BY tt.deadline, tc.id, tc.name, tc.color
+        ) subquery
+        GROUP BY task_deadline
+    ) days;
+'''
+
+# Условие продолжения страницы поиска после результата с ключом (rank, id)
+SEARCH_AFTER_KEY_CONDITION = 'WHERE (matches.rank, matches.id) < (%s::real, %s)'
+
+# Страница полнотекстового поиска по названиям и описаниям задач пользователя по убыванию (rank, id).
+# Совпадения находит GIN-индекс task_search_vector_idx по генерируемой колонке search_vector (миграция 0007):
+# к запросу добавляется лексема владельца, поэтому индекс не отдает совпадения других пользователей.
+# Запрос из одних стоп-слов пустой и без проверки numnode нашел бы все задачи пользователя.
+# Название весит больше описания. Вместо {after_condition} подставляется SEARCH_AFTER_KEY_CONDITION или пустая строка,
+# параметры: tsquery, user_id, user_id, [rank, id], limit
+SEARCH_USER_TASKS_SQL = '''
+    SELECT matches.id, matches.name, matches.deadline, matches.rank
+    FROM (
+        SELECT tt.id, tt.name, tt.deadline, ts_rank(tt.search_vector, query) AS rank
+        FROM task_task tt, to_tsquery('russian', %s) query
+        WHERE numnode(query) > 0 AND tt.search_vector @@ (query && quote_literal('#' || %s)::tsquery) AND tt.user_id = %s
+    ) matches
+    {after_condition}
+    ORDER BY matches.rank DESC, matches.id DESC
+    LIMIT %s;
+'''
+
+
+def build_user_task_entities(rows: list[tuple], user: UserEntity) -> list[TaskEntity]:
+    '''
+    Собирает задачи из строк USER_ORDERED_TASKS_SQL без промежуточных объектов моделей.
+    Задачи пользователя бывают только в его собственных и в базовых категориях, поэтому владелец категории -
+    это переданный пользователь, а каждая категория собирается один раз на весь список
+    '''
+    identity_map = EntityIdentityMap(user)
+    tasks = []
+    for (
+            task_id, name, description, order, deadline, planned_time,
+            category_id, category_name, category_description, color, category_user_id, is_custom
+        ) in rows:
+        category = identity_map.get(CategoryEntity, category_id)
+        if category is None:
+            category = identity_map.add(CategoryEntity(
+                id=category_id,
+                name=category_name,
+                description=category_description,
+                color=color,
+                user=identity_map.get(UserEntity, category_user_id),
+                is_custom=is_custom
+            ))
+        tasks.append(TaskEntity(
+            id=task_id,
+            name=name,
+            description=description,
+            order=order,
+            category=category,
+            user=user,
+            deadline=deadline,
+            planned_time=planned_time
+        ))
+    return tasks
+
+
+def build_user_dashboard(row: tuple, user: UserEntity) -> tuple[dict[str, list], dict[str, list], list[TaskEntity]]:
+    '''
+    Собирает строку USER_DASHBOARD_SQL в (число задач по категориям, число задач по дедлайнам, упорядоченные задачи)
+    '''
+    raw_tasks, task_count_statistics, count_user_tasks_in_categories_by_deadlines = row
+    task_rows = [
+        (
+            task_id, name, description, order, date.fromisoformat(deadline) if deadline else None, timedelta(seconds=planned_seconds),
+            *category
+        )
+        for task_id, name, description, order, deadline, planned_seconds, *category in raw_tasks
+    ]
+    return task_count_statistics, count_user_tasks_in_categories_by_deadlines, build_user_task_entities(task_rows, user)
+
+
+def build_search_page(rows: list[tuple], limit: int) -> SearchPageEntity:
+    '''
+    Собирает страницу поиска из строк (id, name, day, rank), запрошенных с LIMIT limit + 1
+    '''
+    results = [SearchResultEntity(id=row_id, name=name, day=day, rank=rank) for row_id, name, day, rank in rows[:limit]]
+    return SearchPageEntity(
+        results=results,
+        next_key=(results[-1].rank, results[-1].id) if len(rows) > limit else None
+    )
 
 
 class TaskDatabaseRepositoryInterface(ABC):
@@ -18,18 +277,42 @@ class TaskDatabaseRepositoryInterface(ABC):
     def get_task_by_id(self, task_id: int) -> TaskEntity:
         pass
 
+    @abstractmethod
+    def get_user_dashboard(self, user: UserEntity, from_date: date, to_date: date) -> tuple[dict[str, list], dict[str, list], list[TaskEntity]]:
+        pass
+
     @abstractmethod
     def get_count_user_tasks_in_categories(self, user: UserEntity) -> list[tuple[int, str]]:
         pass
 
     @abstractmethod
-    def get_count_user_tasks_in_categories_by_deadlines(self, user: UserEntity) -> list[tuple[int, str, datetime]]:
+    def get_count_user_tasks_in_categories_by_deadlines(self, user: UserEntity, from_date: date, to_date: date) -> dict[str, list]:
+        pass
+
+    @abstractmethod
+    def search_user_tasks(self, user: UserEntity, tsquery: str, limit: int, after_key: Optional[tuple[float, int]] = None) -> SearchPageEntity:
         pass
 
     @abstractmethod
     def save_task(self, task: TaskEntity) -> None:
         pass
 
+    @abstractmethod
+    def get_next_user_task_order(self, user: UserEntity) -> int:
+        pass
+
+    @abstractmethod
+    def create_user_tasks(self, user: UserEntity, tasks: list[TaskEntity]) -> None:
+        pass
+
+    @abstractmethod
+    def update_user_task_order(self, user: UserEntity, task_ids: list[int]) -> None:
+        pass
+
+    @abstractmethod
+    def move_user_task(self, user: UserEntity, task_id: int, previous_task_id: Optional[int], next_task_id: Optional[int]) -> None:
+        pass
+
 
 class CategoryDatabaseRepositoryInterface(ABC):
     @abstractmethod
@@ -51,67 +334,121 @@ class TaskDatabaseRepository(TaskDatabaseRepositoryInterface):
         self._connection = connection
 
     def get_ordered_user_tasks(self, user: UserEntity) -> list[TaskEntity ]:
-        return self._model.objects.filter(user=User.from_domain(user)).order_by('order').to_entity_list()
+        cursor = self._connection.cursor()
+        cursor.execute(USER_ORDERED_TASKS_SQL, [user.id])
+        return build_user_task_entities(cursor.fetchall(), user)
 
     def get_task_by_id(self, task_id: int) -> TaskEntity:
-        return self._model.objects.get(id=task_id).to_domain()
+        return self._model.objects.get_entity(id=task_id)
+
+    def get_user_dashboard(self, user: UserEntity, from_date: date, to_date: date) -> tuple[dict[str, list], dict[str, list], list[TaskEntity]]:
+        cursor = self._connection.cursor()
+        cursor.execute(USER_DASHBOARD_SQL, [user.id, from_date, to_date])
+        return build_user_dashboard(cursor.fetchone(), user)
 
     def get_count_user_tasks_in_categories(self, user: UserEntity) -> list[tuple[int, str]]:
         cursor = self._connection.cursor()
         cursor.execute(
-            '''
-            SELECT json_build_object(
-                'counts', array_agg(task_count), 
-                'categories', array_agg(subquery.name), 
-                'colors', array_agg(subquery.color)
-            )
-            FROM (
-                SELECT 
-                    tc.name,
-                    tc.color,
-                    count(tt.id) AS task_count
-                FROM task_task tt
-                JOIN task_category tc
-                ON tt.category_id = tc.id
-                WHERE tt.user_id = %s
-                GROUP BY tc.id
-            ) subquery;
-            ''', 
+            USER_TASK_COUNT_BY_CATEGORIES_SQL,
             [user.id]
         )
         return cursor.fetchall()[0][0]
 
-    def get_count_user_tasks_in_categories_by_deadlines(self, user: UserEntity) -> list[tuple[int, str, datetime]]:
+    def get_count_user_tasks_in_categories_by_deadlines(self, user: UserEntity, from_date: date, to_date: date) -> dict[str, list]:
         cursor = self._connection.cursor()
         cursor.execute(
-            '''
-            SELECT task_deadline, json_agg(json_build_object('count', task_count, 'category', category_name, 'color', color))
-            FROM 
-            (
-                SELECT count(tt.id) AS task_count, tt.deadline AS task_deadline, tc.name AS category_name,  tc.color AS color
-                FROM task_task tt join task_category tc on tt.category_id = tc.id 
-                WHERE tt.user_id = %s AND tt.deadline IS NOT NULL
-                GROUP BY tt.deadline, tc.id, tc.name, tc.color
-            )
-            GROUP BY task_deadline;
-            ''',
-            [user.id]
+            USER_TASK_COUNT_BY_DEADLINES_SQL,
+            [user.id, from_date, to_date]
         )
-        return cursor.fetchall()
+        return cursor.fetchone()[0]
+
+    def search_user_tasks(self, user: UserEntity, tsquery: str, limit: int, after_key: Optional[tuple[float, int]] = None) -> SearchPageEntity:
+        '''
+        Возвращает не больше limit задач пользователя, подходящих под запрос to_tsquery, от самых релевантных,
+        начиная после результата с ключом after_key
+        '''
+        cursor = self._connection.cursor()
+        cursor.execute(
+            SEARCH_USER_TASKS_SQL.format(after_condition=SEARCH_AFTER_KEY_CONDITION if after_key else ''),
+            [tsquery, user.id, user.id, *(after_key or ()), limit + 1]
+        )
+        return build_search_page(cursor.fetchall(), limit)
 
     def save_task(self, task: TaskEntity) -> None:
         Task.from_domain(task).save()
+        task_dashboard_cache.bump_version_on_commit(task.user.id)
+
+    def get_next_user_task_order(self, user: UserEntity) -> int:
+        cursor = self._connection.cursor()
+        cursor.execute(ALLOCATE_TASK_ORDER_SQL, [user.id, 1, user.id, 1])
+        return cursor.fetchone()[0]
+
+    @transaction.atomic
+    def create_user_tasks(self, user: UserEntity, tasks: list[TaskEntity]) -> None:
+        '''
+        Добавляет задачи в конец списка пользователя в переданном порядке: ключи выдаются одним запросом к счетчику,
+        а строки загружаются через COPY. order задач не используется
+        '''
+        if not tasks:
+            return
+        cursor = self._connection.cursor()
+        cursor.execute(ALLOCATE_TASK_ORDER_SQL, [user.id, len(tasks), user.id, len(tasks)])
+        first_order = cursor.fetchone()[0] - (len(tasks) - 1) * TASK_ORDER_STEP
+        with cursor.copy(COPY_TASKS_SQL) as copy:
+            for number, task in enumerate(tasks):
+                copy.write_row((
+                    task.name, task.description, first_order + number * TASK_ORDER_STEP, task.category.id, user.id,
+                    task.deadline, task.planned_time
+                ))
+        task_dashboard_cache.bump_version_on_commit(user.id)
+
+    @transaction.atomic
+    def update_user_task_order(self, user: UserEntity, task_ids: list[int]) -> None:
+        cursor = self._connection.cursor()
+        cursor.execute(UPDATE_USER_TASK_ORDER_SQL, [task_ids, user.id])
+        task_dashboard_cache.bump_version_on_commit(user.id)
+
+    @transaction.atomic
+    def move_user_task(self, user: UserEntity, task_id: int, previous_task_id: Optional[int], next_task_id: Optional[int]) -> None:
+        '''
+        Ставит задачу между previous_task_id и next_task_id (None - начало или конец списка).
+        Обычно меняет одну строку, а когда между соседями не остается свободных ключей, сначала заново расставляет
+        ключи всех задач пользователя. Выбрасывает PermissionError, если задача или соседи не принадлежат пользователю,
+        и ValueError, если предыдущий сосед стоит в списке не раньше следующего
+        '''
+        cursor = self._connection.cursor()
+        move_params = [previous_task_id, previous_task_id, user.id, next_task_id, next_task_id, user.id, task_id, user.id]
+        cursor.execute(MOVE_TASK_SQL, move_params)
+        if cursor.rowcount:
+            task_dashboard_cache.bump_version_on_commit(user.id)
+            return
+        task_ids = [id for id in (task_id, previous_task_id, next_task_id) if id is not None]
+        cursor.execute('SELECT count(*) FROM task_task WHERE id = ANY(%s) AND user_id = %s;', [task_ids, user.id])
+        if cursor.fetchone()[0] != len(set(task_ids)):
+            raise PermissionError
+        if previous_task_id is None and next_task_id is None:
+            return
+        cursor.execute(REBALANCE_USER_TASK_ORDER_SQL, [user.id, user.id])
+        cursor.execute(MOVE_TASK_SQL, move_params)
+        # После перерасстановки между соседями всегда есть место, если только они не перепутаны местами.
+        # Исключение откатывает и перерасстановку
+        if not cursor.rowcount:
+            raise ValueError
+        task_dashboard_cache.bump_version_on_commit(user.id)
 
 class CategoryDatabaseRepository(CategoryDatabaseRepositoryInterface):
     def __init__(self, model: Category):
         self._model = model
 
     def get_category_by_id(self, category_id: int) -> CategoryEntity:
-        return self._model.objects.get(id=category_id).to_domain()
+        return self._model.objects.get_entity(id=category_id)
 
     def get_ordered_user_categories(self, user: UserEntity) -> list[CategoryEntity]:
         return self._model.objects.filter(Q(user=User.from_domain(user)) | Q(is_custom=False)).order_by('is_custom').to_entity_list()
 
     def delete_category(self, category_entity: CategoryEntity) -> None:
         self._model.from_domain(category_entity).delete()
+        # Записи истории удаленной категории переходят в статистике в категорию без названия
+        history_statistics_cache.bump_version_on_commit(category_entity.user.id)
+        task_dashboard_cache.bump_version_on_commit(category_entity.user.id)
 
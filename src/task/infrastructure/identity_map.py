@@ -0,0 +1,20 @@
+from typing import Optional
+
+
+class EntityIdentityMap:
+    '''
+    Уже собранные сущности одной выборки по (класс сущности, id).
+    Позволяет собрать пользователя и каждую категорию один раз и разделить их между всеми записями списка
+    '''
+
+    def __init__(self, *entities) -> None:
+        self._entities = {}
+        for entity in entities:
+            self.add(entity)
+
+    def get(self, entity_class: type, entity_id: Optional[int]):
+        return self._entities.get((entity_class, entity_id))
+
+    def add(self, entity):
+        self._entities[(type(entity), entity.id)] = entity
+        return entity
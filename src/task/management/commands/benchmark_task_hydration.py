@@ -0,0 +1,58 @@
+import time
+import tracemalloc
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from task.models import Task
+from task.infrastructure.database_repository import TaskDatabaseRepository
+from task.helpers.fake_tasks import generate_fake_user_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время и память сборки списка задач пользователя в сущности: через объекты моделей и to_domain '
+        'и напрямую из строк запроса с общими пользователем и категориями, как это делает репозиторий. '
+        'Данные генерируются во временной транзакции и откатываются после замеров'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10_000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        repository = TaskDatabaseRepository(Task, connection)
+
+        for rows in options['rows']:
+            with transaction.atomic():
+                user = get_user_model().objects.create(username='benchmark_user', email='benchmark@example.com')
+                generate_fake_user_tasks(connection, user.id, rows, date.today())
+                user_entity = user.to_domain()
+                hydrations = {
+                    'объекты моделей и to_domain': lambda: Task.objects.filter(user_id=user.id).order_by('order').to_entity_list(),
+                    'строки запроса': lambda: repository.get_ordered_user_tasks(user_entity),
+                }
+                for name, hydrate in hydrations.items():
+                    elapsed = self._measure(hydrate, options['repeat'])
+                    # tracemalloc замедляет сборку, поэтому память замеряется отдельным проходом
+                    tracemalloc.start()
+                    tasks = hydrate()
+                    retained_memory, peak_memory = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    del tasks
+                    self.stdout.write(
+                        f'{rows} задач, {name}: {elapsed * 1000:.1f} мс, '
+                        f'память списка {retained_memory / 1024 / 1024:.1f} МБ, пик {peak_memory / 1024 / 1024:.1f} МБ'
+                    )
+                transaction.set_rollback(True)
+
+    def _measure(self, function, repeat: int) -> float:
+        function()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return sorted(timings)[len(timings) // 2]
@@ -0,0 +1,80 @@
+import io
+import csv
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+
+from task.models import Task, Category
+from task.infrastructure.database_repository import TaskDatabaseRepository, CategoryDatabaseRepository
+from task.services.use_cases import TaskUseCase
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет импорт задач из CSV: проверка записей, выдача ключей порядка одним запросом и загрузка через COPY. '
+        'Для сравнения замеряется добавление задач по одной, как при создании задачи через форму. '
+        'Данные генерируются во временной транзакции и откатываются после замеров'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50_000)
+        parser.add_argument('--invalid-every', type=int, default=100, help='Каждая какая запись файла содержит ошибку')
+        parser.add_argument('--one-by-one-rows', type=int, default=2_000, help='Сколько задач добавлять по одной для сравнения')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        use_case = TaskUseCase(
+            task_database_repository=TaskDatabaseRepository(Task, connection),
+            category_database_repository=CategoryDatabaseRepository(Category)
+        )
+        categories = list(Category.objects.filter(is_custom=False))
+        file_content = self._generate_csv(options['rows'], options['invalid_every'], [category.name for category in categories])
+
+        import_timings = []
+        for _ in range(options['repeat']):
+            with transaction.atomic():
+                user = get_user_model().objects.create(username='benchmark_user', email='benchmark@example.com').to_domain()
+                start = time.perf_counter()
+                report = list(use_case.import_user_tasks(user, io.BytesIO(file_content), 'csv'))
+                import_timings.append(time.perf_counter() - start)
+                transaction.set_rollback(True)
+        import_time = sorted(import_timings)[len(import_timings) // 2]
+        self.stdout.write(
+            f'Импорт {options["rows"]} записей ({len(file_content) / 1024 / 1024:.1f} МБ): {import_time:.2f} с, '
+            f'{import_time / options["rows"] * 1_000_000:.1f} мкс на задачу, итог {report[-1].strip()}'
+        )
+
+        with transaction.atomic():
+            user = get_user_model().objects.create(username='benchmark_user', email='benchmark@example.com')
+            user_entity = user.to_domain()
+            start = time.perf_counter()
+            for number in range(options['one_by_one_rows']):
+                Task.objects.create(
+                    name=f'Задача {number}', category=categories[number % len(categories)], user=user,
+                    order=use_case.get_next_task_order(user_entity), planned_time=timedelta(minutes=30)
+                )
+            one_by_one_time = time.perf_counter() - start
+            transaction.set_rollback(True)
+        self.stdout.write(
+            f'Добавление {options["one_by_one_rows"]} задач по одной: {one_by_one_time:.2f} с, '
+            f'{one_by_one_time / options["one_by_one_rows"] * 1_000_000:.1f} мкс на задачу'
+        )
+
+    def _generate_csv(self, rows: int, invalid_every: int, category_names: list[str]) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(('name', 'description', 'category', 'deadline', 'planned_time'))
+        today = date.today()
+        for number in range(rows):
+            writer.writerow((
+                f'Задача {number}',
+                f'Описание задачи {number}' if number % 3 else '',
+                category_names[number % len(category_names)],
+                (today + timedelta(days=number % 90)).isoformat() if number % 2 else '',
+                # Неправильное время в каждой invalid_every записи
+                'полчаса' if invalid_every and number % invalid_every == invalid_every - 1 else f'{number % 5}:{number % 60:02d}',
+            ))
+        return buffer.getvalue().encode()
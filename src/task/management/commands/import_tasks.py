@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from task.models import Task, Category
+from task.infrastructure.database_repository import TaskDatabaseRepository, CategoryDatabaseRepository
+from task.services.use_cases import TaskUseCase
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует задачи пользователя из файла CSV или JSON, как страница импорта задач. '
+        'Выводит отчет об импорте в формате NDJSON: ошибки в записях и итог'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=TaskUseCase.task_import_formats, default=None, help='По умолчанию определяется по расширению файла')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username']).to_domain()
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'Нет пользователя {options["username"]}')
+        use_case = TaskUseCase(
+            task_database_repository=TaskDatabaseRepository(Task, connection),
+            category_database_repository=CategoryDatabaseRepository(Category)
+        )
+        import_format = options['format'] or options['path'].rsplit('.', 1)[-1].lower()
+        with open(options['path'], 'rb') as file:
+            try:
+                report = use_case.import_user_tasks(user, file, import_format)
+                for line in report:
+                    self.stdout.write(line, ending='')
+            except ValueError as exc:
+                raise CommandError(str(exc))
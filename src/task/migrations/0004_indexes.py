@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 11:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.contrib.postgres.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся конкурентно, чтобы не блокировать запись в таблицы, а это невозможно внутри транзакции
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('task', '0003_auto_20250820_1111'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(fields=['user', 'order'], name='task_user_order_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deadline__isnull', False)), fields=['user', 'deadline'], include=('category',), name='task_user_deadline_idx'),
+        ),
+        # Отдельные индексы внешних ключей удаляются после того, как их заменили составные индексы
+        migrations.AlterField(
+            model_name='task',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь, создавший задачу'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Существующие задачи получают порядковые ключи с шагом TASK_ORDER_STEP (1024), чтобы перемещение задачи
+    # между соседями меняло только ее строку
+    dependencies = [
+        ('task', '0004_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='''
+            UPDATE task_task
+            SET "order" = ranked.position * 1024
+            FROM (
+                SELECT id, row_number() OVER (PARTITION BY user_id ORDER BY "order", id) AS position
+                FROM task_task
+            ) ranked
+            WHERE task_task.id = ranked.id;
+            ''',
+            reverse_sql='''
+            UPDATE task_task
+            SET "order" = ranked.position
+            FROM (
+                SELECT id, row_number() OVER (PARTITION BY user_id ORDER BY "order", id) AS position
+                FROM task_task
+            ) ranked
+            WHERE task_task.id = ranked.id;
+            '''
+        ),
+    ]
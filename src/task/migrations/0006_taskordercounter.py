@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-18 12:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0001_initial'),
+        ('task', '0005_gapped_task_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskOrderCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('last_order', models.IntegerField(verbose_name='Последний выданный новой задаче порядковый ключ')),
+            ],
+            options={
+                'verbose_name': 'Счетчик порядковых ключей новых задач пользователя. Блокировка строки не дает двум задачам, созданным одновременно, получить один ключ',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Django 4.2 не умеет описывать генерируемые колонки, поэтому search_vector есть только в базе, а не в модели.
+    # Postgres сам пересчитывает колонку при изменении названия или описания, код сохранения задач не меняется.
+    # Кроме слов в колонке есть лексема владельца '#<user_id>', которую парсер не может получить из текста:
+    # без расширения btree_gin это единственный способ, чтобы GIN-индекс сам отбирал совпадения одного пользователя.
+    # Задачи добавляются по одной, поэтому индекс обновляется сразу: со списком отложенных вставок (fastupdate)
+    # каждый поиск читал бы этот список целиком, пока его не разберет autovacuum
+    dependencies = [
+        ('task', '0006_taskordercounter'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='''
+            ALTER TABLE task_task ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('russian', name), 'A') ||
+                setweight(to_tsvector('russian', coalesce(description, '')), 'B') ||
+                array_to_tsvector(ARRAY['#' || user_id::text])
+            ) STORED;
+            CREATE INDEX task_search_vector_idx ON task_task USING gin (search_vector) WITH (fastupdate = off);
+            ''',
+            reverse_sql='''
+            ALTER TABLE task_task DROP COLUMN search_vector;
+            '''
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 12:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0007_task_search_vector'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='task',
+            name='order',
+            field=models.BigIntegerField(verbose_name='Порядок задачи в списке'),
+        ),
+        migrations.AlterField(
+            model_name='taskordercounter',
+            name='last_order',
+            field=models.BigIntegerField(verbose_name='Последний выданный новой задаче порядковый ключ'),
+        ),
+    ]
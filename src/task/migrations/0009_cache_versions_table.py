@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.management import call_command
+from django.db import migrations
+
+from task.helpers.cache import CACHE_VERSIONS
+
+
+def create_cache_versions_table(apps, schema_editor):
+    # Без таблицы главная страница и история падают, поэтому она создается вместе с остальной схемой,
+    # а не отдельной командой createcachetable. Для Redis или Memcached таблица не нужна
+    if isinstance(caches[CACHE_VERSIONS], DatabaseCache):
+        call_command('createcachetable', CACHE_VERSIONS, database=schema_editor.connection.alias)
+
+
+def drop_cache_versions_table(apps, schema_editor):
+    if isinstance(caches[CACHE_VERSIONS], DatabaseCache):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {schema_editor.quote_name(settings.CACHES[CACHE_VERSIONS]["LOCATION"])};')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0008_bigint_task_order'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_versions_table, drop_cache_versions_table),
+    ]
@@ -1,5 +1,7 @@
+from inspect import iscoroutine
 from urllib.parse import urlparse, urlunparse
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import REDIRECT_FIELD_NAME
 from django.contrib.auth.mixins import AccessMixin
 from django.core.exceptions import PermissionDenied
@@ -7,7 +9,9 @@ from django.shortcuts import resolve_url
 from django.http import HttpResponseRedirect, QueryDict
 from django.conf import settings
 from django.contrib import messages
+from django.db import connection
 from user.domain.entities import UserEntity
+from .helpers.async_db import async_connection_pool
 
 
 def redirect_to_login(next, login_url=None, redirect_field_name=REDIRECT_FIELD_NAME, message='', request=None):
@@ -43,6 +47,15 @@ class UserEntityMixin:
         return self.request.user.to_domain()
     
 
+class CacheStatisticsAccessMixin:
+    '''
+    Доступ к статистике кешей для пользователей из CACHE_STATISTICS_USER_IDS
+    '''
+
+    def has_cache_statistics_access(self) -> bool:
+        return self.request.user.id in settings.CACHE_STATISTICS_USER_IDS
+
+
 class AccessMixinWithRedirectMessage(AccessMixin):
 
     def handle_no_permission(self, message):
@@ -76,3 +89,31 @@ class LoginRequiredMixinWithRedirectMessage(AccessMixinWithRedirectMessage):
             return self.handle_no_permission(message=self.message)
         return super().dispatch(request, *args, **kwargs)
 
+
+def _load_request_user(request) -> None:
+    request.user.is_authenticated
+    # Дальше запрос работает с базой через асинхронный пул, поэтому синхронное соединение потока запроса
+    # не держится открытым до конца запроса
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+async def aload_request_user(request) -> None:
+    '''
+    Загружает пользователя из сессии в отдельном потоке, потому что синхронный ORM нельзя вызывать в цикле событий.
+    После загрузки request.user закеширован и доступен асинхронному коду и шаблонам без обращений к базе
+    '''
+    async with async_connection_pool.reserve():
+        await sync_to_async(_load_request_user)(request)
+
+
+class AsyncLoginRequiredMixinWithRedirectMessage(LoginRequiredMixinWithRedirectMessage):
+    """Verify that the current user is authenticated in async views."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        await aload_request_user(request)
+        response = super().dispatch(request, *args, **kwargs)
+        # Анонимному пользователю сразу возвращается перенаправление, а не корутина обработчика
+        if iscoroutine(response):
+            response = await response
+        return response
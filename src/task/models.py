@@ -7,9 +7,19 @@ from user.models import User
 
 
 class DomainQuerySet(models.QuerySet):
+    '''
+    Связи, которые читает to_domain, модель перечисляет в domain_related_fields,
+    и они загружаются тем же запросом, что и сами записи, а не отдельным запросом на каждую запись
+    '''
 
-    def to_entity_list(self) -> list[TaskEntity]:
-        return [task.to_domain() for task in self]
+    def with_domain_relations(self) -> 'DomainQuerySet':
+        return self.select_related(*getattr(self.model, 'domain_related_fields', ()))
+
+    def to_entity_list(self) -> list:
+        return [model_obj.to_domain() for model_obj in self.with_domain_relations()]
+
+    def get_entity(self, **kwargs):
+        return self.with_domain_relations().get(**kwargs).to_domain()
 
 
 class Category(models.Model):
@@ -20,6 +30,7 @@ class Category(models.Model):
     is_custom = models.BooleanField(null=False)
 
     objects = DomainQuerySet.as_manager()
+    domain_related_fields = ('user',)
 
     @classmethod
     def from_domain(cls, entity: CategoryEntity):
@@ -53,13 +64,15 @@ class Category(models.Model):
 class Task(models.Model):
     name = models.CharField(max_length=290, null=False, blank=False, verbose_name='Название задачи')
     description = models.TextField(null=True, blank=True, verbose_name='Описание задачи')
-    order = models.IntegerField(null=False, blank=False, verbose_name='Порядок задачи в списке')    
+    order = models.BigIntegerField(null=False, blank=False, verbose_name='Порядок задачи в списке')    
     category = models.ForeignKey(to=Category, on_delete=models.CASCADE, null=False, blank=False, verbose_name='Категория, к которой относится задача')
-    user = models.ForeignKey(to=get_user_model(), on_delete=models.CASCADE, null=False, blank=False, verbose_name='Пользователь, создавший задачу')
+    # Отдельный индекс не нужен, его заменяют составные индексы из Meta.indexes, которые начинаются с user
+    user = models.ForeignKey(to=get_user_model(), on_delete=models.CASCADE, null=False, blank=False, db_index=False, verbose_name='Пользователь, создавший задачу')
     deadline = models.DateField(null=True, blank=True, verbose_name='Крайний срок выполнения задачи')
     planned_time = models.DurationField(null=False, blank=False, verbose_name='Время, запланированное на процесс выполнения задачи')
 
     objects = DomainQuerySet.as_manager()
+    domain_related_fields = ('category__user', 'user')
 
     @classmethod
     def from_domain(cls, entity: TaskEntity):
@@ -89,4 +102,22 @@ class Task(models.Model):
 
     class Meta:
         verbose_name = 'Задачи, которые пользователи ставят себе'
+        indexes = [
+            models.Index(fields=['user', 'order'], name='task_user_order_idx'),
+            models.Index(
+                fields=['user', 'deadline'],
+                include=['category'],
+                condition=models.Q(deadline__isnull=False),
+                name='task_user_deadline_idx'
+            ),
+        ]
+
+
 
+class TaskOrderCounter(models.Model):
+    user = models.OneToOneField(to=get_user_model(), on_delete=models.CASCADE, primary_key=True, verbose_name='Пользователь')
+    last_order = models.BigIntegerField(null=False, blank=False, verbose_name='Последний выданный новой задаче порядковый ключ')
+
+
+    class Meta:
+        verbose_name = 'Счетчик порядковых ключей новых задач пользователя. Блокировка строки не дает двум задачам, созданным одновременно, получить один ключ'
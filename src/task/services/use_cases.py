@@ -1,13 +1,21 @@
+import io
+import csv
+import json
+import math
 from abc import ABC, abstractmethod
-from datetime import timedelta
-from typing import Union, NoReturn
+from datetime import date, timedelta
+from typing import Optional, Union, NoReturn, Iterator, IO
 
 from ..infrastructure.database_repository import TaskDatabaseRepositoryInterface, CategoryDatabaseRepositoryInterface
+from ..infrastructure.async_database_repository import AsyncTaskDatabaseRepositoryInterface
 from user.domain.entities import UserEntity
 from ..domain.entities import TaskEntity, CategoryEntity
 from ..helpers.colors import generate_random_hex_color, hex_color_to_rgba_with_default_obscurity, rgba_color_with_default_obscurity_to_hex
-from ..helpers.date import is_out_of_deadline
+from ..helpers.date import get_month_start, add_months, get_months_window, parse_planned_time, round_to_ten_minutes
+from ..helpers.cache import VersionedCache
+from ..helpers.search import build_prefix_tsquery, encode_search_cursor, decode_search_cursor
 from history.infrastructure.database_repository import HistoryDatabaseRepositoryInterface
+from history.domain.entities import TaskOutcomeEntity
 
 
 class TaskUseCaseInterface(ABC):
@@ -21,7 +29,19 @@ class TaskUseCaseInterface(ABC):
         pass
 
     @abstractmethod
-    def get_count_user_tasks_in_categories_by_deadlines(self, user: UserEntity) -> dict[str, list]:
+    def get_count_user_tasks_in_categories_by_deadlines(self, user: UserEntity, from_month: Optional[date] = None, to_month: Optional[date] = None) -> Union[dict[str, list], NoReturn]:
+        pass
+
+    @abstractmethod
+    def get_dashboard_calendar_window(self) -> tuple[date, date]:
+        pass
+
+    @abstractmethod
+    def get_user_dashboard(self, user: UserEntity) -> tuple[dict[str, list], dict[str, list], list[TaskEntity]]:
+        pass
+
+    @abstractmethod
+    def get_user_dashboard_data(self, user: UserEntity) -> dict[str, Union[dict, list]]:
         pass
 
     @abstractmethod
@@ -36,6 +56,18 @@ class TaskUseCaseInterface(ABC):
     def get_next_task_order(self, user: UserEntity) -> int:
         pass
 
+    @abstractmethod
+    def search_user_tasks(self, user: UserEntity, text: str, cursor: Optional[str] = None, limit: Optional[int] = None) -> Union[dict, NoReturn]:
+        pass
+
+    @abstractmethod
+    def move_user_task(self, user: UserEntity, task_id: int, previous_task_id: Optional[int], next_task_id: Optional[int]) -> Union[None, NoReturn]:
+        pass
+
+    @abstractmethod
+    def import_user_tasks(self, user: UserEntity, file: IO[bytes], import_format: str) -> Union[Iterator[str], NoReturn]:
+        pass
+
     @abstractmethod
     def get_random_hex_color(self) -> str:
         pass
@@ -68,16 +100,44 @@ class TaskUseCaseInterface(ABC):
     def save_failed_task_to_history(self, user: UserEntity, task_id: int, execution_time: timedelta) -> None:
         pass
 
+    @abstractmethod
+    def save_tasks_to_history(self, user: UserEntity, outcomes: list[TaskOutcomeEntity]) -> Union[None, NoReturn]:
+        pass
+
+    @abstractmethod
+    def get_planned_time_suggestions(self, user: UserEntity) -> dict[int, dict[str, float]]:
+        pass
+
 
 class TaskUseCase(TaskUseCaseInterface):
+    # Главная страница получает календарь дедлайнов за текущий и столько же соседних месяцев с каждой стороны,
+    # остальные месяцы календарь догружает сам
+    dashboard_calendar_adjacent_months = 1
+    # Сколько месяцев календаря можно запросить за раз
+    deadline_calendar_max_months = 13
+    # Сколько выполненных задач в категории нужно, чтобы предлагать поправку к запланированному времени
+    planned_time_suggestion_min_samples = 5
+    search_page_size = 20
+    max_search_page_size = 100
+    task_import_formats = ('csv', 'json')
+    task_import_required_columns = ('name', 'category', 'planned_time')
+    task_import_max_rows = 100_000
+    # Как у поля name модели Task
+    task_name_max_length = 290
+    # Сколько задач можно перенести в историю за один запрос
+    max_tasks_to_history_batch_size = 500
+
     def __init__(
                 self, task_database_repository: TaskDatabaseRepositoryInterface = None,
                 category_database_repository: CategoryDatabaseRepositoryInterface = None,
-                history_database_repository: HistoryDatabaseRepositoryInterface = None
+                history_database_repository: HistoryDatabaseRepositoryInterface = None,
+                dashboard_cache: VersionedCache = None
             ):
         self._task_database_repository = task_database_repository
         self._category_database_repository = category_database_repository
         self._history_database_repository = history_database_repository
+        # Кеш данных главной страницы, версии пользователей меняют репозитории при изменении задач и категорий
+        self._dashboard_cache = dashboard_cache
 
     def get_ordered_user_tasks(self, user: UserEntity) -> list[TaskEntity]:
         return self._task_database_repository.get_ordered_user_tasks(user)
@@ -86,12 +146,60 @@ class TaskUseCase(TaskUseCaseInterface):
         task_count_statistics = self._task_database_repository.get_count_user_tasks_in_categories(user)
         return task_count_statistics
 
-    def get_count_user_tasks_in_categories_by_deadlines(self, user: UserEntity) -> dict[str, list]:
-        raw_count_user_tasks_in_categories_by_deadlines = self._task_database_repository.get_count_user_tasks_in_categories_by_deadlines(user)
-        count_user_tasks_in_categories_by_deadlines = {}
-        for row in raw_count_user_tasks_in_categories_by_deadlines:
-            count_user_tasks_in_categories_by_deadlines[row[0].strftime('%Y.%m.%d')] = row[1]
-        return count_user_tasks_in_categories_by_deadlines
+    def get_count_user_tasks_in_categories_by_deadlines(self, user: UserEntity, from_month: Optional[date] = None, to_month: Optional[date] = None) -> Union[dict[str, list], NoReturn]:
+        '''
+        Календарь дедлайнов с from_month по to_month включительно: 'YYYY.MM.DD' -> число задач по категориям.
+        Без месяцев возвращает календарь главной страницы. Выбрасывает ValueError, если промежуток пустой или слишком длинный
+        '''
+        if from_month is None:
+            from_date, to_date = self.get_dashboard_calendar_window()
+        else:
+            to_month = to_month or from_month
+            months = (to_month.year - from_month.year) * 12 + to_month.month - from_month.month + 1
+            if not 0 < months <= self.deadline_calendar_max_months:
+                raise ValueError
+            from_date, to_date = get_months_window(from_month, to_month)
+        return self._task_database_repository.get_count_user_tasks_in_categories_by_deadlines(user, from_date, to_date)
+
+    def get_dashboard_calendar_window(self) -> tuple[date, date]:
+        current_month = get_month_start(date.today())
+        return get_months_window(
+            add_months(current_month, -self.dashboard_calendar_adjacent_months), add_months(current_month, self.dashboard_calendar_adjacent_months)
+        )
+
+    def get_user_dashboard(self, user: UserEntity) -> tuple[dict[str, list], dict[str, list], list[TaskEntity]]:
+        '''
+        Возвращает данные главной страницы одним запросом: (число задач по категориям, календарь дедлайнов
+        за get_dashboard_calendar_window, упорядоченные задачи)
+        '''
+        from_date, to_date = self.get_dashboard_calendar_window()
+        if self._dashboard_cache is None:
+            return self._task_database_repository.get_user_dashboard(user, from_date, to_date)
+        return self._dashboard_cache.get_or_set(
+            user.id, ('dashboard', from_date), lambda: self._task_database_repository.get_user_dashboard(user, from_date, to_date)
+        )
+
+    def get_user_dashboard_data(self, user: UserEntity) -> dict[str, Union[dict, list]]:
+        '''
+        Данные главной страницы в виде, пригодном для json, чтобы обновлять графики без перезагрузки страницы
+        '''
+        chart_data, calendar_data, tasks = self.get_user_dashboard(user)
+        return {
+            'chart_data': chart_data,
+            'calendar_data': calendar_data,
+            'calendar_window': [day.isoformat() for day in self.get_dashboard_calendar_window()],
+            'tasks': [self._format_dashboard_task(task) for task in tasks],
+        }
+
+    def _format_dashboard_task(self, task: TaskEntity) -> dict:
+        return {
+            'id': task.id,
+            'name': task.name,
+            'order': task.order,
+            'deadline': task.deadline.isoformat() if task.deadline else None,
+            'planned_time': task.planned_time.total_seconds(),
+            'category': {'id': task.category.id, 'name': task.category.name, 'color': task.category.color},
+        }
 
     def get_user_task_by_id(self, task_id: int, user: UserEntity) -> Union[TaskEntity, NoReturn]:
         task = self._task_database_repository.get_task_by_id(task_id)
@@ -101,20 +209,147 @@ class TaskUseCase(TaskUseCaseInterface):
             raise PermissionError
 
     def get_next_task_order(self, user: UserEntity) -> int:
-        user_tasks = self._task_database_repository.get_ordered_user_tasks(user)
-        if user_tasks:
-            return user_tasks[-1].order + 1
+        return self._task_database_repository.get_next_user_task_order(user)
+
+    def search_user_tasks(self, user: UserEntity, text: str, cursor: Optional[str] = None, limit: Optional[int] = None) -> Union[dict, NoReturn]:
+        '''
+        Страница задач пользователя, подходящих под набираемый текст, от самых релевантных.
+        Выбрасывает ValueError при неправильном курсоре
+        '''
+        tsquery = build_prefix_tsquery(text)
+        after_key = decode_search_cursor(cursor) if cursor else None
+        if tsquery is None:
+            return {'results': [], 'next_cursor': None}
+        search_page = self._task_database_repository.search_user_tasks(
+            user, tsquery, min(limit or self.search_page_size, self.max_search_page_size), after_key
+        )
+        return {
+            'results': [
+                {'id': result.id, 'name': result.name, 'deadline': result.day.isoformat() if result.day else None}
+                for result in search_page.results
+            ],
+            'next_cursor': encode_search_cursor(search_page.next_key),
+        }
+
+    def import_user_tasks(self, user: UserEntity, file: IO[bytes], import_format: str) -> Union[Iterator[str], NoReturn]:
+        '''
+        Проверяет весь файл, добавляет правильные записи в конец списка задач одной транзакцией и возвращает итератор строк
+        отчета в формате NDJSON: по строке {"row": номер, "errors": {поле: ошибка}} на каждую неправильную запись
+        и итоговую строку {"imported": ..., "failed": ...}. Неправильные записи пропускаются.
+        Задачи записываются до возврата, чтобы ошибка базы дошла до вызывающего кода, а не оборвала уже начатый ответ.
+        Неизвестный формат, заголовок CSV без обязательных колонок и неправильный JSON вызывают ValueError
+        '''
+        if import_format not in self.task_import_formats:
+            raise ValueError(f'Неизвестный формат импорта: {import_format}')
+        if import_format == 'csv':
+            rows = self._read_csv_import(file)
         else:
-            return 1
+            rows = self._read_json_import(file)
+        return iter(self._import_rows(user, rows))
+
+    def _read_csv_import(self, file: IO[bytes]) -> Iterator[dict]:
+        # utf-8-sig убирает BOM, который добавляет Excel при сохранении в CSV UTF-8
+        reader = csv.DictReader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+        try:
+            columns = reader.fieldnames or []
+        except (UnicodeDecodeError, csv.Error):
+            raise ValueError('Файл не является CSV в кодировке UTF-8')
+        missing_columns = [column for column in self.task_import_required_columns if column not in columns]
+        if missing_columns:
+            raise ValueError(f'В файле нет обязательных колонок: {", ".join(missing_columns)}')
+        return reader
+
+    def _read_json_import(self, file: IO[bytes]) -> Iterator[dict]:
+        try:
+            rows = json.load(file)
+        except ValueError:
+            raise ValueError('Файл не является JSON в кодировке UTF-8')
+        if not isinstance(rows, list):
+            raise ValueError('JSON должен быть списком задач')
+        return iter(rows)
+
+    def _import_rows(self, user: UserEntity, rows: Iterator[dict]) -> list[str]:
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+        # Категории читаются один раз на весь файл, при одинаковых названиях берется первая по порядку
+        categories = {}
+        for category in self._category_database_repository.get_ordered_user_categories(user):
+            categories.setdefault(category.name.strip().casefold(), category)
+
+        report, tasks, failed, number = [], [], 0, 0
+        try:
+            for number, row in enumerate(rows, 1):
+                if number > self.task_import_max_rows:
+                    # Файл не импортируется совсем, чтобы у пользователя не оказалась только часть файла
+                    report.append(encode({'error': f'В одном файле можно импортировать не больше {self.task_import_max_rows} задач'}) + '\n')
+                    report.append(encode({'imported': 0, 'failed': failed}) + '\n')
+                    return report
+                task, errors = self._parse_import_row(user, row, categories)
+                if errors:
+                    failed += 1
+                    report.append(encode({'row': number, 'errors': errors}) + '\n')
+                else:
+                    tasks.append(task)
+        except (UnicodeDecodeError, csv.Error):
+            report.append(encode({'error': f'Файл не получается прочитать после записи {number}'}) + '\n')
+            report.append(encode({'imported': 0, 'failed': failed}) + '\n')
+            return report
+
+        if tasks:
+            self._task_database_repository.create_user_tasks(user, tasks)
+        report.append(encode({'imported': len(tasks), 'failed': failed}) + '\n')
+        return report
+
+    def _parse_import_row(self, user: UserEntity, row: dict, categories: dict[str, CategoryEntity]) -> tuple[Optional[TaskEntity], dict[str, str]]:
+        '''
+        Проверяет запись файла импорта так же, как форма создания задачи. Возвращает задачу или ошибки по полям
+        '''
+        if not isinstance(row, dict):
+            return None, {'row': 'Задача должна быть объектом'}
+        errors = {}
+
+        name = str(row.get('name') or '').strip()
+        if not name:
+            errors['name'] = 'Обязательное поле'
+        elif len(name) > self.task_name_max_length:
+            errors['name'] = f'Название должно быть не длиннее {self.task_name_max_length} символов'
+
+        category_name = str(row.get('category') or '').strip()
+        category = categories.get(category_name.casefold())
+        if not category_name:
+            errors['category'] = 'Обязательное поле'
+        elif category is None:
+            errors['category'] = f'Нет категории {category_name}'
+
+        deadline = None
+        if row.get('deadline'):
+            try:
+                deadline = date.fromisoformat(str(row['deadline']).strip())
+            except ValueError:
+                errors['deadline'] = 'Дата должна быть в формате ГГГГ-ММ-ДД'
+
+        planned_time = parse_planned_time(str(row.get('planned_time') or ''))
+        if planned_time is None:
+            errors['planned_time'] = 'Время должно быть в формате ЧЧ:ММ или ЧЧ:ММ:СС'
+
+        if errors:
+            return None, errors
+        return TaskEntity(
+            id=None,
+            name=name,
+            description=str(row.get('description') or '').strip() or None,
+            order=None,
+            category=category,
+            user=user,
+            deadline=deadline,
+            planned_time=round_to_ten_minutes(planned_time)
+        ), {}
 
     def update_user_task_order(self, user: UserEntity, new_order: list[str]) -> None:
-        user_tasks = self._task_database_repository.get_ordered_user_tasks(user)
-        task_dict = {task.id: task for task in user_tasks}
-        for list_index, task_id in enumerate(new_order):
-            if task_dict[int(task_id)].order != list_index + 1:
-                updated_task = task_dict[int(task_id)]
-                updated_task.order = list_index + 1
-                self._task_database_repository.save_task(updated_task)
+        # Чужие задачи в списке не меняются, запрос ограничен задачами пользователя
+        self._task_database_repository.update_user_task_order(user, [int(task_id) for task_id in new_order])
+
+    def move_user_task(self, user: UserEntity, task_id: int, previous_task_id: Optional[int], next_task_id: Optional[int]) -> Union[None, NoReturn]:
+        self._task_database_repository.move_user_task(user, task_id, previous_task_id, next_task_id)
 
     def get_random_hex_color(self) -> str:
         return generate_random_hex_color()
@@ -146,17 +381,65 @@ class TaskUseCase(TaskUseCaseInterface):
         self._category_database_repository.delete_category(category)
 
     def save_completed_task_to_history(self, user: UserEntity, task_id: int, execution_time: timedelta) -> None:
-        task = self._task_database_repository.get_task_by_id(task_id)
-        if task.user != user:
-            raise PermissionError
-        if not is_out_of_deadline(task.deadline):
-            self._history_database_repository.save_task_to_history_as_successful(task, execution_time)
-        else:
-            self._history_database_repository.save_task_to_history_as_outed_of_deadline(task, execution_time)
+        '''
+        Переносит выполненную задачу в историю. Опоздание определяется по дедлайну задачи в момент переноса.
+        Выбрасывает PermissionError, если задачи нет у пользователя
+        '''
+        self._history_database_repository.move_user_tasks_to_history(user, [TaskOutcomeEntity(task_id, execution_time, failed=False)])
 
     def save_failed_task_to_history(self, user: UserEntity, task_id: int, execution_time: timedelta) -> None:
-        task = self._task_database_repository.get_task_by_id(task_id)
-        if task.user != user:
-            raise PermissionError
-        self._history_database_repository.save_task_to_history_as_failed(task, execution_time)
+        self._history_database_repository.move_user_tasks_to_history(user, [TaskOutcomeEntity(task_id, execution_time, failed=True)])
+
+    def save_tasks_to_history(self, user: UserEntity, outcomes: list[TaskOutcomeEntity]) -> Union[None, NoReturn]:
+        '''
+        Переносит в историю сразу несколько выполненных и проваленных задач пользователя одной транзакцией.
+        Выбрасывает ValueError при пустом или слишком большом списке и повторах задач
+        и PermissionError, если хотя бы одна задача не принадлежит пользователю, тогда не переносится ни одна
+        '''
+        if not 0 < len(outcomes) <= self.max_tasks_to_history_batch_size:
+            raise ValueError(f'За раз можно перенести в историю от 1 до {self.max_tasks_to_history_batch_size} задач')
+        if len({outcome.task_id for outcome in outcomes}) != len(outcomes):
+            raise ValueError('Задачи в списке не должны повторяться')
+        self._history_database_repository.move_user_tasks_to_history(user, outcomes)
+
+    def get_planned_time_suggestions(self, user: UserEntity) -> dict[int, dict[str, float]]:
+        '''
+        Во сколько раз в среднем (геометрическом) реальное время задач пользователя отличается от запланированного
+        в каждой категории: id категории -> {'factor': множитель, 'samples': количество задач}.
+        Категории с малым количеством выполненных задач пропускаются, чтобы не подсказывать по случайным выбросам
+        '''
+        return {
+            bias.category_id: {
+                'factor': round(math.exp(bias.log_ratio_mean), 3),
+                'samples': bias.sample_count,
+            }
+            for bias in self._history_database_repository.get_user_planning_biases(user)
+            if bias.sample_count >= self.planned_time_suggestion_min_samples
+        }
+
+
+class AsyncTaskUseCase(TaskUseCase):
+    '''
+    Сценарии задач с асинхронными вариантами для асинхронных представлений, асинхронные методы называются с префиксом a
+    '''
 
+    def __init__(
+                self, async_task_database_repository: AsyncTaskDatabaseRepositoryInterface,
+                task_database_repository: TaskDatabaseRepositoryInterface = None,
+                category_database_repository: CategoryDatabaseRepositoryInterface = None,
+                history_database_repository: HistoryDatabaseRepositoryInterface = None,
+                dashboard_cache: VersionedCache = None
+            ):
+        super().__init__(task_database_repository, category_database_repository, history_database_repository, dashboard_cache)
+        self._async_task_database_repository = async_task_database_repository
+
+    async def aget_user_dashboard(self, user: UserEntity) -> tuple[dict[str, list], dict[str, list], list[TaskEntity]]:
+        '''
+        Возвращает данные главной страницы одним запросом: (число задач по категориям, число задач по дедлайнам, упорядоченные задачи)
+        '''
+        from_date, to_date = self.get_dashboard_calendar_window()
+        if self._dashboard_cache is None:
+            return await self._async_task_database_repository.get_user_dashboard(user, from_date, to_date)
+        return await self._dashboard_cache.aget_or_set(
+            user.id, ('dashboard', from_date), lambda: self._async_task_database_repository.get_user_dashboard(user, from_date, to_date)
+        )
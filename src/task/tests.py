@@ -1,11 +1,26 @@
+import io
 import json
-from datetime import timedelta
+import threading
+from datetime import date, timedelta
 
-from django.test import TestCase
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, AsyncRequestFactory
+from django.db import connection, transaction, DatabaseError
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
 
-from task.models import Task, Category
+from task.models import Task, Category, TaskOrderCounter
 from history.models import History
+from task.services.use_cases import TaskUseCase, AsyncTaskUseCase
+from task.infrastructure.database_repository import TaskDatabaseRepository, CategoryDatabaseRepository, TASK_ORDER_STEP
+from task.infrastructure.async_database_repository import AsyncTaskDatabaseRepository
+from task.infrastructure.cache import task_dashboard_cache
+from task.helpers.async_db import async_connection_pool
+from task.helpers.cache import VersionedCache
+from task.helpers.date import get_month_start, add_months
+from task.views import AsyncMyTasksView
 
 class TaskTest(TestCase):
 
@@ -129,7 +144,7 @@ class TaskTest(TestCase):
 
         order_update_response = self._task_order_update(json.dumps({'order': tasks_order}))
         self.assertEqual(order_update_response.status_code, 200)
-        self.assertEqual([order[0] for order in Task.objects.all().order_by('id').values_list('order')], [2, 1, 3])
+        self.assertEqual([order[0] for order in Task.objects.all().order_by('id').values_list('order')], [2 * TASK_ORDER_STEP, TASK_ORDER_STEP, 3 * TASK_ORDER_STEP])
 
         task_complete_response = self._save_completed_task_to_history(Task.objects.first().id, '2:30:00')
         self.assertEqual(task_complete_response.status_code, 302)
@@ -150,4 +165,459 @@ class TaskTest(TestCase):
         self.assertEqual(category_deletion_response.status_code, 203)
         self.assertEqual(len(Category.objects.all()), 9)
 
-        self._clear_database()
\ No newline at end of file
+        self._clear_database()
+
+
+class AsyncMyTasksTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def test_async_dashboard(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        custom_category = Category.objects.create(name='test_category', color='rgba(1, 2, 3, 0.8)', user=user, is_custom=True)
+        default_category = Category.objects.filter(is_custom=False).first()
+        deadline = date.today()
+        for order, (category, deadline) in enumerate([(custom_category, deadline), (default_category, None), (default_category, deadline)], 1):
+            Task.objects.create(name=f'test_task{order}', order=4 - order, category=category, user=user, deadline=deadline, planned_time=timedelta(hours=1))
+        user_entity = user.to_domain()
+        use_case = TaskUseCase(TaskDatabaseRepository(Task, connection))
+
+        async def get_dashboard():
+            try:
+                return await AsyncTaskUseCase(AsyncTaskDatabaseRepository(async_connection_pool)).aget_user_dashboard(user_entity)
+            finally:
+                await async_connection_pool.close()
+
+        self.assertEqual(
+            async_to_sync(get_dashboard)(),
+            (
+                use_case.get_user_task_count_statistics(user_entity),
+                use_case.get_count_user_tasks_in_categories_by_deadlines(user_entity),
+                use_case.get_ordered_user_tasks(user_entity)
+            )
+        )
+
+        async def get_page(request):
+            try:
+                response = await AsyncMyTasksView.as_view()(request)
+                return response.render()
+            finally:
+                await async_connection_pool.close()
+
+        request = AsyncRequestFactory().get('/')
+        request.user = user
+        response = async_to_sync(get_page)(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([task.name for task in response.context_data['task_list']], ['test_task3', 'test_task2', 'test_task1'])
+
+
+class DomainQueriesTest(TransactionTestCase):
+    # TransactionTestCase выполняется после TaskTest и не сдвигает ему последовательности id
+    serialized_rollback = True
+
+    def test_entities_are_hydrated_in_one_query(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        custom_categories = [
+            Category.objects.create(name=f'test_category{i}', color='rgba(1, 2, 3, 0.8)', user=user, is_custom=True)
+            for i in range(3)
+        ]
+        categories = custom_categories + list(Category.objects.filter(is_custom=False))
+        Task.objects.bulk_create([
+            Task(name=f'test_task{order}', order=order, category=categories[order % len(categories)], user=user, planned_time=timedelta(hours=1))
+            for order in range(50)
+        ])
+        user_entity = user.to_domain()
+        task_repository = TaskDatabaseRepository(Task, connection)
+        category_repository = CategoryDatabaseRepository(Category)
+        task_id = Task.objects.filter(category=custom_categories[0]).values_list('id', flat=True).first()
+
+        with self.assertNumQueries(1):
+            tasks = task_repository.get_ordered_user_tasks(user_entity)
+            self.assertEqual(len({task.category.user.id for task in tasks if task.category.user}), 1)
+        # Пользователь и категории собираются один раз на весь список
+        self.assertTrue(all(task.user is user_entity for task in tasks))
+        self.assertEqual(len({id(task.category) for task in tasks}), len(categories))
+        self.assertEqual(tasks, Task.objects.filter(user=user).order_by('order').to_entity_list())
+        with self.assertNumQueries(1):
+            self.assertEqual(task_repository.get_task_by_id(task_id).category.user, user_entity)
+        with self.assertNumQueries(1):
+            self.assertEqual(category_repository.get_category_by_id(custom_categories[0].id).user, user_entity)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(category_repository.get_ordered_user_categories(user_entity)), len(categories))
+
+
+class TaskOrderTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def _get_ordered_task_ids(self, user) -> list[int]:
+        return list(Task.objects.filter(user=user).order_by('order').values_list('id', flat=True))
+
+    def test_task_move(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        other_user = get_user_model().objects.create(username='other_user', email='other@example.com', password='test_password')
+        self.client.force_login(user)
+        user_entity = user.to_domain()
+        repository = TaskDatabaseRepository(Task, connection)
+        use_case = TaskUseCase(repository)
+        category = Category.objects.filter(is_custom=False).first()
+        tasks = []
+        for number in range(5):
+            tasks.append(Task.objects.create(
+                name=f'test_task{number}', order=use_case.get_next_task_order(user_entity), category=category, user=user, planned_time=timedelta(hours=1)
+            ).id)
+        other_task = Task.objects.create(name='other_task', order=TASK_ORDER_STEP, category=category, user=other_user, planned_time=timedelta(hours=1)).id
+        self.assertEqual(list(Task.objects.filter(user=user).order_by('id').values_list('order', flat=True)), [TASK_ORDER_STEP * number for number in range(1, 6)])
+
+        # Перемещение меняет одну строку одним запросом, еще два - BEGIN и COMMIT транзакции,
+        # и после коммита один запрос сбрасывает версию главной страницы в общем кеше
+        with self.assertNumQueries(4):
+            repository.move_user_task(user_entity, tasks[4], None, tasks[0])
+        tasks = [tasks[4]] + tasks[:4]
+        self.assertEqual(self._get_ordered_task_ids(user), tasks)
+
+        response = self.client.put(f'/move-task/{tasks[0]}/', json.dumps({'previous_task_id': tasks[2], 'next_task_id': tasks[3]}))
+        self.assertEqual(response.status_code, 200)
+        tasks = tasks[1:3] + [tasks[0]] + tasks[3:]
+        self.assertEqual(self._get_ordered_task_ids(user), tasks)
+        self.client.put(f'/move-task/{tasks[1]}/', json.dumps({'previous_task_id': tasks[4], 'next_task_id': None}))
+        tasks = [tasks[0]] + tasks[2:] + [tasks[1]]
+        self.assertEqual(self._get_ordered_task_ids(user), tasks)
+
+        # Между соседними ключами нет места, ключи расставляются заново
+        Task.objects.filter(id=tasks[1]).update(order=Task.objects.get(id=tasks[0]).order + 1)
+        repository.move_user_task(user_entity, tasks[4], tasks[0], tasks[1])
+        tasks = tasks[:1] + [tasks[4]] + tasks[1:4]
+        self.assertEqual(self._get_ordered_task_ids(user), tasks)
+
+        response = self.client.put(f'/move-task/{tasks[0]}/', json.dumps({'previous_task_id': other_task, 'next_task_id': None}))
+        self.assertEqual(response.status_code, 403)
+        response = self.client.put(f'/move-task/{other_task}/', json.dumps({'previous_task_id': None, 'next_task_id': tasks[0]}))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Task.objects.get(id=other_task).order, TASK_ORDER_STEP)
+        self.assertEqual(self.client.put(f'/move-task/{tasks[0]}/', 'not json').status_code, 400)
+        # Перепутанные соседи не помещаются рядом и после перерасстановки ключей, перемещение откатывается целиком
+        Task.objects.filter(id=tasks[2]).update(order=Task.objects.get(id=tasks[1]).order + 1)
+        orders = list(Task.objects.filter(user=user).order_by('id').values_list('order', flat=True))
+        response = self.client.put(f'/move-task/{tasks[4]}/', json.dumps({'previous_task_id': tasks[2], 'next_task_id': tasks[1]}))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(Task.objects.filter(user=user).order_by('id').values_list('order', flat=True)), orders)
+        self.assertEqual(self._get_ordered_task_ids(user), tasks)
+
+        # Весь порядок списка сохраняется одним запросом в транзакции, чужие задачи не меняются
+        new_order = list(reversed(tasks))
+        with self.assertNumQueries(4):
+            use_case.update_user_task_order(user_entity, [str(task_id) for task_id in new_order + [other_task]])
+        self.assertEqual(self._get_ordered_task_ids(user), new_order)
+        self.assertEqual(Task.objects.get(id=other_task).order, TASK_ORDER_STEP)
+
+        # Счетчик растет на шаг с каждой задачей и не сбрасывается, поэтому ключи выходят за пределы int32
+        TaskOrderCounter.objects.filter(user=user).update(last_order=2 ** 31)
+        large_order = use_case.get_next_task_order(user_entity)
+        self.assertEqual(large_order, 2 ** 31 + TASK_ORDER_STEP)
+        task = Task.objects.create(name='large_order_task', order=large_order, category=category, user=user, planned_time=timedelta(hours=1))
+        self.assertEqual(self._get_ordered_task_ids(user)[-1], task.id)
+
+    def test_concurrent_task_order_allocation(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        user_entity = user.to_domain()
+        repository = TaskDatabaseRepository(Task, connection)
+        category = Category.objects.filter(is_custom=False).first()
+        for number in range(1, 4):
+            Task.objects.create(name=f'test_task{number}', order=number * TASK_ORDER_STEP, category=category, user=user, planned_time=timedelta(hours=1))
+
+        # Первый поток выдает ключ и держит транзакцию открытой, второй в это время ждет блокировки строки счетчика
+        orders = {}
+        first_allocated = threading.Event()
+        release_first = threading.Event()
+
+        def allocate(name, hold):
+            try:
+                with transaction.atomic():
+                    orders[name] = repository.get_next_user_task_order(user_entity)
+                    if hold:
+                        first_allocated.set()
+                        release_first.wait(10)
+            finally:
+                connection.close()
+
+        first = threading.Thread(target=allocate, args=('first', True))
+        second = threading.Thread(target=allocate, args=('second', False))
+        first.start()
+        first_allocated.wait(10)
+        second.start()
+        second.join(0.5)
+        self.assertTrue(second.is_alive())
+        release_first.set()
+        first.join()
+        second.join()
+        self.assertEqual(orders, {'first': 4 * TASK_ORDER_STEP, 'second': 5 * TASK_ORDER_STEP})
+
+        self.assertEqual(repository.get_next_user_task_order(user_entity), 6 * TASK_ORDER_STEP)
+        # Ключ задачи, перемещенной в конец списка, может быть больше выданного, следующий ключ его учитывает
+        Task.objects.filter(user=user, order=TASK_ORDER_STEP).update(order=10 * TASK_ORDER_STEP)
+        self.assertEqual(repository.get_next_user_task_order(user_entity), 11 * TASK_ORDER_STEP)
+
+
+class DashboardTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def test_dashboard_in_one_query(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        self.client.force_login(user)
+        user_entity = user.to_domain()
+        use_case = TaskUseCase(TaskDatabaseRepository(Task, connection))
+        self.assertEqual(use_case.get_user_dashboard(user_entity), ({'counts': None, 'categories': None, 'colors': None}, {}, []))
+
+        custom_category = Category.objects.create(name='test_category', color='rgba(1, 2, 3, 0.8)', user=user, is_custom=True)
+        default_categories = list(Category.objects.filter(is_custom=False)[:2])
+        today = date.today()
+        # Следующий месяц входит в календарь главной страницы, а через три месяца - уже нет
+        next_month, distant_month = add_months(get_month_start(today), 1), add_months(get_month_start(today), 3)
+        for order, (category, deadline) in enumerate([
+                    (custom_category, today), (default_categories[0], None), (default_categories[0], today),
+                    (default_categories[1], next_month), (custom_category, today), (default_categories[1], distant_month),
+                ], 1):
+            Task.objects.create(
+                name=f'test_task{order}', order=(7 - order) * TASK_ORDER_STEP, category=category, user=user, deadline=deadline,
+                planned_time=timedelta(minutes=10 * order)
+            )
+
+        with self.assertNumQueries(1):
+            dashboard = use_case.get_user_dashboard(user_entity)
+        self.assertEqual(
+            dashboard,
+            (
+                use_case.get_user_task_count_statistics(user_entity),
+                use_case.get_count_user_tasks_in_categories_by_deadlines(user_entity),
+                use_case.get_ordered_user_tasks(user_entity)
+            )
+        )
+
+        response = self.client.get('/dashboard-data/')
+        self.assertEqual(response.status_code, 200)
+        dashboard_data = response.json()
+        self.assertEqual(dashboard_data['chart_data'], dashboard[0])
+        self.assertEqual(dashboard_data['calendar_data'], dashboard[1])
+        self.assertEqual([task['id'] for task in dashboard_data['tasks']], [task.id for task in dashboard[2]])
+        self.assertEqual(dashboard_data['tasks'][0]['planned_time'], 3600)
+        self.assertEqual(dashboard_data['tasks'][1]['deadline'], today.isoformat())
+        self.assertEqual(self.client.get('/').context['task_list'], dashboard[2])
+
+        self.assertEqual(sorted(dashboard[1]), [f'{today:%Y.%m.%d}', f'{next_month:%Y.%m.%d}'])
+        self.assertEqual([deadline['count'] for deadline in dashboard[1][f'{today:%Y.%m.%d}']], [1, 2])
+        self.assertEqual(json.loads(self.client.get('/').context['calendar_window']), [
+            add_months(get_month_start(today), -1).isoformat(), (add_months(get_month_start(today), 2) - timedelta(days=1)).isoformat()
+        ])
+
+    def test_deadline_calendar_window(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        self.client.force_login(user)
+        category = Category.objects.create(name='test_category', color='rgba(1, 2, 3, 0.8)', user=user, is_custom=True)
+        for deadline in [date(2030, 1, 31), date(2030, 2, 1), date(2030, 3, 31), date(2030, 4, 1), date(2030, 4, 1)]:
+            Task.objects.create(name='test_task', order=TASK_ORDER_STEP, category=category, user=user, deadline=deadline, planned_time=timedelta(hours=1))
+
+        response = self.client.get('/deadline-calendar/', {'from_month': '2030-02', 'to_month': '2030-03'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            '2030.02.01': [{'category': 'test_category', 'color': 'rgba(1, 2, 3, 0.8)', 'count': 1}],
+            '2030.03.31': [{'category': 'test_category', 'color': 'rgba(1, 2, 3, 0.8)', 'count': 1}],
+        })
+        self.assertEqual(self.client.get('/deadline-calendar/', {'from_month': '2030-04'}).json()['2030.04.01'], [
+            {'category': 'test_category', 'color': 'rgba(1, 2, 3, 0.8)', 'count': 2}
+        ])
+        self.assertEqual(self.client.get('/deadline-calendar/', {'from_month': '2031-01'}).json(), {})
+        for params in [{}, {'from_month': '2030-13'}, {'from_month': '2030-03', 'to_month': '2030-02'}, {'from_month': '2030-01', 'to_month': '2031-02'}]:
+            self.assertEqual(self.client.get('/deadline-calendar/', params).status_code, 400)
+
+
+class TaskSearchTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def _search(self, text: str) -> list[str]:
+        return [result['name'] for result in self.client.get('/search/', {'q': text}).json()['results']]
+
+    def test_task_search(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        other_user = get_user_model().objects.create(username='other_user', email='other@example.com', password='test_password')
+        self.client.force_login(user)
+        category = Category.objects.filter(is_custom=False).first()
+        for order, (owner, name, description) in enumerate([
+                    (user, 'Подготовить отчет для клиента', None),
+                    (user, 'Купить продукты', 'Распечатать отчеты для бухгалтерии'),
+                    (user, 'Обсудить отчёт с командой', 'Отчет за квартал'),
+                    (other_user, 'Отчет другого пользователя', None),
+                ], 1):
+            Task.objects.create(
+                name=name, description=description, order=order * TASK_ORDER_STEP, category=category, user=owner,
+                planned_time=timedelta(hours=1)
+            )
+
+        # Совпадение в названии весит больше совпадения в описании
+        self.assertEqual(self._search('отчеты'), ['Обсудить отчёт с командой', 'Подготовить отчет для клиента', 'Купить продукты'])
+        self.assertEqual(self._search('подгот'), ['Подготовить отчет для клиента'])
+        self.assertEqual(self._search('отчет для клие'), ['Подготовить отчет для клиента'])
+        # Короткое недописанное слово ищется целиком, а запрос из одних стоп-слов ничего не находит
+        self.assertEqual(self._search('по'), [])
+        self.assertEqual(self._search('для'), [])
+
+        Task.objects.filter(name='Купить продукты').update(name='Купить молоко', description=None)
+        self.assertEqual(self._search('молок'), ['Купить молоко'])
+        self.assertEqual(self._search('бухгалтерии'), [])
+
+        page = self.client.get('/search/', {'q': 'отчет', 'limit': 1}).json()
+        names = [result['name'] for result in page['results']]
+        while page['next_cursor']:
+            page = self.client.get('/search/', {'q': 'отчет', 'limit': 1, 'cursor': page['next_cursor']}).json()
+            names += [result['name'] for result in page['results']]
+        self.assertEqual(names, self._search('отчет'))
+        self.assertEqual(len(names), 2)
+
+        self.assertEqual(self.client.get('/search/').status_code, 400)
+        self.assertEqual(self.client.get('/search/', {'q': 'отчет', 'cursor': 'wrong'}).status_code, 400)
+
+
+class TaskImportTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def _import(self, content: str, name: str, import_format: str = '') -> list[dict]:
+        response = self.client.post('/import-tasks/', {'file': SimpleUploadedFile(name, content.encode()), 'format': import_format})
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_task_import(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        self.client.force_login(user)
+        Category.objects.create(name='Работа', color='rgba(1, 2, 3, 0.8)', user=user, is_custom=True)
+        category = Category.objects.filter(is_custom=False).first()
+        use_case = TaskUseCase(TaskDatabaseRepository(Task, connection))
+        Task.objects.create(
+            name='existing_task', order=use_case.get_next_task_order(user.to_domain()), category=category, user=user,
+            planned_time=timedelta(hours=1)
+        )
+
+        report = self._import(
+            '\ufeffname,description,category,deadline,planned_time\n'
+            'Первая задача,Описание,работа ,2030-01-15,1:04\n'
+            ',,Работа,,1:00\n'
+            'Вторая задача,,Нет такой,15.01.2030,полчаса\n'
+            f'Третья задача,,{category.name},,0:36:30\n',
+            'tasks.csv'
+        )
+        self.assertEqual(report, [
+            {'row': 2, 'errors': {'name': 'Обязательное поле'}},
+            {'row': 3, 'errors': {
+                'category': 'Нет категории Нет такой',
+                'deadline': 'Дата должна быть в формате ГГГГ-ММ-ДД',
+                'planned_time': 'Время должно быть в формате ЧЧ:ММ или ЧЧ:ММ:СС',
+            }},
+            {'imported': 2, 'failed': 2},
+        ])
+        # Импортированные задачи встают в конец списка в порядке файла, время округляется как в форме
+        tasks = list(Task.objects.filter(user=user).order_by('order').values_list('name', 'description', 'category__name', 'deadline', 'planned_time'))
+        self.assertEqual(tasks, [
+            ('existing_task', None, category.name, None, timedelta(hours=1)),
+            ('Первая задача', 'Описание', 'Работа', date(2030, 1, 15), timedelta(hours=1)),
+            ('Третья задача', None, category.name, None, timedelta(minutes=40)),
+        ])
+        self.assertEqual(
+            use_case.get_next_task_order(user.to_domain()),
+            Task.objects.filter(user=user).order_by('-order').values_list('order', flat=True).first() + TASK_ORDER_STEP
+        )
+
+        report = self._import(json.dumps([{'name': 'Из JSON', 'category': 'Работа', 'planned_time': '2:00'}, 'wrong']), 'tasks.txt', 'json')
+        self.assertEqual(report, [{'row': 2, 'errors': {'row': 'Задача должна быть объектом'}}, {'imported': 1, 'failed': 1}])
+        self.assertEqual(Task.objects.filter(user=user).order_by('-order').values_list('name', flat=True).first(), 'Из JSON')
+
+        self.assertEqual(self.client.post('/import-tasks/', {'file': SimpleUploadedFile('tasks.xlsx', b'')}).status_code, 400)
+        self.assertEqual(self.client.post('/import-tasks/', {'file': SimpleUploadedFile('tasks.csv', b'name,category\n')}).status_code, 400)
+        self.assertEqual(self.client.post('/import-tasks/', {'file': SimpleUploadedFile('tasks.json', b'{}')}).status_code, 400)
+        self.assertEqual(Task.objects.filter(user=user).count(), 4)
+
+        # Задачи записаны еще до чтения отчета, а ошибка записи выбрасывается сразу, до начала ответа
+        content = 'name,category,planned_time\nЕще задача,Работа,1:00\n'.encode()
+        import_use_case = TaskUseCase(TaskDatabaseRepository(Task, connection), CategoryDatabaseRepository(Category))
+        report = import_use_case.import_user_tasks(user.to_domain(), io.BytesIO(content), 'csv')
+        self.assertEqual(Task.objects.filter(user=user).count(), 5)
+        self.assertEqual([json.loads(line) for line in report], [{'imported': 1, 'failed': 0}])
+
+        class FailingTaskDatabaseRepository(TaskDatabaseRepository):
+            def create_user_tasks(self, user, tasks):
+                raise DatabaseError('COPY failed')
+
+        failing_use_case = TaskUseCase(FailingTaskDatabaseRepository(Task, connection), CategoryDatabaseRepository(Category))
+        with self.assertRaises(DatabaseError):
+            failing_use_case.import_user_tasks(user.to_domain(), io.BytesIO(content), 'csv')
+        self.assertEqual(Task.objects.filter(user=user).count(), 5)
+
+
+class DashboardCacheTest(TransactionTestCase):
+    serialized_rollback = True
+
+    def setUp(self):
+        caches['task_dashboard'].clear()
+        task_dashboard_cache.reset_statistics()
+
+    def _get_task_names(self) -> list[str]:
+        return [task.name for task in self.client.get('/').context['task_list']]
+
+    def test_dashboard_cache(self):
+        user = get_user_model().objects.create(username='test_user', email='user123@example.com', password='test_password')
+        self.client.force_login(user)
+        category = Category.objects.create(name='test_category', color='rgba(1, 2, 3, 0.8)', user=user, is_custom=True)
+        for number in range(3):
+            self.client.post('/create-task/', {'name': f'test_task{number}', 'category': category.id, 'planned_time': '01:00'})
+        tasks = list(Task.objects.filter(user=user).order_by('order').values_list('id', flat=True))
+        use_case = TaskUseCase(TaskDatabaseRepository(Task, connection), dashboard_cache=task_dashboard_cache)
+
+        self.assertEqual(self._get_task_names(), ['test_task0', 'test_task1', 'test_task2'])
+        # Из общего кеша читается только версия пользователя
+        with self.assertNumQueries(1):
+            use_case.get_user_dashboard(user.to_domain())
+        self.assertEqual(task_dashboard_cache.get_statistics()['hits'], 1)
+        self.assertEqual(self.client.get('/dashboard-data/').json()['chart_data']['counts'], [3])
+
+        misses = task_dashboard_cache.get_statistics()['misses']
+        mutations = [
+            (lambda: self.client.put(f'/move-task/{tasks[2]}/', json.dumps({'previous_task_id': None, 'next_task_id': tasks[0]})),
+             ['test_task2', 'test_task0', 'test_task1']),
+            (lambda: self.client.put('/update-order/', json.dumps({'order': [str(task_id) for task_id in tasks]})),
+             ['test_task0', 'test_task1', 'test_task2']),
+            (lambda: self.client.post(f'/task/{tasks[0]}/', {'name': 'renamed_task', 'category': category.id, 'planned_time': '01:00'}),
+             ['renamed_task', 'test_task1', 'test_task2']),
+            (lambda: self.client.post(f'/complete-task/{tasks[1]}/', {'execution_time': '1:00:00'}),
+             ['renamed_task', 'test_task2']),
+            (lambda: self.client.post(f'/fail-task/{tasks[2]}/', {'execution_time': '1:00:00'}),
+             ['renamed_task']),
+            (lambda: self.client.post('/create-task/', {'name': 'new_task', 'category': category.id, 'planned_time': '01:00'}),
+             ['renamed_task', 'new_task']),
+            (lambda: self.client.delete(f'/delete-category/{category.id}/'),
+             []),
+        ]
+        for mutate, task_names in mutations:
+            mutate()
+            self.assertEqual(self._get_task_names(), task_names)
+            misses += 1
+            self.assertEqual(task_dashboard_cache.get_statistics()['misses'], misses)
+
+        self.assertEqual(self.client.get('/dashboard-cache-statistics/').status_code, 403)
+        with self.settings(CACHE_STATISTICS_USER_IDS={user.id}):
+            cache_statistics = self.client.get('/dashboard-cache-statistics/').json()
+        self.assertEqual(cache_statistics['misses'], misses)
+        self.assertEqual(cache_statistics['hits'], task_dashboard_cache.get_statistics()['hits'])
+        self.assertEqual(cache_statistics['max_entries'], settings.TASK_DASHBOARD_CACHE_SIZE)
+
+    def test_versions_are_shared_between_processes(self):
+        # Два кеша с разными хранилищами записей ведут себя как кеши двух процессов с общими версиями
+        caches['default'].clear()
+        first_process_cache = VersionedCache('task_dashboard', 'shared_versions_test')
+        second_process_cache = VersionedCache('default', 'shared_versions_test')
+        self.assertEqual(first_process_cache.get_or_set(1, ['dashboard'], lambda: 'old'), 'old')
+        self.assertEqual(second_process_cache.get_or_set(1, ['dashboard'], lambda: 'old'), 'old')
+
+        first_process_cache.bump_version(1)
+        self.assertEqual(second_process_cache.get_or_set(1, ['dashboard'], lambda: 'new'), 'new')
+        self.assertEqual(async_to_sync(second_process_cache.aget_or_set)(1, ['dashboard'], self._compute_async), 'new')
+        self.assertEqual(first_process_cache.get_or_set(2, ['dashboard'], lambda: 'other_user'), 'other_user')
+
+    @staticmethod
+    async def _compute_async():
+        return 'computed'
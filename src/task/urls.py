@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
@@ -5,16 +6,23 @@ from . import views
 app_name = 'task'
 
 urlpatterns = [
-    path('', views.MyTasksView.as_view(), name='my_tasks'),
+    path('', (views.AsyncMyTasksView if settings.ASYNC_VIEWS else views.MyTasksView).as_view(), name='my_tasks'),
+    path('dashboard-data/', views.DashboardDataView.as_view(), name='dashboard_data'),
+    path('deadline-calendar/', views.DeadlineCalendarView.as_view(), name='deadline_calendar'),
+    path('search/', views.TaskSearchView.as_view(), name='task_search'),
+    path('dashboard-cache-statistics/', views.DashboardCacheStatisticsView.as_view(), name='dashboard_cache_statistics'),
     path('create-task/', views.TaskCreationView.as_view(), name='task_creation'),
+    path('import-tasks/', views.TaskImportView.as_view(), name='task_import'),
     path('create-category/', views.CategoryCreationView.as_view(), name='category_creation'),
     path('task/<int:task_id>/', views.TaskUpdateView.as_view(), name='task'),
     path('category/<int:category_id>/', views.CategoryUpdateView.as_view(), name='category'),
     path('delete-category/<int:category_id>/', views.CategoryDeletionView.as_view(), name='category_deletion'),
     path('categories/', views.CategoriesView.as_view(), name='categories'),
     path('update-order/', views.OrderUpdateView.as_view(), name='order_update'),
+    path('move-task/<int:task_id>/', views.TaskMoveView.as_view(), name='task_move'),
     path('complete-task/<int:task_id>/', views.TaskCompletionView.as_view(), name='task_completion'),
     path('fail-task/<int:task_id>/', views.TaskFailView.as_view(), name='task_fail'),
+    path('save-tasks-to-history/', views.TasksToHistoryView.as_view(), name='tasks_to_history'),
 
 ]
 
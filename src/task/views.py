@@ -1,43 +1,161 @@
+from datetime import date
+
 from django.views.generic import TemplateView, CreateView, UpdateView, DeleteView, View
 from django.urls import reverse_lazy
 from django.core.exceptions import ObjectDoesNotExist
-from django.http import HttpResponseBadRequest, HttpResponseForbidden, HttpResponse, HttpResponseRedirect, JsonResponse, HttpResponseNotFound
+from django.utils.datastructures import MultiValueDictKeyError
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, HttpResponse, HttpResponseRedirect, JsonResponse, HttpResponseNotFound, StreamingHttpResponse
 from django.shortcuts import render
 from django.db import connection
+from django.utils.dateparse import parse_duration
 
-from .mixins import TitleMixin, UserEntityMixin, LoginRequiredMixinWithRedirectMessage
+from .mixins import TitleMixin, UserEntityMixin, LoginRequiredMixinWithRedirectMessage, AsyncLoginRequiredMixinWithRedirectMessage, CacheStatisticsAccessMixin
 from .forms import TaskCreationForm, CategoryCreationForm, TaskHistoryForm
 from .models import Task, Category
-from .services.use_cases import TaskUseCase
+from .services.use_cases import TaskUseCase, AsyncTaskUseCase
 from .infrastructure.database_repository import TaskDatabaseRepository, CategoryDatabaseRepository
+from .infrastructure.async_database_repository import AsyncTaskDatabaseRepository
+from .infrastructure.cache import task_dashboard_cache
+from .helpers.async_db import async_connection_pool
 from .serializers import to_json, from_json
 from history.infrastructure.database_repository import HistoryDatabaseRepository
+from history.infrastructure.cache import history_statistics_cache
 from history.models import History, SharedHistory
+from history.domain.entities import TaskOutcomeEntity
 
 
 class MyTasksView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, TitleMixin, TemplateView):
     title = 'Мои задачи'
     template_name = 'task/index.html'
-    use_case = TaskUseCase(task_database_repository=TaskDatabaseRepository(Task, connection))
+    use_case = TaskUseCase(task_database_repository=TaskDatabaseRepository(Task, connection), dashboard_cache=task_dashboard_cache)
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(object_list=object_list, **kwargs)
-        context['chart_data'] = to_json(self.use_case.get_user_task_count_statistics(self.get_user_entity()))
-        context['calendar_data'] = to_json(self.use_case.get_count_user_tasks_in_categories_by_deadlines(self.get_user_entity()))
-        context['task_list'] = self.use_case.get_ordered_user_tasks(self.get_user_entity())
+        chart_data, calendar_data, task_list = self.use_case.get_user_dashboard(self.get_user_entity())
+        context['chart_data'] = to_json(chart_data)
+        context['calendar_data'] = to_json(calendar_data)
+        context['calendar_window'] = to_json([day.isoformat() for day in self.use_case.get_dashboard_calendar_window()])
+        context['task_list'] = task_list
         return context
 
+
+class DashboardDataView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, View):
+    '''
+    Данные главной страницы в json для обновления графиков без перезагрузки страницы
+    '''
+    use_case = TaskUseCase(task_database_repository=TaskDatabaseRepository(Task, connection), dashboard_cache=task_dashboard_cache)
+
+    def get(self, request):
+        return JsonResponse(self.use_case.get_user_dashboard_data(self.get_user_entity()))
+
+
+class DeadlineCalendarView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, View):
+    '''
+    Календарь дедлайнов за месяцы с from_month по to_month включительно в формате YYYY-MM, без to_month - за один месяц
+    '''
+    use_case = TaskUseCase(task_database_repository=TaskDatabaseRepository(Task, connection))
+
+    def get(self, request):
+        try:
+            from_month = date.fromisoformat(self.request.GET['from_month'] + '-01')
+            to_month = date.fromisoformat(self.request.GET.get('to_month', self.request.GET['from_month']) + '-01')
+            calendar_data = self.use_case.get_count_user_tasks_in_categories_by_deadlines(self.get_user_entity(), from_month, to_month)
+        except (KeyError, ValueError):
+            return HttpResponseBadRequest('<h1>Bab Request</h1><p>Неправильный промежуток месяцев</p>')
+        return JsonResponse(calendar_data)
+
+
+class TaskSearchView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, View):
+    '''
+    Поиск по названиям и описаниям задач по мере набора текста: ?q=<текст>[&cursor=<курсор следующей страницы>][&limit=<размер>]
+    '''
+    use_case = TaskUseCase(task_database_repository=TaskDatabaseRepository(Task, connection))
+
+    def get(self, request):
+        try:
+            limit = int(self.request.GET['limit']) if 'limit' in self.request.GET else None
+            if limit is not None and limit < 1:
+                raise ValueError
+            return JsonResponse(
+                self.use_case.search_user_tasks(self.get_user_entity(), self.request.GET['q'], self.request.GET.get('cursor'), limit)
+            )
+        except MultiValueDictKeyError:
+            return JsonResponse({'error': 'Для поиска должен быть передан текст q'}, status=400)
+        except ValueError:
+            return JsonResponse({'error': 'Неправильный курсор или размер страницы'}, status=400)
+
+
+class DashboardCacheStatisticsView(LoginRequiredMixinWithRedirectMessage, CacheStatisticsAccessMixin, View):
+
+    def get(self, request):
+        if not self.has_cache_statistics_access():
+            return HttpResponseForbidden('<h1>403 Forbidden</h1><p>Статистика кеша доступна только администраторам</p>')
+        return JsonResponse(task_dashboard_cache.get_statistics())
+
+
+class AsyncMyTasksView(AsyncLoginRequiredMixinWithRedirectMessage, MyTasksView):
+    use_case = AsyncTaskUseCase(
+        AsyncTaskDatabaseRepository(async_connection_pool), TaskDatabaseRepository(Task, connection), dashboard_cache=task_dashboard_cache
+    )
+
+    async def get(self, request, *args, **kwargs):
+        chart_data, calendar_data, task_list = await self.use_case.aget_user_dashboard(self.get_user_entity())
+        # Контекст собирается в обход MyTasksView.get_context_data, которая читает данные синхронно
+        context = super(MyTasksView, self).get_context_data(**kwargs)
+        context['chart_data'] = to_json(chart_data)
+        context['calendar_data'] = to_json(calendar_data)
+        context['calendar_window'] = to_json([day.isoformat() for day in self.use_case.get_dashboard_calendar_window()])
+        context['task_list'] = task_list
+        return self.render_to_response(context)
+
 class TaskCreationView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, TitleMixin, CreateView):
     form_class = TaskCreationForm
     title = 'Создание задачи'
     template_name = 'task/task.html'
     success_url = reverse_lazy('task:my_tasks')
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        use_case = TaskUseCase(history_database_repository=HistoryDatabaseRepository(Task, History, SharedHistory, connection))
+        planned_time_suggestions = use_case.get_planned_time_suggestions(self.get_user_entity())
+        # Без подсказок шаблон не выводит блок подсказки и его скрипт
+        context['planned_time_suggestions'] = to_json(planned_time_suggestions) if planned_time_suggestions else None
+        return context
+
     def form_valid(self, form):
         use_case = TaskUseCase(task_database_repository=TaskDatabaseRepository(Task, connection))        
         form.instance.order = use_case.get_next_task_order(self.get_user_entity())
         form.instance.user = self.request.user
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        task_dashboard_cache.bump_version_on_commit(self.request.user.id)
+        return response
+
+class TaskImportView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, TitleMixin, TemplateView):
+    '''
+    Импорт задач из файла CSV или JSON с колонками name, description, category, deadline и planned_time.
+    Задачи записываются до начала ответа, поэтому ошибка базы возвращает 500, а не обрезанный отчет со статусом 200.
+    В ответ построчно приходит отчет об ошибках в записях и итог импорта в формате NDJSON
+    '''
+    title = 'Импорт задач'
+    template_name = 'task/task_import.html'
+    use_case = TaskUseCase(
+        task_database_repository=TaskDatabaseRepository(Task, connection),
+        category_database_repository=CategoryDatabaseRepository(Category)
+    )
+
+    def post(self, request):
+        try:
+            file = self.request.FILES['file']
+        except MultiValueDictKeyError:
+            return HttpResponseBadRequest('<h1>400</h1><p>Не выбран файл для импорта</p>')
+        # Без явного формата он определяется по расширению файла
+        import_format = self.request.POST.get('format') or file.name.rsplit('.', 1)[-1].lower()
+        try:
+            report = self.use_case.import_user_tasks(self.get_user_entity(), file, import_format)
+        except ValueError as exc:
+            return HttpResponseBadRequest(f'<h1>400</h1><p>{exc}</p>')
+        return StreamingHttpResponse(report, content_type='application/x-ndjson; charset=utf-8')
+
 
 class CategoryCreationView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, TitleMixin, CreateView):
     form_class = CategoryCreationForm
@@ -81,6 +199,11 @@ class TaskUpdateView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, Tit
     def get_object(self):
         return Task.from_domain(self.use_case.get_user_task_by_id(task_id=self.kwargs.get('task_id'), user=self.get_user_entity()))
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        task_dashboard_cache.bump_version_on_commit(self.request.user.id)
+        return response
+
 
 class CategoryUpdateView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, TitleMixin, UpdateView):
     form_class = CategoryCreationForm
@@ -99,7 +222,12 @@ class CategoryUpdateView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin,
 
     def form_valid(self, form):
         form.instance.color = self.use_case.get_rgba_color_with_default_obscurity(form.cleaned_data.get('color'))
-        return super().form_valid(form)
+        # Название и цвет категории входят в закешированную статистику истории
+        history_statistics_cache.bump_version_on_commit(self.request.user.id)
+        response = super().form_valid(form)
+        # и в данные главной страницы
+        task_dashboard_cache.bump_version_on_commit(self.request.user.id)
+        return response
 
     def get_object(self):
         return Category.from_domain(self.use_case.get_user_category_by_id(category_id=self.kwargs.get('category_id'), user=self.get_user_entity()))
@@ -152,6 +280,37 @@ class OrderUpdateView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, Vi
         return HttpResponse('OK')
 
 
+class TaskMoveView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, View):
+    '''
+    Перемещение одной задачи между соседями после перетаскивания: {"previous_task_id": id | null, "next_task_id": id | null}
+    '''
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except PermissionError:
+            return HttpResponseForbidden('<h1>400 Forbidden</h1><p>Вы пытаетесь переместить задачу другого пользователя</p>')
+
+    def get(self, request, task_id: int):
+        return HttpResponseBadRequest('<h1>Bab Request</h1><p>Неправильный метод запроса</p>')
+
+    def put(self, request, task_id: int):
+        try:
+            post_data_json = from_json(self.request.body.decode('utf-8'))
+            previous_task_id, next_task_id = (
+                int(post_data_json[key]) if post_data_json.get(key) is not None else None
+                for key in ('previous_task_id', 'next_task_id')
+            )
+        except (ValueError, TypeError, AttributeError):
+            return HttpResponseBadRequest('<h1>Bab Request</h1><p>Неправильные соседи задачи</p>')
+        use_case = TaskUseCase(task_database_repository=TaskDatabaseRepository(Task, connection))
+        try:
+            use_case.move_user_task(self.get_user_entity(), task_id, previous_task_id, next_task_id)
+        except ValueError:
+            return HttpResponseBadRequest('<h1>Bab Request</h1><p>Соседи задачи перепутаны местами</p>')
+        return HttpResponse('OK')
+
+
 class TaskCompletionView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, TitleMixin, View):
     title = 'Подтверждение выполнения задачи'
 
@@ -169,11 +328,16 @@ class TaskCompletionView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin,
         )
 
     def post(self, request, task_id: int):
-        use_case = TaskUseCase(
-            task_database_repository=TaskDatabaseRepository(Task, connection),
-            history_database_repository=HistoryDatabaseRepository(Task, History, SharedHistoryStatistics, connection)
-        )
-        use_case.save_completed_task_to_history(self.get_user_entity(), task_id, self.request.POST['execution_time'])
+        form = TaskHistoryForm(self.request.POST)
+        if not form.is_valid():
+            return render(
+                request,
+                'task/save_task_to_history.html',
+                context={'form': form, 'label': 'Сколько времени вам понадобилось на процесс выполнения непосредственно этой задачи'},
+                status=400
+            )
+        use_case = TaskUseCase(history_database_repository=HistoryDatabaseRepository(Task, History, SharedHistory, connection))
+        use_case.save_completed_task_to_history(self.get_user_entity(), task_id, form.cleaned_data['execution_time'])
         return HttpResponseRedirect(reverse_lazy('task:my_tasks'))
     
 
@@ -194,11 +358,51 @@ class TaskFailView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, Title
         )
 
     def post(self, request, task_id: int):
-        use_case = TaskUseCase(
-            task_database_repository=TaskDatabaseRepository(Task, connection),
-            history_database_repository=HistoryDatabaseRepository(Task, History, SharedHistory, connection)
-        )
-        use_case.save_failed_task_to_history(self.get_user_entity(), task_id, self.request.POST['execution_time'])
+        form = TaskHistoryForm(self.request.POST)
+        if not form.is_valid():
+            return render(
+                request,
+                'task/save_task_to_history.html',
+                context={'form': form, 'label': 'Сколько времени вам понадобилось на то, чтобы понять, что вы не сможете выполнить задачу'},
+                status=400
+            )
+        use_case = TaskUseCase(history_database_repository=HistoryDatabaseRepository(Task, History, SharedHistory, connection))
+        use_case.save_failed_task_to_history(self.get_user_entity(), task_id, form.cleaned_data['execution_time'])
 
         return HttpResponseRedirect(reverse_lazy('task:my_tasks'))
-    
+
+
+class TasksToHistoryView(LoginRequiredMixinWithRedirectMessage, UserEntityMixin, View):
+    '''
+    Перенос в историю сразу нескольких задач:
+    {"tasks": [{"task_id": id, "execution_time": "ЧЧ:ММ:СС", "outcome": "completed" | "failed"}, ...]}
+    '''
+    outcomes = ('completed', 'failed')
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except PermissionError:
+            return HttpResponseForbidden('<h1>400 Forbidden</h1><p>Вы пытаетесь удалить задачу другого пользователя</p>')
+
+    def get(self, request):
+        return HttpResponseBadRequest('<h1>Bab Request</h1><p>Неправильный метод запроса</p>')
+
+    def post(self, request):
+        try:
+            outcomes = [self._parse_outcome(task) for task in from_json(self.request.body.decode('utf-8'))['tasks']]
+        except (ValueError, TypeError, KeyError):
+            return HttpResponseBadRequest('<h1>Bab Request</h1><p>Неправильный список задач</p>')
+        use_case = TaskUseCase(history_database_repository=HistoryDatabaseRepository(Task, History, SharedHistory, connection))
+        try:
+            use_case.save_tasks_to_history(self.get_user_entity(), outcomes)
+        except ValueError as exc:
+            return HttpResponseBadRequest(f'<h1>Bab Request</h1><p>{exc}</p>')
+        return JsonResponse({'saved': len(outcomes)})
+
+    def _parse_outcome(self, task: dict) -> TaskOutcomeEntity:
+        # Время разбирается так же, как поле execution_time формы TaskHistoryForm
+        execution_time = parse_duration(task['execution_time'])
+        if execution_time is None or task['outcome'] not in self.outcomes:
+            raise ValueError
+        return TaskOutcomeEntity(task_id=int(task['task_id']), execution_time=execution_time, failed=task['outcome'] == 'failed')
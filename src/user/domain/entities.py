@@ -3,7 +3,8 @@ from dataclasses import dataclass
 from datetime import datetime
 
 
-@dataclass
+# Сущности неизменяемые и без __dict__: в списках их тысячи, а пользователь и категории разделяются между записями
+@dataclass(frozen=True, slots=True)
 class UserEntity:
     id: int
     username: str
@@ -15,13 +16,13 @@ class UserEntity:
     date_joined: datetime
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class IncompleteUserEntity:
     id: int
     username: str
     avatar: str
 
-    def __eq__(self, value: Union[UserEntity, IncompleteUserEntity]):
+    def __eq__(self, value: Union[UserEntity, 'IncompleteUserEntity']):
         if value.id and value.username and value.avatar:
             return self.id == value.id
 